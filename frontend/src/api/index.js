@@ -18,14 +18,18 @@ export const realtimeAPI = {
     return api.get('/realtime/recent', { params: { limit } })
   },
   
-  // 启动摄像头
-  startCamera(cameraIndex = 0) {
-    return api.post('/realtime/start-camera', { camera_index: cameraIndex })
+  // 启动摄像头（serverCapture 为 true 时由服务端读取摄像头并推流）
+  startCamera(cameraIndex = 0, serverCapture = false, record = true) {
+    return api.post('/realtime/start-camera', {
+      camera_index: cameraIndex,
+      server_capture: serverCapture,
+      record
+    })
   },
   
   // 停止摄像头
-  stopCamera() {
-    return api.post('/realtime/stop-camera')
+  stopCamera(streamId = null) {
+    return api.post('/realtime/stop-camera', streamId ? { stream_id: streamId } : {})
   },
   
   // 获取摄像头状态
@@ -33,9 +37,14 @@ export const realtimeAPI = {
     return api.get('/realtime/camera-status')
   },
   
-  // 处理单帧图像
-  processFrame(imageData, record = true) {
-    return api.post('/realtime/process-frame', { image: imageData, record })
+  // 处理单帧图像（默认只返回识别结果，标注由前端绘制；streamId 区分各客户端的跟踪器）
+  processFrame(imageData, record = true, responseMode = 'results', streamId = null) {
+    return api.post('/realtime/process-frame', {
+      image: imageData,
+      record,
+      response_mode: responseMode,
+      stream_id: streamId
+    })
   },
   
   // 重新加载人脸数据库
@@ -176,6 +185,16 @@ export const recognitionAPI = {
   // 仅识别不签到（预览）
   recognizeOnly(data) {
     return api.post('/recognition/recognize-only', data)
+  },
+
+  // 推理池统计（排队等待与推理耗时）
+  getInferenceStats() {
+    return api.get('/recognition/inference-stats')
+  },
+
+  // 服务端标注图地址（按需获取，mode 为 'preview' 或 'full'）
+  annotatedImageUrl(requestId, mode = 'full') {
+    return `/api/recognition/annotated/${requestId}?mode=${mode}`
   }
 }
 
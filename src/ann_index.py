@@ -0,0 +1,225 @@
+# 近似最近邻索引（IVF-Flat，纯 NumPy 实现）
+import sys
+import os
+import hashlib
+import argparse
+from pathlib import Path
+
+import numpy as np
+
+PROJECT_ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from src import config
+
+INDEX_VERSION = 1
+
+
+class IVFIndex:
+    """
+    倒排文件索引（IVF-Flat）
+
+    用球面 k-means 将特征库划分为 nlist 个簇；查询时只扫描与查询最相近的
+    nprobe 个簇中的候选，再用全精度特征对候选做精确重排并返回 top-k。
+    nprobe 越大召回越高、延迟越大。
+    """
+
+    def __init__(self, centroids, list_offsets, list_ids, fingerprint=""):
+        self.centroids = np.ascontiguousarray(centroids, dtype=np.float32)
+        self.list_offsets = np.asarray(list_offsets, dtype=np.int64)  # (nlist + 1,)
+        self.list_ids = np.asarray(list_ids, dtype=np.int64)          # 按簇排列的特征下标
+        self.fingerprint = fingerprint
+
+    @property
+    def nlist(self):
+        return len(self.centroids)
+
+    @classmethod
+    def build(cls, feats, nlist=None, n_iter=10, seed=0, fingerprint=""):
+        """
+        由归一化特征矩阵训练索引
+
+        Args:
+            feats: (N, D) 归一化后的特征矩阵
+            nlist: 簇数，默认 4 * sqrt(N)
+            n_iter: k-means 迭代次数
+        """
+        feats = np.asarray(feats, dtype=np.float32)
+        n = len(feats)
+        if nlist is None:
+            nlist = max(1, int(4 * np.sqrt(n)))
+        nlist = min(nlist, n)
+
+        rng = np.random.default_rng(seed)
+        # 只在采样子集上训练质心，每簇约 256 个样本已足够
+        sample_size = min(n, nlist * 256)
+        sample = feats[rng.choice(n, sample_size, replace=False)]
+        centroids = sample[rng.choice(sample_size, nlist, replace=False)].copy()
+
+        for _ in range(n_iter):
+            assign = _assign(sample, centroids)
+            counts = np.bincount(assign, minlength=nlist)
+            # 按簇排序后 reduceat 求和，比 np.add.at 快一个数量级
+            order = np.argsort(assign, kind='stable')
+            starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+            sums = np.zeros_like(centroids)
+            nonempty = counts > 0
+            sums[nonempty] = np.add.reduceat(sample[order], starts[nonempty], axis=0)
+            empty = counts == 0
+            if empty.any():
+                # 空簇重新随机初始化
+                sums[empty] = sample[rng.choice(sample_size, int(empty.sum()), replace=False)]
+            centroids = _l2_normalize(sums)
+
+        return cls.from_centroids(feats, centroids, fingerprint)
+
+    @classmethod
+    def from_centroids(cls, feats, centroids, fingerprint=""):
+        """沿用已训练的质心，仅重新分配倒排表（增量注册时避免重新训练）"""
+        assign = _assign(np.asarray(feats, dtype=np.float32), centroids)
+        order = np.argsort(assign, kind='stable')
+        counts = np.bincount(assign, minlength=len(centroids))
+        list_offsets = np.concatenate([[0], np.cumsum(counts)])
+        return cls(centroids, list_offsets, order, fingerprint)
+
+    def search(self, queries, feats, k=None, nprobe=None):
+        """
+        近似检索并精确重排
+
+        Args:
+            queries: (M, D) 归一化查询特征
+            feats: (N, D) 全精度特征矩阵，用于精确重排
+            k: 每个查询返回的候选数，默认 config.ANN_RERANK_TOPK
+            nprobe: 扫描的簇数，默认 config.ANN_NPROBE
+
+        Returns:
+            (cand_idx, cand_sims): 形状 (M, k)，按相似度降序；不足 k 个时以 -1 填充
+        """
+        k = k or config.ANN_RERANK_TOPK
+        nprobe = min(nprobe or config.ANN_NPROBE, self.nlist)
+
+        coarse = queries @ self.centroids.T
+        probes = np.argpartition(-coarse, nprobe - 1, axis=1)[:, :nprobe]
+
+        cand_idx = np.full((len(queries), k), -1, dtype=np.int64)
+        cand_sims = np.full((len(queries), k), -1.0, dtype=np.float32)
+        for i, query in enumerate(queries):
+            ids = np.concatenate([
+                self.list_ids[self.list_offsets[c]:self.list_offsets[c + 1]] for c in probes[i]
+            ])
+            if len(ids) == 0:
+                continue
+            sims = feats[ids] @ query
+            top = min(k, len(ids))
+            best = np.argpartition(-sims, top - 1)[:top]
+            best = best[np.argsort(-sims[best])]
+            cand_idx[i, :top] = ids[best]
+            cand_sims[i, :top] = sims[best]
+        return cand_idx, cand_sims
+
+    def save(self, path):
+        """持久化索引（.npz）"""
+        tmp_path = f"{path}.tmp.npz"
+        np.savez(
+            tmp_path,
+            version=np.int64(INDEX_VERSION),
+            centroids=self.centroids,
+            list_offsets=self.list_offsets,
+            list_ids=self.list_ids,
+            fingerprint=np.array(self.fingerprint),
+        )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            if int(data['version']) != INDEX_VERSION:
+                raise ValueError(f"不支持的索引版本: {int(data['version'])}")
+            return cls(data['centroids'], data['list_offsets'], data['list_ids'], str(data['fingerprint']))
+
+
+def gallery_fingerprint(names, feats, labels=None):
+    """特征库指纹：姓名顺序、模板归属与矩阵形状一致时索引才可复用"""
+    h = hashlib.sha1()
+    h.update(str(np.shape(feats)).encode('utf-8'))
+    h.update('\0'.join(names).encode('utf-8'))
+    if labels is not None:
+        h.update(np.ascontiguousarray(labels, dtype=np.int32).tobytes())
+    return h.hexdigest()
+
+
+def load_index_for(gallery, index_path=None):
+    """
+    加载与特征库匹配的索引；文件不存在、已过期或特征库规模低于阈值时返回 None
+    """
+    index_path = index_path or config.ANN_INDEX_PATH
+    if not config.ANN_ENABLED or gallery.num_templates < config.ANN_MIN_GALLERY_SIZE:
+        return None
+    if not os.path.exists(index_path):
+        return None
+    try:
+        index = IVFIndex.load(index_path)
+    except Exception as e:
+        print(f"⚠️ ANN 索引加载失败，回退到暴力检索: {e}")
+        return None
+    if index.fingerprint != gallery_fingerprint(gallery.names, gallery.feats, gallery.labels):
+        print("⚠️ ANN 索引与特征库不一致，回退到暴力检索（请重新注册或重建索引）")
+        return None
+    return index
+
+
+def build_index_for(gallery, index_path=None, nlist=None, retrain=True):
+    """
+    为特征库构建并保存索引（注册完成后调用）
+
+    模板数低于 ANN_MIN_GALLERY_SIZE 时暴力检索更快，删除旧索引文件并返回 None。
+
+    Args:
+        retrain: False 时若已有同维度索引则沿用其质心，只重新分配倒排表
+    """
+    index_path = index_path or config.ANN_INDEX_PATH
+    if not config.ANN_ENABLED or gallery.num_templates < config.ANN_MIN_GALLERY_SIZE:
+        if os.path.exists(index_path):
+            os.remove(index_path)
+        return None
+
+    fingerprint = gallery_fingerprint(gallery.names, gallery.feats, gallery.labels)
+    previous = None
+    if not retrain and os.path.exists(index_path):
+        try:
+            previous = IVFIndex.load(index_path)
+        except Exception:
+            previous = None
+
+    if previous is not None and previous.centroids.shape[1] == gallery.dim:
+        index = IVFIndex.from_centroids(gallery.feats, previous.centroids, fingerprint)
+    else:
+        index = IVFIndex.build(gallery.feats, nlist=nlist or config.ANN_NLIST, fingerprint=fingerprint)
+    index.save(index_path)
+    print(f"✅ ANN 索引已保存: {index_path} ({gallery.num_templates} 个模板, {index.nlist} 个簇)")
+    return index
+
+
+def _assign(feats, centroids, chunk_size=8192):
+    """分块计算每个特征最近的质心，避免 (N, nlist) 矩阵占用过多内存"""
+    assign = np.empty(len(feats), dtype=np.int64)
+    for start in range(0, len(feats), chunk_size):
+        block = feats[start:start + chunk_size] @ centroids.T
+        assign[start:start + chunk_size] = np.argmax(block, axis=1)
+    return assign
+
+
+def _l2_normalize(feats):
+    norms = np.linalg.norm(feats, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (feats / norms).astype(np.float32)
+
+
+if __name__ == "__main__":
+    from src.gallery import get_gallery
+
+    parser = argparse.ArgumentParser(description="为 students.pkl 构建 ANN 索引")
+    parser.add_argument("--nlist", type=int, default=None, help="簇数（默认 4*sqrt(N)）")
+    args = parser.parse_args()
+
+    build_index_for(get_gallery(force_reload=True), nlist=args.nlist)
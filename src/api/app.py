@@ -10,14 +10,15 @@ from flask import Flask, request, jsonify
 from flask_cors import CORS
 from flask_socketio import SocketIO, emit
 from datetime import date, datetime, timedelta
-import sqlite3
 import os
 from werkzeug.utils import secure_filename
 import base64
 import json
 
-from src.databaseBuild.db import DB_PATH
-from src.attendance import record_attendance as db_record_attendance
+from src.databaseBuild.db import DB_PATH, init_db
+from src.databaseBuild.dal import get_connection
+from src.databaseBuild import queries
+from src.attendance import record_attendance_async as db_record_attendance_async
 from src.query import manual_sign_in, student_exists, already_signed_today
 
 # 导入蓝图
@@ -25,7 +26,8 @@ from src.api.statistics import statistics_bp
 from src.api.students import students_bp
 from src.api.attendance import attendance_bp
 from src.api.recognition import recognition_bp
-from src.api.realtime_recognition import realtime_recognition_bp
+from src.api.realtime_recognition import realtime_recognition_bp, init_socketio as init_realtime_socketio
+from src.api.realtime_socket import register_realtime_handlers, release_session
 
 # Flask应用初始化
 app = Flask(__name__)
@@ -37,6 +39,8 @@ CORS(app, resources={r"/api/*": {"origins": "*"}})
 
 # WebSocket支持
 socketio = SocketIO(app, cors_allowed_origins="*", async_mode='threading')
+init_realtime_socketio(socketio)
+register_realtime_handlers(socketio)  # 二进制帧通道（realtime_frame）
 
 # 注册蓝图
 app.register_blueprint(statistics_bp)
@@ -53,10 +57,8 @@ UPLOAD_FOLDER.mkdir(parents=True, exist_ok=True)
 # ==================== 辅助函数 ====================
 
 def get_db_connection():
-    """获取数据库连接"""
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    return conn
+    """获取数据库连接（连接池借出，close() 即归还）"""
+    return get_connection()
 
 def format_response(success: bool, message: str = "", data=None, code: int = 200):
     """统一响应格式"""
@@ -86,31 +88,26 @@ def get_realtime_status():
     try:
         today = date.today().isoformat()
         conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        # 获取今日签到统计
-        cursor.execute("""
-            SELECT 
-                COUNT(*) as total_signed,
-                AVG(confidence) as avg_confidence
-            FROM attendance_records 
-            WHERE course_date = ? AND status = 'present'
-        """, (today,))
-        signed_stats = cursor.fetchone()
-        
-        # 获取总学生数
-        cursor.execute("SELECT COUNT(*) as total FROM students")
-        total_students = cursor.fetchone()['total']
-        
-        conn.close()
+        try:
+            cursor = conn.cursor()
+            
+            # 获取今日签到统计（读每日汇总表）
+            cursor.execute(queries.DAILY_PRESENT_STATS_SQL, (today,))
+            signed_stats = cursor.fetchone()
+            
+            # 获取总学生数（触发器维护的计数）
+            cursor.execute(queries.TOTAL_STUDENTS_SQL)
+            total_students = cursor.fetchone()['total']
+        finally:
+            conn.close()
         
         return format_response(True, "获取成功", {
             "course_name": "当前课程",  # 可以从配置或参数获取
             "course_date": today,
             "total_students": total_students,
-            "signed_count": signed_stats['total_signed'],
-            "absent_count": total_students - signed_stats['total_signed'],
-            "sign_rate": round((signed_stats['total_signed'] / total_students * 100) if total_students > 0 else 0, 2),
+            "signed_count": signed_stats['signed_count'],
+            "absent_count": total_students - signed_stats['signed_count'],
+            "sign_rate": round((signed_stats['signed_count'] / total_students * 100) if total_students > 0 else 0, 2),
             "avg_confidence": round(signed_stats['avg_confidence'] or 0, 4)
         })
     except Exception as e:
@@ -124,35 +121,22 @@ def get_recent_signins():
         today = date.today().isoformat()
         
         conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute("""
-            SELECT 
-                ar.student_name,
-                ar.course_date,
-                ar.status,
-                ar.confidence,
-                ar.created_at,
-                ar.remark,
-                s.student_id
-            FROM attendance_records ar
-            LEFT JOIN students s ON ar.student_name = s.name
-            WHERE ar.course_date = ?
-            ORDER BY ar.created_at DESC
-            LIMIT ?
-        """, (today, limit))
-        
-        records = []
-        for row in cursor.fetchall():
-            records.append({
-                "name": row['student_name'],
-                "student_id": row['student_id'],
-                "status": row['status'],
-                "confidence": round(row['confidence'], 4),
-                "time": row['created_at'],
-                "remark": row['remark'] or ""
-            })
-        
-        conn.close()
+        try:
+            cursor = conn.cursor()
+            cursor.execute(queries.RECENT_SIGNINS_SQL, (today, limit))
+            
+            records = []
+            for row in cursor.fetchall():
+                records.append({
+                    "name": row['student_name'],
+                    "student_id": row['student_id'],
+                    "status": row['status'],
+                    "confidence": round(row['confidence'], 4),
+                    "time": row['created_at'],
+                    "remark": row['remark'] or ""
+                })
+        finally:
+            conn.close()
         return format_response(True, "获取成功", {"records": records})
     except Exception as e:
         return format_response(False, f"获取失败: {str(e)}", code=500)
@@ -173,6 +157,7 @@ def handle_connect():
 def handle_disconnect():
     """客户端断开"""
     print(f"❌ 客户端已断开: {request.sid}")
+    release_session(request.sid)
 
 @socketio.on('ping')
 def handle_ping(data):
@@ -184,26 +169,29 @@ def broadcast_signin(student_name: str, confidence: float, status: str = "presen
     广播签到事件（供识别程序调用）
     这个函数应该被 realtime.py 或其他识别模块调用
     """
+    def on_written(name, success):
+        # 写入提交后再通过WebSocket广播
+        if not success:
+            return
+        socketio.emit('new_signin', {
+            'student_name': name,
+            'confidence': round(confidence, 4),
+            'status': status,
+            'timestamp': datetime.now().isoformat(),
+            'message': f'{name} 签到成功'
+        })
+        print(f"📢 广播签到事件: {name} (置信度: {confidence:.4f})")
+
     try:
-        # 记录到数据库
-        db_record_attendance(
+        # 记录到数据库（交给考勤写入线程批量提交）
+        db_record_attendance_async(
             name=student_name,
             course_date=date.today(),
             image_path=image_path,
             confidence=confidence,
-            status=status
+            status=status,
+            callback=on_written
         )
-        
-        # 通过WebSocket广播
-        socketio.emit('new_signin', {
-            'student_name': student_name,
-            'confidence': round(confidence, 4),
-            'status': status,
-            'timestamp': datetime.now().isoformat(),
-            'message': f'{student_name} 签到成功'
-        })
-        
-        print(f"📢 广播签到事件: {student_name} (置信度: {confidence:.4f})")
     except Exception as e:
         print(f"❌ 广播签到失败: {e}")
 
@@ -244,35 +232,37 @@ def export_attendance():
         end_date = request.args.get('end_date', date.today().isoformat())
         
         conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        query = """
-            SELECT 
-                ar.student_name,
-                s.student_id,
-                ar.course_date,
-                ar.status,
-                ar.confidence,
-                ar.created_at,
-                ar.remark
-            FROM attendance_records ar
-            LEFT JOIN students s ON ar.student_name = s.name
-            WHERE 1=1
-        """
-        params = []
-        
-        if start_date:
-            query += " AND ar.course_date >= ?"
-            params.append(start_date)
-        
-        query += " AND ar.course_date <= ?"
-        params.append(end_date)
-        
-        query += " ORDER BY ar.course_date DESC, ar.created_at DESC"
-        
-        cursor.execute(query, params)
-        records = cursor.fetchall()
-        conn.close()
+        try:
+            cursor = conn.cursor()
+            
+            query = """
+                SELECT 
+                    COALESCE(s.name, ar.student_name) AS student_name,
+                    s.student_id,
+                    ar.course_date,
+                    ar.status,
+                    ar.confidence,
+                    ar.created_at,
+                    ar.remark
+                FROM attendance_records ar
+                LEFT JOIN students s ON ar.student_ref = s.id
+                WHERE 1=1
+            """
+            params = []
+            
+            if start_date:
+                query += " AND ar.course_date >= ?"
+                params.append(start_date)
+            
+            query += " AND ar.course_date <= ?"
+            params.append(end_date)
+            
+            query += " ORDER BY ar.course_date DESC, ar.created_at DESC"
+            
+            cursor.execute(query, params)
+            records = cursor.fetchall()
+        finally:
+            conn.close()
         
         # 转换为CSV格式
         import csv
@@ -319,6 +309,8 @@ if __name__ == '__main__':
     print("🚀 Flask API 服务启动中...")
     print(f"📂 数据库路径: {DB_PATH}")
     print(f"📂 上传目录: {UPLOAD_FOLDER}")
+    # 启动时补齐数据库结构迁移（新建索引等）
+    init_db()
     print("=" * 50)
     
     # 开发环境使用socketio.run，生产环境建议使用gunicorn + eventlet
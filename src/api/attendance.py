@@ -6,19 +6,16 @@ sys.path.insert(0, str(project_root))
 
 from flask import Blueprint, request, jsonify
 from datetime import date, datetime, timedelta
-import sqlite3
 
-from src.databaseBuild.db import DB_PATH
-from src.attendance import record_attendance
-from src.query import manual_sign_in, student_exists, already_signed_today
+from src.databaseBuild.dal import get_connection
+from src.databaseBuild import queries
+from src.attendance import sign_in_batch, SIGNIN_NEW, SIGNIN_ALREADY, SIGNIN_UNKNOWN
 
 attendance_bp = Blueprint('attendance', __name__, url_prefix='/api/attendance')
 
 def get_db_connection():
-    """获取数据库连接"""
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    return conn
+    """获取数据库连接（连接池借出，close() 即归还）"""
+    return get_connection()
 
 def format_response(success: bool, message: str = "", data=None, code: int = 200):
     """统一响应格式"""
@@ -54,81 +51,41 @@ def get_attendance_records():
         page_size = request.args.get('page_size', 20, type=int)
         
         conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        # 构建查询条件
-        base_query = """
-            FROM attendance_records ar
-            LEFT JOIN students s ON ar.student_name = s.name
-            WHERE 1=1
-        """
-        params = []
-        
-        # 日期筛选
-        if target_date:
-            base_query += " AND ar.course_date = ?"
-            params.append(target_date)
-        else:
-            if start_date:
-                base_query += " AND ar.course_date >= ?"
-                params.append(start_date)
-            base_query += " AND ar.course_date <= ?"
-            params.append(end_date)
-        
-        # 学生筛选
-        if student_name:
-            base_query += " AND ar.student_name LIKE ?"
-            params.append(f"%{student_name}%")
-        
-        # 状态筛选
-        if status:
-            base_query += " AND ar.status = ?"
-            params.append(status)
-        
-        # 获取总数
-        cursor.execute(f"SELECT COUNT(*) as total {base_query}", params)
-        total = cursor.fetchone()['total']
-        
-        # 获取分页数据
-        offset = (page - 1) * page_size
-        query = f"""
-            SELECT 
-                ar.id,
-                ar.student_name,
-                s.student_id,
-                ar.course_date,
-                ar.status,
-                ar.confidence,
-                ar.created_at,
-                ar.remark,
-                ar.image_path
-            {base_query}
-            ORDER BY ar.course_date DESC, ar.created_at DESC
-            LIMIT ? OFFSET ?
-        """
-        params.extend([page_size, offset])
-        cursor.execute(query, params)
-        
-        records = []
-        for row in cursor.fetchall():
-            records.append({
-                "id": row['id'],
-                "student_name": row['student_name'],
-                "student_id": row['student_id'],
-                "course_date": row['course_date'],
-                "status": row['status'],
-                "status_text": {
-                    "present": "已到",
-                    "late": "迟到",
-                    "absent": "缺勤"
-                }.get(row['status'], row['status']),
-                "confidence": round(row['confidence'], 4),
-                "created_at": row['created_at'],
-                "remark": row['remark'] or "",
-                "has_image": bool(row['image_path'])
-            })
-        
-        conn.close()
+        try:
+            cursor = conn.cursor()
+            
+            # 构建查询条件
+            base_query, params = queries.build_records_filter(target_date, start_date, end_date, student_name, status)
+            
+            # 获取总数
+            cursor.execute(queries.RECORDS_COUNT_SQL.format(base_query=base_query), params)
+            total = cursor.fetchone()['total']
+            
+            # 获取分页数据
+            offset = (page - 1) * page_size
+            params.extend([page_size, offset])
+            cursor.execute(queries.RECORDS_PAGE_SQL.format(base_query=base_query), params)
+            
+            records = []
+            for row in cursor.fetchall():
+                records.append({
+                    "id": row['id'],
+                    "student_name": row['student_name'],
+                    "student_id": row['student_id'],
+                    "course_date": row['course_date'],
+                    "status": row['status'],
+                    "status_text": {
+                        "present": "已到",
+                        "late": "迟到",
+                        "absent": "缺勤"
+                    }.get(row['status'], row['status']),
+                    "confidence": round(row['confidence'], 4),
+                    "created_at": row['created_at'],
+                    "remark": row['remark'] or "",
+                    "has_image": bool(row['image_path'])
+                })
+        finally:
+            conn.close()
         
         return format_response(True, "获取成功", {
             "total": total,
@@ -145,18 +102,27 @@ def get_attendance_record(record_id):
     """获取单条签到记录详情"""
     try:
         conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute("""
-            SELECT 
-                ar.*,
-                s.student_id
-            FROM attendance_records ar
-            LEFT JOIN students s ON ar.student_name = s.name
-            WHERE ar.id = ?
-        """, (record_id,))
-        
-        record = cursor.fetchone()
-        conn.close()
+        try:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT 
+                    ar.id,
+                    COALESCE(s.name, ar.student_name) AS student_name,
+                    ar.course_date,
+                    ar.status,
+                    ar.confidence,
+                    ar.created_at,
+                    ar.remark,
+                    ar.image_path,
+                    s.student_id
+                FROM attendance_records ar
+                LEFT JOIN students s ON ar.student_ref = s.id
+                WHERE ar.id = ?
+            """, (record_id,))
+            
+            record = cursor.fetchone()
+        finally:
+            conn.close()
         
         if not record:
             return format_response(False, "记录不存在", code=404)
@@ -193,10 +159,6 @@ def manual_signin():
         if not student_name:
             return format_response(False, "学生姓名不能为空", code=400)
         
-        # 检查学生是否存在
-        if not student_exists(student_name):
-            return format_response(False, f"学生 {student_name} 不存在，请先注册", code=400)
-        
         # 处理日期
         if course_date_str:
             try:
@@ -206,21 +168,19 @@ def manual_signin():
         else:
             course_date = date.today()
         
-        # 检查是否已签到
-        if already_signed_today(student_name, course_date):
-            return format_response(False, f"{student_name} 在 {course_date} 已经签到过了", code=400)
+        # 校验学生、检查是否已签到并补签（一个事务）
+        outcome = sign_in_batch([student_name], course_date, remark=remark)[student_name]
         
-        # 执行补签
-        success = manual_sign_in(student_name, course_date, remark)
+        if outcome == SIGNIN_UNKNOWN:
+            return format_response(False, f"学生 {student_name} 不存在，请先注册", code=400)
+        if outcome == SIGNIN_ALREADY:
+            return format_response(False, f"{student_name} 在 {course_date} 已经签到过了", code=400)
         
-        if success:
-            return format_response(True, f"{student_name} 补签成功", {
-                "student_name": student_name,
-                "course_date": course_date.isoformat(),
-                "remark": remark
-            })
-        else:
-            return format_response(False, "补签失败", code=500)
+        return format_response(True, f"{student_name} 补签成功", {
+            "student_name": student_name,
+            "course_date": course_date.isoformat(),
+            "remark": remark
+        })
     except Exception as e:
         return format_response(False, f"补签失败: {str(e)}", code=500)
 
@@ -251,33 +211,20 @@ def batch_manual_signin():
         else:
             course_date = date.today()
         
-        success_list = []
-        failed_list = []
+        # 整批学生在一个事务中校验并补签
+        outcomes = sign_in_batch([name.strip() for name in students], course_date, remark=remark)
         
-        for student_name in students:
-            student_name = student_name.strip()
-            
-            # 检查学生是否存在
-            if not student_exists(student_name):
-                failed_list.append({"name": student_name, "reason": "学生不存在"})
-                continue
-            
-            # 检查是否已签到
-            if already_signed_today(student_name, course_date):
-                failed_list.append({"name": student_name, "reason": "已经签到过"})
-                continue
-            
-            # 执行补签
-            if manual_sign_in(student_name, course_date, remark):
-                success_list.append(student_name)
-            else:
-                failed_list.append({"name": student_name, "reason": "补签失败"})
+        reasons = {SIGNIN_UNKNOWN: "学生不存在", SIGNIN_ALREADY: "已经签到过"}
+        success_list = [name for name, outcome in outcomes.items() if outcome == SIGNIN_NEW]
+        failed_list = [{"name": name, "reason": reasons[outcome]}
+                       for name, outcome in outcomes.items() if outcome != SIGNIN_NEW]
         
         return format_response(True, f"批量补签完成，成功 {len(success_list)} 个", {
             "success_count": len(success_list),
             "success_list": success_list,
             "failed_count": len(failed_list),
             "failed_list": failed_list,
+            "outcomes": outcomes,
             "course_date": course_date.isoformat()
         })
     except Exception as e:
@@ -297,42 +244,41 @@ def update_attendance_record(record_id):
         remark = data.get('remark')
         
         conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        # 检查记录是否存在
-        cursor.execute("SELECT * FROM attendance_records WHERE id = ?", (record_id,))
-        record = cursor.fetchone()
-        if not record:
-            conn.close()
-            return format_response(False, "记录不存在", code=404)
-        
-        # 构建更新语句
-        update_fields = []
-        params = []
-        
-        if status:
-            if status not in ['present', 'late', 'absent']:
-                conn.close()
-                return format_response(False, "状态值无效", code=400)
-            update_fields.append("status = ?")
-            params.append(status)
-        
-        if remark is not None:
-            update_fields.append("remark = ?")
-            params.append(remark)
-        
-        if not update_fields:
+        try:
+            cursor = conn.cursor()
+            
+            # 检查记录是否存在
+            cursor.execute("SELECT * FROM attendance_records WHERE id = ?", (record_id,))
+            record = cursor.fetchone()
+            if not record:
+                return format_response(False, "记录不存在", code=404)
+            
+            # 构建更新语句
+            update_fields = []
+            params = []
+            
+            if status:
+                if status not in ['present', 'late', 'absent']:
+                    return format_response(False, "状态值无效", code=400)
+                update_fields.append("status = ?")
+                params.append(status)
+            
+            if remark is not None:
+                update_fields.append("remark = ?")
+                params.append(remark)
+            
+            if not update_fields:
+                return format_response(False, "没有需要更新的字段", code=400)
+            
+            params.append(record_id)
+            cursor.execute(f"""
+                UPDATE attendance_records
+                SET {', '.join(update_fields)}
+                WHERE id = ?
+            """, params)
+            conn.commit()
+        finally:
             conn.close()
-            return format_response(False, "没有需要更新的字段", code=400)
-        
-        params.append(record_id)
-        cursor.execute(f"""
-            UPDATE attendance_records
-            SET {', '.join(update_fields)}
-            WHERE id = ?
-        """, params)
-        conn.commit()
-        conn.close()
         
         return format_response(True, "更新成功")
     except Exception as e:
@@ -343,19 +289,20 @@ def delete_attendance_record(record_id):
     """删除签到记录"""
     try:
         conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        # 检查记录是否存在
-        cursor.execute("SELECT * FROM attendance_records WHERE id = ?", (record_id,))
-        record = cursor.fetchone()
-        if not record:
+        try:
+            cursor = conn.cursor()
+            
+            # 检查记录是否存在
+            cursor.execute("SELECT * FROM attendance_records WHERE id = ?", (record_id,))
+            record = cursor.fetchone()
+            if not record:
+                return format_response(False, "记录不存在", code=404)
+            
+            # 删除记录
+            cursor.execute("DELETE FROM attendance_records WHERE id = ?", (record_id,))
+            conn.commit()
+        finally:
             conn.close()
-            return format_response(False, "记录不存在", code=404)
-        
-        # 删除记录
-        cursor.execute("DELETE FROM attendance_records WHERE id = ?", (record_id,))
-        conn.commit()
-        conn.close()
         
         return format_response(True, "删除成功")
     except Exception as e:
@@ -378,35 +325,26 @@ def get_attendance_summary():
             start_date = (date.today() - timedelta(days=30)).isoformat()
         
         conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        # 获取所有学生
-        cursor.execute("SELECT name, student_id FROM students ORDER BY name")
-        students = cursor.fetchall()
-        
-        # 获取日期范围内的所有日期（有签到记录的）
-        cursor.execute("""
-            SELECT DISTINCT course_date
-            FROM attendance_records
-            WHERE course_date BETWEEN ? AND ?
-            ORDER BY course_date DESC
-        """, (start_date, end_date))
-        dates = [row['course_date'] for row in cursor.fetchall()]
-        
-        # 获取签到记录
-        cursor.execute("""
-            SELECT student_name, course_date, status
-            FROM attendance_records
-            WHERE course_date BETWEEN ? AND ?
-        """, (start_date, end_date))
-        
-        # 构建签到矩阵
-        attendance_map = {}
-        for row in cursor.fetchall():
-            key = f"{row['student_name']}_{row['course_date']}"
-            attendance_map[key] = row['status']
-        
-        conn.close()
+        try:
+            cursor = conn.cursor()
+            
+            # 获取所有学生
+            cursor.execute("SELECT id, name, student_id FROM students ORDER BY name")
+            students = cursor.fetchall()
+            
+            # 获取日期范围内的所有日期（有签到记录的）
+            cursor.execute(queries.SUMMARY_DATES_SQL, (start_date, end_date))
+            dates = [row['course_date'] for row in cursor.fetchall()]
+            
+            # 获取签到记录
+            cursor.execute(queries.SUMMARY_RECORDS_SQL, (start_date, end_date))
+            
+            # 构建签到矩阵：{(学生 id, 日期): 状态}
+            attendance_map = {}
+            for row in cursor.fetchall():
+                attendance_map[(row['student_ref'], row['course_date'])] = row['status']
+        finally:
+            conn.close()
         
         # 构建汇总数据
         summary = []
@@ -422,8 +360,7 @@ def get_attendance_summary():
             absent_count = 0
             
             for date_str in dates:
-                key = f"{student['name']}_{date_str}"
-                status = attendance_map.get(key, 'absent')
+                status = attendance_map.get((student['id'], date_str), 'absent')
                 
                 student_data["records"].append({
                     "date": date_str,
@@ -468,26 +405,23 @@ def get_absent_list():
         target_date = request.args.get('date', date.today().isoformat())
         
         conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        # 获取所有学生
-        cursor.execute("SELECT name, student_id FROM students")
-        all_students = {row['name']: row['student_id'] for row in cursor.fetchall()}
-        
-        # 获取已签到学生
-        cursor.execute("""
-            SELECT student_name
-            FROM attendance_records
-            WHERE course_date = ? AND status IN ('present', 'late')
-        """, (target_date,))
-        signed_students = {row['student_name'] for row in cursor.fetchall()}
-        
-        conn.close()
+        try:
+            cursor = conn.cursor()
+            
+            # 获取所有学生
+            cursor.execute("SELECT id, name, student_id FROM students")
+            all_students = cursor.fetchall()
+            
+            # 获取已签到学生
+            cursor.execute(queries.SIGNED_STUDENT_REFS_SQL, (target_date,))
+            signed_students = {row['student_ref'] for row in cursor.fetchall()}
+        finally:
+            conn.close()
         
         # 计算缺勤名单
         absent_list = []
-        for name, student_id in all_students.items():
-            if name not in signed_students:
+        for ref, name, student_id in all_students:
+            if ref not in signed_students:
                 absent_list.append({
                     "name": name,
                     "student_id": student_id
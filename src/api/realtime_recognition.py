@@ -7,48 +7,63 @@ sys.path.insert(0, str(project_root))
 from flask import Blueprint, request, jsonify, Response
 import cv2
 import numpy as np
-import pickle
 from datetime import datetime, timedelta
 import base64
 import time
+import threading
 
-from src.config import SIMILARITY_THRESHOLD, CAPTURE_DIR
+from src.config import SIMILARITY_THRESHOLD
 from src.realtime_utils import draw_faces_with_names
-from src.attendance import record_attendance
-from insightface.app import FaceAnalysis
-import os
+from src.attendance import record_attendance_async, attach_capture_path
+from src.capture_store import get_capture_store
+from src.gallery import get_gallery
+from src.models import get_models
+from src.detection import detect_cascade
+from src.tracking import get_tracker, release_tracker, tracker_stats
+from src.camera_engine import CameraEngine
+from src.overlay import draw_overlay, build_annotation, parse_response_mode
+from src import config
 
 realtime_recognition_bp = Blueprint('realtime_recognition', __name__, url_prefix='/api/realtime')
 
 # 全局变量
-face_app = None
-known_names = []
-known_feats = None
 last_attendance = {}
+_attendance_lock = threading.Lock()
 camera_active = False
-camera_instance = None
+camera_instance = None  # 服务端摄像头引擎（CameraEngine）
+socketio = None
+
+# 实时识别的检测输入尺寸（与照片识别共用同一份模型）：
+# 先以 DET_SIZE 检测，人脸过小、分数偏低或人数不足时才升级到 HIGH_DET_SIZE
+DET_SIZE = (320, 320)
+HIGH_DET_SIZE = (640, 640)
+
+# 服务端摄像头使用的跟踪器流 id
+CAMERA_STREAM_ID = 'server-camera'
 
 def initialize_face_app():
-    """初始化人脸识别模型"""
-    global face_app
-    if face_app is None:
-        face_app = FaceAnalysis(providers=['CPUExecutionProvider'])
-        face_app.prepare(ctx_id=0, det_size=(320, 320))
-    return face_app
+    """获取人脸识别模型（进程内共享的推理池）"""
+    return get_models()
 
-def load_known_faces():
-    """加载已注册的学生特征"""
-    global known_names, known_feats
-    pkl_path = project_root / "data" / "students.pkl"
-    if not pkl_path.exists():
-        return False, "未找到 students.pkl，请先注册学生"
-    
+def init_socketio(sio):
+    """由 app.py 注入 SocketIO 实例，后台线程通过它推送事件"""
+    global socketio
+    socketio = sio
+
+def emit_event(event, data):
+    """推送 WebSocket 事件（SocketIO 未注入时回退到 app 模块中的实例）"""
+    sio = socketio
+    if sio is None:
+        from src.api.app import socketio as sio
+    sio.emit(event, data)
+
+def load_known_faces(force_reload=False):
+    """加载已注册的学生特征（与识别接口共享同一份特征库快照）"""
     try:
-        with open(pkl_path, 'rb') as f:
-            data = pickle.load(f)
-        known_names = list(data.keys())
-        known_feats = np.array(list(data.values()))
-        return True, f"成功加载 {len(known_names)} 名学生"
+        gallery = get_gallery(force_reload=force_reload)
+        if len(gallery) == 0:
+            return False, "人脸特征库为空，请先注册学生"
+        return True, f"成功加载 {len(gallery)} 名学生"
     except Exception as e:
         return False, f"加载失败: {str(e)}"
 
@@ -76,22 +91,42 @@ def start_camera():
         initialize_face_app()
         print("✓ 模型初始化完成")
         
-        # 打开摄像头
         data = request.get_json() if request.is_json else {}
-        camera_index = data.get('camera_index', 0) if data else 0
+        data = data or {}
+        students_count = len(get_gallery())
+        
+        # 浏览器采集模式：画面由前端逐帧上传到 /process-frame，服务端不占用摄像头
+        if not data.get('server_capture'):
+            print(f"✓ 识别服务已就绪，共加载 {students_count} 名学生")
+            return jsonify({
+                "success": True,
+                "message": "识别服务已就绪",
+                "students_count": students_count
+            })
+        
+        # 服务端采集模式：在后台线程中读取摄像头并识别，MJPEG 推流 + Socket.IO 推送结果
+        camera_index = data.get('camera_index', 0)
+        should_record = data.get('record', True)
         print(f"📹 正在打开摄像头 (索引: {camera_index})...")
-        camera_instance = cv2.VideoCapture(camera_index)
+        camera_instance = CameraEngine(
+            camera_index,
+            process=lambda frame: _process_camera_frame(frame, should_record),
+            on_result=_push_camera_result,
+            stream_id=CAMERA_STREAM_ID
+        )
         
-        if not camera_instance.isOpened():
+        if not camera_instance.start():
             print("❌ 无法打开摄像头")
+            camera_instance = None
             return jsonify({"success": False, "message": "无法打开摄像头"}), 500
         
         camera_active = True
-        print(f"✓ 摄像头已启动，共加载 {len(known_names)} 名学生")
+        print(f"✓ 摄像头已启动，共加载 {students_count} 名学生")
         return jsonify({
             "success": True,
             "message": "摄像头已启动",
-            "students_count": len(known_names)
+            "students_count": students_count,
+            "stream_url": "/api/realtime/stream"
         })
     except Exception as e:
         import traceback
@@ -106,9 +141,15 @@ def stop_camera():
     
     try:
         if camera_instance:
-            camera_instance.release()
+            camera_instance.stop()
             camera_instance = None
+            release_tracker(CAMERA_STREAM_ID)
+            get_capture_store().end_session(CAMERA_STREAM_ID)
         camera_active = False
+        data = request.get_json(silent=True) or {}
+        if data.get('stream_id'):
+            release_tracker(data['stream_id'])
+        get_capture_store().end_session(data.get('stream_id') or 'default')
         return jsonify({"success": True, "message": "摄像头已停止"})
     except Exception as e:
         return jsonify({"success": False, "message": str(e)}), 500
@@ -119,14 +160,135 @@ def camera_status():
     return jsonify({
         "success": True,
         "active": camera_active,
-        "students_count": len(known_names)
+        "students_count": len(get_gallery()),
+        "trackers": tracker_stats(),
+        "pipeline": camera_instance.stats() if camera_instance else None
     })
 
+def _process_camera_frame(frame, should_record):
+    """服务端摄像头的推理阶段：识别并绘制标注画面"""
+    result = recognize_frame(frame, stream_id=CAMERA_STREAM_ID, should_record=should_record)
+    return result, draw_results(frame, result['faces'])
+
+def _push_camera_result(payload):
+    """通过 Socket.IO 推送服务端摄像头的识别结果"""
+    try:
+        emit_event('realtime_result', payload)
+    except Exception as e:
+        print(f"⚠️ WebSocket推送失败: {e}")
+
+@realtime_recognition_bp.route('/stream', methods=['GET'])
+def camera_stream():
+    """服务端摄像头的 MJPEG 标注画面流（可直接用作 <img> 的 src）"""
+    engine = camera_instance
+    if engine is None or not engine.running:
+        return jsonify({"success": False, "message": "摄像头未启动"}), 400
+    return Response(engine.mjpeg_frames(), mimetype='multipart/x-mixed-replace; boundary=frame')
+
+def recognize_frame(frame, stream_id=None, should_record=True, expected_count=None):
+    """
+    识别一帧图像并按冷却期记录考勤（浏览器上传帧与服务端摄像头共用）
+
+    Args:
+        stream_id: 视频流标识，每路流一个跟踪器；为空时不做跟踪（逐帧比对），
+                   避免不同客户端共用一个跟踪器而沿用别人的轨迹身份
+
+    Returns:
+        dict: {faces: 识别结果列表, timing: 排队与推理耗时, detection: 检测级联统计}
+    """
+    models = initialize_face_app()
+    gallery = get_gallery()
+
+    models.begin_request()
+    detection = {}
+    if config.DETECTION_CASCADE:
+        faces = detect_cascade(frame, low_size=DET_SIZE, high_size=HIGH_DET_SIZE,
+                               expected_count=expected_count, stats=detection)
+    else:
+        faces = models.detect(frame, det_size=HIGH_DET_SIZE)
+    if config.REALTIME_TRACKING and stream_id:
+        # 跟踪后只对新轨迹和到期复核的轨迹提取特征，其余沿用轨迹身份
+        tracks, names, sims, matched = get_tracker(stream_id).identify(
+            frame, faces, gallery, SIMILARITY_THRESHOLD)
+        track_ids = [track.track_id for track in tracks]
+    else:
+        faces = models.embed(frame, faces)
+        # 一次矩阵乘法完成整帧人脸的比对
+        names, sims, matched = gallery.match([face.normed_embedding for face in faces], SIMILARITY_THRESHOLD)
+        track_ids = [None] * len(faces)
+    timing = models.request_timing()
+    current_time = datetime.now()
+
+    results = []
+    for face, name, max_sim, recognized, track_id in zip(faces, names, sims, matched, track_ids):
+        max_sim = float(max_sim)
+        recognized = bool(recognized)
+        recorded = False
+
+        if recognized and should_record:
+            # 检查冷却期（5分钟）
+            with _attendance_lock:
+                can_record = True
+                if name in last_attendance:
+                    if current_time - last_attendance[name] < timedelta(minutes=5):
+                        can_record = False
+                if can_record:
+                    last_attendance[name] = current_time
+
+            if can_record:
+                # 记录考勤：交给写入线程批量提交，提交成功后再广播签到事件
+                record_attendance_async(
+                    name=name,
+                    course_date=current_time.date(),
+                    image_path="",
+                    confidence=max_sim,
+                    status="present",
+                    remark="实时摄像头签到",
+                    callback=_signin_callback(max_sim, current_time)
+                )
+                # 抓拍图由线程池异步写盘（每个视频流每名学生只保留相似度最高的一张），写完后回填路径
+                capture = get_capture_store().submit(name, frame, face.bbox, max_sim, session_id=stream_id or 'default')
+                attach_capture_path(capture, name, current_time.date())
+                recorded = True
+
+        # 构建人脸框信息
+        bbox = face.bbox.astype(int).tolist()
+        results.append({
+            "name": name if recognized else "Unknown",
+            "confidence": max_sim,
+            "recognized": recognized,
+            "recorded": recorded,
+            "bbox": bbox,
+            "track_id": track_id
+        })
+
+    return {"faces": results, "timing": timing, "detection": detection}
+
+def _signin_callback(confidence, signed_at):
+    """考勤写入完成后广播 WebSocket 签到事件（在写入线程中执行）"""
+    def callback(name, success):
+        if not success:
+            return
+        try:
+            emit_event('new_signin', {
+                'student_name': name,
+                'confidence': round(confidence, 4),
+                'status': 'present',
+                'timestamp': signed_at.isoformat(),
+                'message': f'{name} 签到成功'
+            })
+            print(f"📢 广播签到事件: {name} (置信度: {confidence:.4f})")
+        except Exception as e:
+            print(f"⚠️ WebSocket广播失败: {e}")
+    return callback
+
+def draw_results(frame, results):
+    """在画面副本上绘制识别结果（仅依赖结果中的 bbox / name / confidence）"""
+    return draw_overlay(frame.copy(), results)
+
 @realtime_recognition_bp.route('/process-frame', methods=['POST'])
 def process_frame():
     """处理单帧图像并返回识别结果"""
-    global last_attendance
-    
     try:
         # 获取base64图像
         data = request.get_json()
@@ -140,120 +302,31 @@ def process_frame():
             image_data = image_data.split(',')[1]
         
         img_bytes = base64.b64decode(image_data)
-        nparr = np.frombuffer(img_bytes, np.uint8)
-        frame = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+        frame = cv2.imdecode(np.frombuffer(img_bytes, np.uint8), cv2.IMREAD_COLOR)
         
         if frame is None:
             return jsonify({"success": False, "message": "无效的图像数据"}), 400
         
         # 确保模型和数据已加载
-        if face_app is None:
-            initialize_face_app()
-        
-        if len(known_names) == 0:
-            success, message = load_known_faces()
-            if not success:
-                return jsonify({"success": False, "message": message}), 400
-        
-        # 检测人脸
-        if face_app is None or known_feats is None or len(known_names) == 0:
-            return jsonify({"success": False, "message": "人脸识别系统未初始化"}), 400
-            
-        faces = face_app.get(frame)
-        current_time = datetime.now()
-        
-        results = []
-        should_record = data.get('record', True)  # 是否记录考勤
-        
-        for face in faces:
-            feat = face.normed_embedding
-            sims = np.dot(known_feats, feat)
-            max_idx = np.argmax(sims)
-            max_sim = float(sims[max_idx])
-            name = known_names[max_idx]
-            
-            recognized = max_sim >= SIMILARITY_THRESHOLD
-            recorded = False
-            
-            if recognized and should_record:
-                # 检查冷却期（5分钟）
-                can_record = True
-                if name in last_attendance:
-                    if current_time - last_attendance[name] < timedelta(minutes=5):
-                        can_record = False
-                
-                if can_record:
-                    last_attendance[name] = current_time
-                    
-                    # 保存截图
-                    os.makedirs(CAPTURE_DIR, exist_ok=True)
-                    timestamp = current_time.strftime("%Y%m%d_%H%M%S")
-                    filename = f"{name}_{timestamp}.jpg"
-                    capture_path = os.path.join(CAPTURE_DIR, filename)
-                    
-                    bbox = face.bbox.astype(int)
-                    x1, y1, x2, y2 = bbox
-                    face_img = frame[y1:y2, x1:x2]
-                    if face_img.size > 0:
-                        cv2.imwrite(capture_path, face_img)
-                    
-                    # 记录考勤
-                    record_attendance(
-                        name=name,
-                        course_date=current_time.date(),
-                        image_path=capture_path,
-                        confidence=max_sim,
-                        status="present",
-                        remark="实时摄像头签到"
-                    )
-                    recorded = True
-                    
-                    # 广播WebSocket事件（在应用上下文中）
-                    try:
-                        from src.api.app import socketio
-                        socketio.emit('new_signin', {
-                            'student_name': name,
-                            'confidence': round(max_sim, 4),
-                            'status': 'present',
-                            'timestamp': current_time.isoformat(),
-                            'message': f'{name} 签到成功'
-                        })
-                        print(f"📢 广播签到事件: {name} (置信度: {max_sim:.4f})")
-                    except Exception as e:
-                        print(f"⚠️ WebSocket广播失败: {e}")
-            
-            # 构建人脸框信息
-            bbox = face.bbox.astype(int).tolist()
-            results.append({
-                "name": name if recognized else "Unknown",
-                "confidence": max_sim,
-                "recognized": recognized,
-                "recorded": recorded,
-                "bbox": bbox
-            })
+        initialize_face_app()
         
-        # 绘制标注
-        annotated_frame = frame.copy()
-        for idx, face in enumerate(faces):
-            result = results[idx]
-            bbox = result['bbox']
-            x1, y1, x2, y2 = bbox
-            
-            color = (0, 255, 0) if result['recognized'] else (0, 0, 255)
-            cv2.rectangle(annotated_frame, (x1, y1), (x2, y2), color, 2)
-            
-            label = f"{result['name']} ({result['confidence']:.2f})"
-            cv2.putText(annotated_frame, label, (x1, y1 - 10),
-                       cv2.FONT_HERSHEY_SIMPLEX, 0.6, color, 2)
+        success, message = load_known_faces()
+        if not success:
+            return jsonify({"success": False, "message": message}), 400
         
-        # 编码返回
-        _, buffer = cv2.imencode('.jpg', annotated_frame)
-        annotated_base64 = base64.b64encode(buffer.tobytes()).decode('utf-8')
+        # 前端每次启动生成自己的 stream_id；未提供时不跟踪
+        result = recognize_frame(frame, stream_id=data.get('stream_id'),
+                                 should_record=data.get('record', True),  # 是否记录考勤
+                                 expected_count=data.get('expected_faces'))
         
+        # response_mode: results 只返回结果（前端自行绘制）/ preview 缩略标注图 / full 原尺寸标注图；
+        # 视频帧不进标注缓存
         return jsonify({
             "success": True,
-            "faces": results,
-            "annotated_image": f"data:image/jpeg;base64,{annotated_base64}"
+            "faces": result['faces'],
+            "timing": result['timing'],
+            "detection": result['detection'],
+            **build_annotation(parse_response_mode(data.get('response_mode')), frame, result['faces'], cache=False)
         })
         
     except Exception as e:
@@ -265,11 +338,11 @@ def process_frame():
 def reload_database():
     """重新加载人脸数据库"""
     try:
-        success, message = load_known_faces()
+        success, message = load_known_faces(force_reload=True)
         return jsonify({
             "success": success,
             "message": message,
-            "students_count": len(known_names) if success else 0
+            "students_count": len(get_gallery()) if success else 0
         })
     except Exception as e:
         return jsonify({"success": False, "message": str(e)}), 500
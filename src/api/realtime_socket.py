@@ -0,0 +1,150 @@
+# 实时识别的 WebSocket 二进制帧通道
+import sys
+import threading
+from pathlib import Path
+project_root = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+from flask import request
+import cv2
+import numpy as np
+
+from src.gallery import get_gallery
+from src.tracking import release_tracker
+from src.capture_store import get_capture_store
+from src.api.realtime_recognition import recognize_frame, draw_results, initialize_face_app
+
+# 每个连接的帧槽位：{sid: {...}}
+# 只保留最新一帧，处理期间到达的新帧覆盖未处理的旧帧（丢弃过期帧）
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+def decode_frame(payload):
+    """
+    解码二进制帧
+
+    payload['format'] 为 'jpeg'（默认，编码后的图像字节）或 'raw'
+    （BGR/RGBA 原始像素，需同时提供 width、height、channels）
+    """
+    data = payload.get('image')
+    if not isinstance(data, (bytes, bytearray, memoryview)):
+        return None
+    buffer = np.frombuffer(data, dtype=np.uint8)
+    if payload.get('format', 'jpeg') == 'raw':
+        width, height = int(payload['width']), int(payload['height'])
+        channels = int(payload.get('channels', 3))
+        frame = buffer.reshape(height, width, channels)
+        if channels == 4:
+            # 浏览器 ImageData 为 RGBA
+            return cv2.cvtColor(frame, cv2.COLOR_RGBA2BGR)
+        return frame
+    return cv2.imdecode(buffer, cv2.IMREAD_COLOR)
+
+
+def register_realtime_handlers(socketio):
+    """在 app.py 中注册二进制帧相关的 Socket.IO 事件"""
+
+    @socketio.on('realtime_frame')
+    def handle_realtime_frame(payload):
+        """
+        接收一帧：{seq, image(二进制), format, stream_id, record, annotate, expected_faces}
+
+        结果以 realtime_frame_result 事件只回复给发送方。
+        """
+        sid = request.sid
+        if not isinstance(payload, dict) or 'seq' not in payload:
+            socketio.emit('realtime_frame_result', {'success': False, 'message': '缺少 seq 或图像数据'}, to=sid)
+            return
+
+        with _sessions_lock:
+            session = _sessions.setdefault(sid, {
+                'pending': None, 'running': False, 'last_seq': -1, 'dropped': 0, 'streams': set()
+            })
+            newest = max(session['last_seq'], session['pending']['seq'] if session['pending'] else -1)
+            if payload['seq'] < newest:
+                # 同一连接上的帧按序到达，序号变小说明前端停止后重新开始计数（连接不断开），
+                # 按新一轮识别重置帧槽位，否则新帧会一直被当作过期帧丢弃
+                session['last_seq'] = -1
+                session['pending'] = None
+                session['dropped'] = 0
+            elif payload['seq'] == newest:
+                # 重复帧
+                session['dropped'] += 1
+                return
+            if session['pending'] is not None:
+                session['dropped'] += 1
+            session['pending'] = payload
+            if session['running']:
+                return
+            session['running'] = True
+
+        socketio.start_background_task(_process_session, socketio, sid)
+
+
+def release_session(sid):
+    """连接断开时释放帧槽位与跟踪器（由 app.py 的 disconnect 事件调用）"""
+    with _sessions_lock:
+        session = _sessions.pop(sid, None)
+    if session:
+        for stream_id in session['streams']:
+            release_tracker(stream_id)
+            get_capture_store().end_session(stream_id)
+
+
+def _process_session(socketio, sid):
+    """逐帧处理某个连接的最新帧，直到没有待处理帧"""
+    while True:
+        with _sessions_lock:
+            session = _sessions.get(sid)
+            if session is None:
+                return
+            payload = session['pending']
+            if payload is None:
+                session['running'] = False
+                return
+            session['pending'] = None
+            session['last_seq'] = payload['seq']
+            dropped = session['dropped']
+
+        socketio.emit('realtime_frame_result', _handle_payload(payload, sid, dropped), to=sid)
+
+
+def _handle_payload(payload, sid, dropped):
+    seq = payload['seq']
+    try:
+        frame = decode_frame(payload)
+        if frame is None:
+            return {'success': False, 'seq': seq, 'message': '无效的图像数据'}
+
+        initialize_face_app()
+        if len(get_gallery()) == 0:
+            return {'success': False, 'seq': seq, 'message': '人脸特征库为空，请先注册学生'}
+
+        # 不同连接默认使用各自的跟踪器
+        stream_id = payload.get('stream_id') or f'ws-{sid}'
+        with _sessions_lock:
+            if sid in _sessions:
+                _sessions[sid]['streams'].add(stream_id)
+
+        result = recognize_frame(frame, stream_id=stream_id,
+                                 should_record=payload.get('record', True),
+                                 expected_count=payload.get('expected_faces'))
+        response = {
+            'success': True,
+            'seq': seq,
+            'width': frame.shape[1],
+            'height': frame.shape[0],
+            'faces': result['faces'],
+            'timing': result['timing'],
+            'detection': result['detection'],
+            'dropped': dropped,
+        }
+        if payload.get('annotate'):
+            # 可选：附带标注后的 JPEG（二进制，不做 base64）
+            ok, buffer = cv2.imencode('.jpg', draw_results(frame, result['faces']))
+            if ok:
+                response['annotated_image'] = buffer.tobytes()
+        return response
+    except Exception as e:
+        return {'success': False, 'seq': seq, 'message': str(e)}
@@ -7,33 +7,33 @@ from datetime import datetime, date
 project_root = Path(__file__).parent.parent.parent
 sys.path.insert(0, str(project_root))
 
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, Response
 import cv2
 import numpy as np
-from insightface.app import FaceAnalysis
-from numpy.linalg import norm
 
 from src import config
-from src import utils
-from src.attendance import record_attendance
-from src.query import student_exists, already_signed_today
+from src.gallery import get_gallery
+from src.models import get_models
+from src.detection import detect_faces, cascade_stats
+from src.attendance import sign_in_batch, SIGNIN_NEW, SIGNIN_ALREADY
+from src.overlay import annotation_cache, build_annotation, parse_response_mode
 
 recognition_bp = Blueprint('recognition', __name__, url_prefix='/api/recognition')
 
-# 初始化人脸识别模型（全局单例）
-face_app = None
+# 照片识别的检测输入尺寸（模型由进程内共享的注册表提供）
+DET_SIZE = (640, 640)
 
-def get_face_app():
-    """获取人脸识别应用实例（单例模式）"""
-    global face_app
-    if face_app is None:
-        face_app = FaceAnalysis(providers=['CPUExecutionProvider'])
-        face_app.prepare(ctx_id=0, det_size=(640, 640))
-    return face_app
+def response_mode():
+    """
+    读取本次请求的响应模式（JSON 字段、表单字段或查询参数 response_mode）
 
-def compute_sim(feat1, feat2):
-    """计算两个特征向量的相似度"""
-    return np.dot(feat1, feat2) / (norm(feat1) * norm(feat2))
+    'results' 只返回识别结果，由前端根据 bbox 绘制；'preview' 附带缩略标注图；
+    'full' 附带原尺寸标注图。三种模式都会返回 request_id，可通过
+    /api/recognition/annotated/<request_id> 按需获取标注图。
+    """
+    data = request.get_json(silent=True) if request.is_json else None
+    value = (data or {}).get('response_mode') or request.values.get('response_mode')
+    return parse_response_mode(value)
 
 def recognize_faces(image):
     """
@@ -45,44 +45,33 @@ def recognize_faces(image):
     Returns:
         dict: {
             success: bool,
-            faces: list,  # 识别结果列表
-            annotated_image: numpy.ndarray  # 带框标注的图片
+            faces: list,  # 识别结果列表（含 bbox，可据此绘制标注）
+            timing: dict  # 排队与推理耗时
         }
     """
-    # 加载已知人脸数据库
-    known_faces = utils.load_database(config.DB_PATH)
-    if not known_faces:
+    # 获取已知人脸数据库（进程内缓存，文件变化时才重新加载）
+    gallery = get_gallery()
+    if len(gallery) == 0:
         return {'success': False, 'message': '人脸库为空，请先注册学生人脸'}
     
-    # 获取人脸识别应用
-    app = get_face_app()
-    
-    # 检测人脸
-    faces = app.get(image)
+    # 检测人脸并提取特征（大图分块检测；推理池并发执行，统计本次请求的排队与推理耗时）
+    pool = get_models()
+    pool.begin_request()
+    # 照片签到（合影）不走级联：低分辨率会漏掉后排的小脸，始终以 DET_SIZE 检测
+    faces = pool.embed(image, detect_faces(image, det_size=DET_SIZE))
+    timing = pool.request_timing()
     
     if len(faces) == 0:
-        return {'success': False, 'message': '未检测到人脸，请确保照片清晰且包含正脸'}
-    
-    # 复制图片用于绘制
-    annotated_img = image.copy()
+        return {'success': False, 'message': '未检测到人脸，请确保照片清晰且包含正脸', 'timing': timing}
     
+    # 一次矩阵乘法完成所有人脸与全部学生的比对
+    names, sims, matched = gallery.match([face.embedding for face in faces], config.MATCH_THRESHOLD)
+
     # 识别每个人脸
     results = []
-    for face in faces:
-        max_sim = -1
-        best_name = "Unknown"
-        
-        # 与已知人脸比对
-        for name, embedding in known_faces.items():
-            sim = compute_sim(face.embedding, embedding)
-            if sim > max_sim:
-                max_sim = sim
-                best_name = name
-        
+    for face, best_name, max_sim, is_match in zip(faces, names, sims, matched):
         # 判断是否匹配
-        if max_sim >= config.MATCH_THRESHOLD:
-            final_name = f"{best_name} ({max_sim:.2f})"
-            color = config.COLOR_MATCH
+        if is_match:
             results.append({
                 'name': best_name,
                 'confidence': float(max_sim),
@@ -90,22 +79,18 @@ def recognize_faces(image):
                 'bbox': face.bbox.tolist()
             })
         else:
-            final_name = f"Unknown ({max_sim:.2f})"
-            color = config.COLOR_UNKNOWN
             results.append({
                 'name': 'Unknown',
                 'confidence': float(max_sim),
                 'status': 'unknown',
                 'bbox': face.bbox.tolist()
             })
-        
-        # 在图片上绘制人脸框和标签
-        utils.draw_bbox(annotated_img, face.bbox, final_name, color)
     
+    # 不在此处绘制标注图：由接口按 response_mode 决定是否绘制（见 src/overlay.py）
     return {
         'success': True, 
         'faces': results,
-        'annotated_image': annotated_img
+        'timing': timing
     }
 
 
@@ -146,9 +131,9 @@ def upload_image_signin():
                     filename.rsplit('.', 1)[1].lower() in allowed_extensions):
                 return jsonify({'success': False, 'message': '不支持的文件格式'}), 400
             
-            # 读取图片
-            file_bytes = np.frombuffer(file.read(), np.uint8)
-            image = cv2.imdecode(file_bytes, cv2.IMREAD_COLOR)
+            # 读取图片（保留原始字节，缓存标注图时无需重新编码）
+            source = file.read()
+            image = cv2.imdecode(np.frombuffer(source, np.uint8), cv2.IMREAD_COLOR)
         
         # 方式2: Base64编码
         elif request.is_json:
@@ -163,9 +148,8 @@ def upload_image_signin():
                 if ',' in img_data:
                     img_data = img_data.split(',')[1]
                 
-                img_bytes = base64.b64decode(img_data)
-                nparr = np.frombuffer(img_bytes, np.uint8)
-                image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+                source = base64.b64decode(img_data)
+                image = cv2.imdecode(np.frombuffer(source, np.uint8), cv2.IMREAD_COLOR)
             except Exception as e:
                 return jsonify({'success': False, 'message': f'图片解码失败: {str(e)}'}), 400
         else:
@@ -181,12 +165,6 @@ def upload_image_signin():
             return jsonify(result), 400
         
         faces = result['faces']
-        annotated_image = result['annotated_image']
-        
-        # 将标注后的图片编码为base64
-        _, buffer = cv2.imencode('.jpg', annotated_image)
-        img_base64 = base64.b64encode(buffer.tobytes()).decode('utf-8')
-        img_data_url = f"data:image/jpeg;base64,{img_base64}"
         
         # 分类识别结果
         recognized = [f for f in faces if f['status'] == 'matched']
@@ -196,35 +174,30 @@ def upload_image_signin():
         signed_in = []
         today = date.today()
         
+        # 整张照片的识别结果在一个事务中校验并签到（同一人出现多次时取最高置信度）
+        confidences = {}
+        for face in recognized:
+            confidences[face['name']] = max(face['confidence'], confidences.get(face['name'], 0.0))
+        outcomes = sign_in_batch(list(confidences), today, image_path='upload',
+                                 remark='上传图片识别', confidences=confidences)
+        
+        signed_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
         for face in recognized:
             name = face['name']
-            confidence = face['confidence']
-            
-            # 检查学生是否存在
-            if not student_exists(name):
-                continue
-            
-            # 检查今天是否已签到
-            if already_signed_today(name, today):
+            outcome = outcomes.get(name)
+            if outcome == SIGNIN_ALREADY:
                 face['already_signed'] = True
-                continue
-            
-            # 记录签到
-            success = record_attendance(
-                name=name,
-                course_date=today,
-                image_path='upload',
-                confidence=confidence,
-                status='present',
-                remark='上传图片识别'
-            )
-            if success:
+            elif outcome == SIGNIN_NEW and face['confidence'] == confidences[name] and not any(
+                    s['name'] == name for s in signed_in):
                 signed_in.append({
                     'name': name,
-                    'confidence': confidence,
-                    'time': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+                    'confidence': face['confidence'],
+                    'time': signed_time
                 })
                 face['signed_in'] = True
+            elif outcome == SIGNIN_NEW:
+                # 同一张照片中重复出现的人
+                face['already_signed'] = True
         
         return jsonify({
             'success': True,
@@ -234,7 +207,9 @@ def upload_image_signin():
                 'recognized': recognized,
                 'unknown': unknown,
                 'signed_in': signed_in,
-                'annotated_image': img_data_url  # 返回带框标注的图片
+                'timing': result['timing'],
+                # request_id / annotated_url，preview、full 模式另含 annotated_image
+                **build_annotation(response_mode(), image, faces, source)
             }
         })
     
@@ -258,16 +233,15 @@ def recognize_only():
         # 处理文件上传或base64
         if 'file' in request.files:
             file = request.files['file']
-            file_bytes = np.frombuffer(file.read(), np.uint8)
-            image = cv2.imdecode(file_bytes, cv2.IMREAD_COLOR)
+            source = file.read()
+            image = cv2.imdecode(np.frombuffer(source, np.uint8), cv2.IMREAD_COLOR)
         elif request.is_json:
             data = request.get_json()
             img_data = data.get('image', '')
             if ',' in img_data:
                 img_data = img_data.split(',')[1]
-            img_bytes = base64.b64decode(img_data)
-            nparr = np.frombuffer(img_bytes, np.uint8)
-            image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+            source = base64.b64decode(img_data)
+            image = cv2.imdecode(np.frombuffer(source, np.uint8), cv2.IMREAD_COLOR)
         
         if image is None:
             return jsonify({'success': False, 'message': '图片读取失败'}), 400
@@ -279,12 +253,6 @@ def recognize_only():
             return jsonify(result), 400
         
         faces = result['faces']
-        annotated_image = result['annotated_image']
-        
-        # 将标注后的图片编码为base64
-        _, buffer = cv2.imencode('.jpg', annotated_image)
-        img_base64 = base64.b64encode(buffer.tobytes()).decode('utf-8')
-        img_data_url = f"data:image/jpeg;base64,{img_base64}"
         
         recognized = [f for f in faces if f['status'] == 'matched']
         unknown = [f for f in faces if f['status'] == 'unknown']
@@ -296,9 +264,36 @@ def recognize_only():
                 'detected_faces': len(faces),
                 'recognized': recognized,
                 'unknown': unknown,
-                'annotated_image': img_data_url  # 返回带框标注的图片
+                'timing': result['timing'],
+                **build_annotation(response_mode(), image, faces, source)
             }
         })
     
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)}), 500
+
+
+@recognition_bp.route('/inference-stats', methods=['GET'])
+def inference_stats():
+    """推理池统计：实例数、并发占用、排队等待与推理耗时，以及检测级联各阶段的帧数"""
+    data = get_models().stats()
+    data['detection_cascade'] = cascade_stats()
+    return jsonify({
+        'success': True,
+        'message': '获取成功',
+        'data': data
+    })
+
+
+@recognition_bp.route('/annotated/<request_id>', methods=['GET'])
+def annotated_image(request_id):
+    """
+    按请求 id 获取标注图（JPEG），首次获取时才绘制
+
+    查询参数 mode=preview 返回缩略图，默认返回原尺寸标注图
+    """
+    mode = 'preview' if request.args.get('mode') == 'preview' else 'full'
+    jpeg = annotation_cache.get(request_id, mode)
+    if jpeg is None:
+        return jsonify({'success': False, 'message': '标注图不存在或已过期'}), 404
+    return Response(jpeg, mimetype='image/jpeg', headers={'Cache-Control': 'private, max-age=600'})
@@ -6,16 +6,14 @@ sys.path.insert(0, str(project_root))
 
 from flask import Blueprint, request, jsonify
 from datetime import date, datetime, timedelta
-import sqlite3
-from src.databaseBuild.db import DB_PATH
+from src.databaseBuild.dal import get_connection
+from src.databaseBuild import queries
 
 statistics_bp = Blueprint('statistics', __name__, url_prefix='/api/statistics')
 
 def get_db_connection():
-    """获取数据库连接"""
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    return conn
+    """获取数据库连接（只读连接：WAL 模式下统计查询不阻塞签到写入）"""
+    return get_connection(readonly=True)
 
 def format_response(success: bool, message: str = "", data=None, code: int = 200):
     """统一响应格式"""
@@ -38,29 +36,24 @@ def get_overview():
         target_date = request.args.get('date', date.today().isoformat())
         
         conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        # 获取总学生数
-        cursor.execute("SELECT COUNT(*) as total FROM students")
-        total_students = cursor.fetchone()['total']
-        
-        # 获取今日签到统计
-        cursor.execute("""
-            SELECT 
-                COUNT(*) as signed_count,
-                AVG(confidence) as avg_confidence
-            FROM attendance_records 
-            WHERE course_date = ? AND status = 'present'
-        """, (target_date,))
-        today_stats = cursor.fetchone()
-        
-        signed_count = today_stats['signed_count']
-        absent_count = total_students - signed_count
-        
-        # 计算签到率
-        sign_rate = round((signed_count / total_students * 100) if total_students > 0 else 0, 2)
-        
-        conn.close()
+        try:
+            cursor = conn.cursor()
+            
+            # 获取总学生数（触发器维护的计数）
+            cursor.execute(queries.TOTAL_STUDENTS_SQL)
+            total_students = cursor.fetchone()['total']
+            
+            # 获取今日签到统计（读每日汇总表）
+            cursor.execute(queries.DAILY_PRESENT_STATS_SQL, (target_date,))
+            today_stats = cursor.fetchone()
+            
+            signed_count = today_stats['signed_count']
+            absent_count = total_students - signed_count
+            
+            # 计算签到率
+            sign_rate = round((signed_count / total_students * 100) if total_students > 0 else 0, 2)
+        finally:
+            conn.close()
         
         return format_response(True, "获取成功", {
             "date": target_date,
@@ -84,30 +77,24 @@ def get_attendance_distribution():
         target_date = request.args.get('date', date.today().isoformat())
         
         conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        # 获取总学生数
-        cursor.execute("SELECT COUNT(*) as total FROM students")
-        total_students = cursor.fetchone()['total']
-        
-        # 获取各状态人数
-        cursor.execute("""
-            SELECT 
-                status,
-                COUNT(*) as count
-            FROM attendance_records
-            WHERE course_date = ?
-            GROUP BY status
-        """, (target_date,))
-        
-        status_counts = {row['status']: row['count'] for row in cursor.fetchall()}
-        
-        # 计算各状态
-        present_count = status_counts.get('present', 0)
-        late_count = status_counts.get('late', 0)
-        absent_count = total_students - present_count - late_count
-        
-        conn.close()
+        try:
+            cursor = conn.cursor()
+            
+            # 获取总学生数（触发器维护的计数）
+            cursor.execute(queries.TOTAL_STUDENTS_SQL)
+            total_students = cursor.fetchone()['total']
+            
+            # 获取各状态人数
+            cursor.execute(queries.DAILY_STATUS_COUNTS_SQL, (target_date,))
+            
+            status_counts = {row['status']: row['count'] for row in cursor.fetchall()}
+            
+            # 计算各状态
+            present_count = status_counts.get('present', 0)
+            late_count = status_counts.get('late', 0)
+            absent_count = total_students - present_count - late_count
+        finally:
+            conn.close()
         
         return format_response(True, "获取成功", {
             "date": target_date,
@@ -133,29 +120,21 @@ def get_attendance_trend():
         start_date = end_date - timedelta(days=days)
         
         conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        # 获取总学生数
-        cursor.execute("SELECT COUNT(*) as total FROM students")
-        total_students = cursor.fetchone()['total']
-        
-        # 获取每日签到统计
-        cursor.execute("""
-            SELECT 
-                course_date,
-                COUNT(*) as signed_count
-            FROM attendance_records
-            WHERE course_date BETWEEN ? AND ?
-                AND status = 'present'
-            GROUP BY course_date
-            ORDER BY course_date ASC
-        """, (start_date.isoformat(), end_date.isoformat()))
-        
-        daily_stats = {}
-        for row in cursor.fetchall():
-            daily_stats[row['course_date']] = row['signed_count']
-        
-        conn.close()
+        try:
+            cursor = conn.cursor()
+            
+            # 获取总学生数（触发器维护的计数）
+            cursor.execute(queries.TOTAL_STUDENTS_SQL)
+            total_students = cursor.fetchone()['total']
+            
+            # 获取每日签到统计
+            cursor.execute(queries.PRESENT_TREND_SQL, (start_date.isoformat(), end_date.isoformat()))
+            
+            daily_stats = {}
+            for row in cursor.fetchall():
+                daily_stats[row['course_date']] = row['signed_count']
+        finally:
+            conn.close()
         
         # 构建完整的日期序列
         trend_data = []
@@ -197,51 +176,37 @@ def get_attendance_alerts():
         start_date = end_date - timedelta(days=days)
         
         conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        # 获取所有学生在统计期间内的总天数
-        cursor.execute("""
-            SELECT COUNT(DISTINCT course_date) as total_days
-            FROM attendance_records
-            WHERE course_date BETWEEN ? AND ?
-        """, (start_date.isoformat(), end_date.isoformat()))
-        total_days = cursor.fetchone()['total_days'] or 0
-        
-        # 获取每个学生的出勤情况
-        cursor.execute("""
-            SELECT 
-                s.name,
-                s.student_id,
-                COUNT(DISTINCT ar.course_date) as attended_days
-            FROM students s
-            LEFT JOIN attendance_records ar 
-                ON s.name = ar.student_name 
-                AND ar.course_date BETWEEN ? AND ?
-                AND ar.status = 'present'
-            GROUP BY s.name, s.student_id
-        """, (start_date.isoformat(), end_date.isoformat()))
-        
-        alerts = []
-        for row in cursor.fetchall():
-            attended_days = row['attended_days'] or 0
-            absent_days = total_days - attended_days
+        try:
+            cursor = conn.cursor()
             
-            if absent_days >= threshold:
-                attendance_rate = round((attended_days / total_days * 100) if total_days > 0 else 0, 2)
-                alerts.append({
-                    "name": row['name'],
-                    "student_id": row['student_id'],
-                    "absent_days": absent_days,
-                    "attended_days": attended_days,
-                    "total_days": total_days,
-                    "attendance_rate": attendance_rate,
-                    "alert_level": "严重" if absent_days >= threshold * 2 else "警告"
-                })
-        
-        # 按缺勤天数排序
-        alerts.sort(key=lambda x: x['absent_days'], reverse=True)
-        
-        conn.close()
+            # 获取所有学生在统计期间内的总天数
+            cursor.execute(queries.ACTIVE_DAYS_SQL, (start_date.isoformat(), end_date.isoformat()))
+            total_days = cursor.fetchone()['total_days'] or 0
+            
+            # 获取每个学生的出勤情况
+            cursor.execute(queries.STUDENT_ATTENDED_DAYS_SQL, (start_date.isoformat(), end_date.isoformat()))
+            
+            alerts = []
+            for row in cursor.fetchall():
+                attended_days = row['attended_days'] or 0
+                absent_days = total_days - attended_days
+                
+                if absent_days >= threshold:
+                    attendance_rate = round((attended_days / total_days * 100) if total_days > 0 else 0, 2)
+                    alerts.append({
+                        "name": row['name'],
+                        "student_id": row['student_id'],
+                        "absent_days": absent_days,
+                        "attended_days": attended_days,
+                        "total_days": total_days,
+                        "attendance_rate": attendance_rate,
+                        "alert_level": "严重" if absent_days >= threshold * 2 else "警告"
+                    })
+            
+            # 按缺勤天数排序
+            alerts.sort(key=lambda x: x['absent_days'], reverse=True)
+        finally:
+            conn.close()
         
         return format_response(True, "获取成功", {
             "period": f"{start_date.isoformat()} 至 {end_date.isoformat()}",
@@ -266,64 +231,43 @@ def get_student_statistics(student_name):
         start_date = end_date - timedelta(days=days)
         
         conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        # 获取学生基本信息
-        cursor.execute("SELECT * FROM students WHERE name = ?", (student_name,))
-        student = cursor.fetchone()
-        if not student:
-            return format_response(False, "学生不存在", code=404)
-        
-        # 获取统计期间内的总天数
-        cursor.execute("""
-            SELECT COUNT(DISTINCT course_date) as total_days
-            FROM attendance_records
-            WHERE course_date BETWEEN ? AND ?
-        """, (start_date.isoformat(), end_date.isoformat()))
-        total_days = cursor.fetchone()['total_days'] or 0
-        
-        # 获取该学生的出勤记录
-        cursor.execute("""
-            SELECT 
-                COUNT(*) as attended_days,
-                AVG(confidence) as avg_confidence
-            FROM attendance_records
-            WHERE student_name = ?
-                AND course_date BETWEEN ? AND ?
-                AND status = 'present'
-        """, (student_name, start_date.isoformat(), end_date.isoformat()))
-        stats = cursor.fetchone()
-        
-        attended_days = stats['attended_days'] or 0
-        absent_days = total_days - attended_days
-        attendance_rate = round((attended_days / total_days * 100) if total_days > 0 else 0, 2)
-        
-        # 获取最近的签到记录
-        cursor.execute("""
-            SELECT 
-                course_date,
-                status,
-                confidence,
-                created_at,
-                remark
-            FROM attendance_records
-            WHERE student_name = ?
-                AND course_date BETWEEN ? AND ?
-            ORDER BY course_date DESC
-            LIMIT 10
-        """, (student_name, start_date.isoformat(), end_date.isoformat()))
-        
-        recent_records = []
-        for row in cursor.fetchall():
-            recent_records.append({
-                "date": row['course_date'],
-                "status": row['status'],
-                "confidence": round(row['confidence'], 4),
-                "time": row['created_at'],
-                "remark": row['remark'] or ""
-            })
-        
-        conn.close()
+        try:
+            cursor = conn.cursor()
+            
+            # 获取学生基本信息
+            cursor.execute("SELECT * FROM students WHERE name = ?", (student_name,))
+            student = cursor.fetchone()
+            if not student:
+                return format_response(False, "学生不存在", code=404)
+            
+            # 获取统计期间内的总天数
+            cursor.execute(queries.ACTIVE_DAYS_SQL, (start_date.isoformat(), end_date.isoformat()))
+            total_days = cursor.fetchone()['total_days'] or 0
+            
+            # 获取该学生的出勤记录
+            cursor.execute(queries.STUDENT_PRESENT_STATS_SQL,
+                           (student['id'], start_date.isoformat(), end_date.isoformat()))
+            stats = cursor.fetchone()
+            
+            attended_days = stats['attended_days'] or 0
+            absent_days = total_days - attended_days
+            attendance_rate = round((attended_days / total_days * 100) if total_days > 0 else 0, 2)
+            
+            # 获取最近的签到记录
+            cursor.execute(queries.STUDENT_RECENT_RECORDS_SQL,
+                           (student['id'], start_date.isoformat(), end_date.isoformat()))
+            
+            recent_records = []
+            for row in cursor.fetchall():
+                recent_records.append({
+                    "date": row['course_date'],
+                    "status": row['status'],
+                    "confidence": round(row['confidence'], 4),
+                    "time": row['created_at'],
+                    "remark": row['remark'] or ""
+                })
+        finally:
+            conn.close()
         
         return format_response(True, "获取成功", {
             "student": {
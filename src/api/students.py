@@ -6,14 +6,14 @@ sys.path.insert(0, str(project_root))
 
 from flask import Blueprint, request, jsonify, send_file
 from werkzeug.utils import secure_filename
-import sqlite3
 import os
 import base64
 from datetime import datetime
 from PIL import Image
 import io
 
-from src.databaseBuild.db import DB_PATH, register_student_to_db
+from src.databaseBuild.db import register_student_to_db
+from src.databaseBuild.dal import get_connection
 from src.register import register_faces
 
 students_bp = Blueprint('students', __name__, url_prefix='/api/students')
@@ -24,10 +24,8 @@ UPLOAD_FOLDER = project_root / "data" / "uploads"
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'bmp'}
 
 def get_db_connection():
-    """获取数据库连接"""
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    return conn
+    """获取数据库连接（连接池借出，close() 即归还）"""
+    return get_connection()
 
 def format_response(success: bool, message: str = "", data=None, code: int = 200):
     """统一响应格式"""
@@ -58,59 +56,60 @@ def get_students_list():
         search = request.args.get('search', '', type=str)
         
         conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        # 构建查询
-        base_query = "FROM students WHERE 1=1"
-        params = []
-        
-        if search:
-            base_query += " AND (name LIKE ? OR student_id LIKE ?)"
-            search_pattern = f"%{search}%"
-            params.extend([search_pattern, search_pattern])
-        
-        # 获取总数
-        cursor.execute(f"SELECT COUNT(*) as total {base_query}", params)
-        total = cursor.fetchone()['total']
-        
-        # 获取分页数据
-        offset = (page - 1) * page_size
-        query = f"""
-            SELECT 
-                id,
-                name,
-                student_id,
-                created_at
-            {base_query}
-            ORDER BY created_at DESC
-            LIMIT ? OFFSET ?
-        """
-        params.extend([page_size, offset])
-        cursor.execute(query, params)
-        
-        students = []
-        for row in cursor.fetchall():
-            # 检查是否有人脸数据
-            student_face_dir = KNOWN_FACES_FOLDER / row['name']
-            has_face = student_face_dir.exists() and any(student_face_dir.iterdir())
+        try:
+            cursor = conn.cursor()
+            
+            # 构建查询
+            base_query = "FROM students WHERE 1=1"
+            params = []
+            
+            if search:
+                base_query += " AND (name LIKE ? OR student_id LIKE ?)"
+                search_pattern = f"%{search}%"
+                params.extend([search_pattern, search_pattern])
             
-            # 获取人脸图片数量
-            face_count = 0
-            if has_face:
-                face_count = len([f for f in student_face_dir.iterdir() 
-                                 if f.suffix.lower() in ['.png', '.jpg', '.jpeg', '.bmp']])
+            # 获取总数
+            cursor.execute(f"SELECT COUNT(*) as total {base_query}", params)
+            total = cursor.fetchone()['total']
             
-            students.append({
-                "id": row['id'],
-                "name": row['name'],
-                "student_id": row['student_id'],
-                "created_at": row['created_at'],
-                "has_face": has_face,
-                "face_count": face_count,
-                "status": "已激活" if has_face else "未录入"
-            })
-        
-        conn.close()
+            # 获取分页数据
+            offset = (page - 1) * page_size
+            query = f"""
+                SELECT 
+                    id,
+                    name,
+                    student_id,
+                    created_at
+                {base_query}
+                ORDER BY created_at DESC
+                LIMIT ? OFFSET ?
+            """
+            params.extend([page_size, offset])
+            cursor.execute(query, params)
+            
+            students = []
+            for row in cursor.fetchall():
+                # 检查是否有人脸数据
+                student_face_dir = KNOWN_FACES_FOLDER / row['name']
+                has_face = student_face_dir.exists() and any(student_face_dir.iterdir())
+                
+                # 获取人脸图片数量
+                face_count = 0
+                if has_face:
+                    face_count = len([f for f in student_face_dir.iterdir() 
+                                     if f.suffix.lower() in ['.png', '.jpg', '.jpeg', '.bmp']])
+                
+                students.append({
+                    "id": row['id'],
+                    "name": row['name'],
+                    "student_id": row['student_id'],
+                    "created_at": row['created_at'],
+                    "has_face": has_face,
+                    "face_count": face_count,
+                    "status": "已激活" if has_face else "未录入"
+                })
+        finally:
+            conn.close()
         
         return format_response(True, "获取成功", {
             "total": total,
@@ -127,10 +126,12 @@ def get_student_detail(student_id):
     """获取单个学生详情"""
     try:
         conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM students WHERE id = ?", (student_id,))
-        student = cursor.fetchone()
-        conn.close()
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT * FROM students WHERE id = ?", (student_id,))
+            student = cursor.fetchone()
+        finally:
+            conn.close()
         
         if not student:
             return format_response(False, "学生不存在", code=404)
@@ -204,46 +205,47 @@ def update_student(student_id):
         new_student_id = data.get('student_id', '').strip()
         
         conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        # 检查学生是否存在
-        cursor.execute("SELECT * FROM students WHERE id = ?", (student_id,))
-        student = cursor.fetchone()
-        if not student:
-            conn.close()
-            return format_response(False, "学生不存在", code=404)
-        
-        old_name = student['name']
-        
-        # 更新数据库
-        update_fields = []
-        params = []
-        
-        if name and name != old_name:
-            update_fields.append("name = ?")
-            params.append(name)
-        
-        if new_student_id:
-            update_fields.append("student_id = ?")
-            params.append(new_student_id)
-        
-        if update_fields:
-            params.append(student_id)
-            cursor.execute(f"""
-                UPDATE students 
-                SET {', '.join(update_fields)}
-                WHERE id = ?
-            """, params)
-            conn.commit()
+        try:
+            cursor = conn.cursor()
+            
+            # 检查学生是否存在
+            cursor.execute("SELECT * FROM students WHERE id = ?", (student_id,))
+            student = cursor.fetchone()
+            if not student:
+                return format_response(False, "学生不存在", code=404)
+            
+            old_name = student['name']
+            
+            # 更新数据库
+            update_fields = []
+            params = []
             
-            # 如果姓名改变，需要重命名人脸文件夹
             if name and name != old_name:
-                old_face_dir = KNOWN_FACES_FOLDER / old_name
-                new_face_dir = KNOWN_FACES_FOLDER / name
-                if old_face_dir.exists():
-                    old_face_dir.rename(new_face_dir)
-        
-        conn.close()
+                update_fields.append("name = ?")
+                params.append(name)
+            
+            if new_student_id:
+                update_fields.append("student_id = ?")
+                params.append(new_student_id)
+            
+            if update_fields:
+                params.append(student_id)
+                cursor.execute(f"""
+                    UPDATE students 
+                    SET {', '.join(update_fields)}
+                    WHERE id = ?
+                """, params)
+                conn.commit()
+                
+                # 考勤记录按 students.id 关联，改名无需改写历史记录
+                # 如果姓名改变，需要重命名人脸文件夹
+                if name and name != old_name:
+                    old_face_dir = KNOWN_FACES_FOLDER / old_name
+                    new_face_dir = KNOWN_FACES_FOLDER / name
+                    if old_face_dir.exists():
+                        old_face_dir.rename(new_face_dir)
+        finally:
+            conn.close()
         
         return format_response(True, "更新成功")
     except Exception as e:
@@ -254,22 +256,26 @@ def delete_student(student_id):
     """删除学生（包括人脸数据）"""
     try:
         conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        # 获取学生信息
-        cursor.execute("SELECT * FROM students WHERE id = ?", (student_id,))
-        student = cursor.fetchone()
-        if not student:
+        try:
+            cursor = conn.cursor()
+            
+            # 获取学生信息
+            cursor.execute("SELECT * FROM students WHERE id = ?", (student_id,))
+            student = cursor.fetchone()
+            if not student:
+                return format_response(False, "学生不存在", code=404)
+            
+            student_name = student['name']
+            
+            # 删除数据库记录
+            cursor.execute("DELETE FROM students WHERE id = ?", (student_id,))
+            cursor.execute(
+                "DELETE FROM attendance_records WHERE student_ref = ? OR (student_ref IS NULL AND student_name = ?)",
+                (student_id, student_name)
+            )
+            conn.commit()
+        finally:
             conn.close()
-            return format_response(False, "学生不存在", code=404)
-        
-        student_name = student['name']
-        
-        # 删除数据库记录
-        cursor.execute("DELETE FROM students WHERE id = ?", (student_id,))
-        cursor.execute("DELETE FROM attendance_records WHERE student_name = ?", (student_name,))
-        conn.commit()
-        conn.close()
         
         # 删除人脸文件夹
         student_face_dir = KNOWN_FACES_FOLDER / student_name
@@ -291,10 +297,12 @@ def upload_face_image(student_id):
     """
     try:
         conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM students WHERE id = ?", (student_id,))
-        student = cursor.fetchone()
-        conn.close()
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT * FROM students WHERE id = ?", (student_id,))
+            student = cursor.fetchone()
+        finally:
+            conn.close()
         
         if not student:
             return format_response(False, "学生不存在", code=404)
@@ -360,10 +368,12 @@ def delete_face_image(student_id, filename):
     """删除指定的人脸图片"""
     try:
         conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM students WHERE id = ?", (student_id,))
-        student = cursor.fetchone()
-        conn.close()
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT * FROM students WHERE id = ?", (student_id,))
+            student = cursor.fetchone()
+        finally:
+            conn.close()
         
         if not student:
             return format_response(False, "学生不存在", code=404)
@@ -393,10 +403,12 @@ def get_face_image(student_id, filename):
     """获取人脸图片"""
     try:
         conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM students WHERE id = ?", (student_id,))
-        student = cursor.fetchone()
-        conn.close()
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT * FROM students WHERE id = ?", (student_id,))
+            student = cursor.fetchone()
+        finally:
+            conn.close()
         
         if not student:
             return format_response(False, "学生不存在", code=404)
@@ -1,10 +1,50 @@
 # 考勤记录相关函数
-import sqlite3
 from datetime import date, datetime
 from pathlib import Path
 from typing import List, Optional
 
-from src.databaseBuild.db import DB_PATH, register_student_to_db, get_student_id_by_name
+from src.databaseBuild.db import register_student_to_db, get_student_id_by_name
+from src.databaseBuild.dal import get_connection
+
+# 签到写入（同一学生同一天只保留一条记录，重复签到时更新）
+# 按 students.id 判重（学生改名后仍是同一条记录）；未注册的姓名按姓名判重，
+# 姓名判重只作用于未关联学生的记录（部分唯一索引），新学生沿用他人旧姓名时不会覆盖对方的记录
+_UPSERT_SET = '''
+        student_name = excluded.student_name,
+        status = excluded.status,
+        image_path = excluded.image_path,
+        confidence = excluded.confidence,
+        remark = excluded.remark,
+        created_at = CURRENT_TIMESTAMP
+'''
+UPSERT_ATTENDANCE_SQL = f'''
+    INSERT INTO attendance_records 
+    (student_name, student_ref, course_date, status, image_path, confidence, remark)
+    VALUES (:name, (SELECT id FROM students WHERE name = :name), :course_date,
+            :status, :image_path, :confidence, :remark)
+    ON CONFLICT(student_ref, course_date) DO UPDATE SET {_UPSERT_SET}
+    ON CONFLICT(student_name, course_date) WHERE student_ref IS NULL DO UPDATE SET {_UPSERT_SET}
+'''
+
+# 抓拍图异步写盘完成后回填路径
+UPDATE_IMAGE_PATH_SQL = '''
+    UPDATE attendance_records SET image_path = :image_path
+    WHERE course_date = :course_date
+      AND (student_ref = (SELECT id FROM students WHERE name = :name)
+           OR (student_ref IS NULL AND student_name = :name))
+'''
+
+
+def attendance_params(name, course_date, image_path="", confidence=0.0, status="present", remark=""):
+    """UPSERT_ATTENDANCE_SQL 的参数"""
+    return {
+        'name': name,
+        'course_date': course_date.isoformat(),
+        'status': status,
+        'image_path': image_path,
+        'confidence': confidence,
+        'remark': remark,
+    }
 
 def record_attendance(
     name: str,
@@ -20,20 +60,11 @@ def record_attendance(
     #     print(f"❌ 未知学生: {name}，请先注册")
     #     return False
 
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
+    conn = get_connection()
     try:
-        cursor.execute('''
-            INSERT INTO attendance_records 
-            (student_name, course_date, status, image_path, confidence, remark)
-            VALUES (?, ?, ?, ?, ?, ?)
-            ON CONFLICT(student_name, course_date) DO UPDATE SET
-                status = excluded.status,
-                image_path = excluded.image_path,
-                confidence = excluded.confidence,
-                remark = excluded.remark,
-                created_at = CURRENT_TIMESTAMP
-        ''', (name, course_date.isoformat(), status, image_path, confidence, remark))
+        cursor = conn.cursor()
+        cursor.execute(UPSERT_ATTENDANCE_SQL,
+                       attendance_params(name, course_date, image_path, confidence, status, remark))
         conn.commit()
         print(f"✅ {name} 签到成功 ({course_date})")
         return True
@@ -43,6 +74,108 @@ def record_attendance(
     finally:
         conn.close()
 
+def record_attendance_async(
+    name: str,
+    course_date: date,
+    image_path: str,
+    confidence: float,
+    status: str = "present",
+    remark: str = "",
+    callback=None
+):
+    """
+    异步签到：交给考勤写入线程批量提交，立即返回
+
+    Args:
+        callback: 可选，写入完成后以 (name, success) 调用
+
+    Returns:
+        Future: 写入完成后结果为 bool
+    """
+    from src.attendance_writer import get_attendance_writer
+    return get_attendance_writer().submit(name, course_date, image_path, confidence,
+                                          status, remark, callback=callback)
+
+def attach_capture_path(capture_future, name: str, course_date: date):
+    """抓拍图写盘完成后，把保存路径回填到签到记录（须在签到记录入队之后调用）"""
+    from src.attendance_writer import get_attendance_writer
+
+    def on_saved(future):
+        path = None if future.exception() else future.result()
+        if path:
+            get_attendance_writer().update_image_path(name, course_date, path)
+
+    capture_future.add_done_callback(on_saved)
+
+# 批量签到的单条结果
+SIGNIN_NEW = "new"                    # 本次签到成功
+SIGNIN_ALREADY = "already_signed"     # 当天已有签到记录（不覆盖）
+SIGNIN_UNKNOWN = "unknown_student"    # 学生未注册
+
+# 单条语句的姓名数上限（每个姓名占 2 个绑定参数）
+_SIGNIN_CHUNK = 400
+
+def sign_in_batch(
+    names,
+    course_date: date,
+    status: str = "present",
+    image_path: str = "",
+    remark: str = "",
+    confidences: Optional[dict] = None
+) -> dict:
+    """
+    在一个事务中批量签到：校验学生、跳过当天已签到的学生并写入其余学生
+
+    Args:
+        names: 学生姓名列表（重复姓名只签到一次）
+        course_date: 签到日期
+        confidences: 可选，{姓名: 置信度}，缺省为 0.0
+
+    Returns:
+        dict: {姓名: SIGNIN_NEW / SIGNIN_ALREADY / SIGNIN_UNKNOWN}，顺序与 names 一致
+    """
+    names = list(dict.fromkeys(name for name in names if name))
+    confidences = confidences or {}
+    day = course_date.isoformat()
+    registered, inserted = set(), set()
+
+    conn = get_connection()
+    try:
+        with conn:
+            for i in range(0, len(names), _SIGNIN_CHUNK):
+                chunk = names[i:i + _SIGNIN_CHUNK]
+                values = ','.join(['(?, ?)'] * len(chunk))
+                params = [v for name in chunk for v in (name, float(confidences.get(name, 0.0)))]
+                # 未注册的姓名在 JOIN 中被过滤；当天已有记录的学生由 DO NOTHING 跳过，
+                # RETURNING 只返回本次新写入的学生
+                rows = conn.execute(f'''
+                    WITH incoming(name, confidence) AS (VALUES {values})
+                    INSERT INTO attendance_records
+                    (student_name, student_ref, course_date, status, image_path, confidence, remark)
+                    SELECT s.name, s.id, ?, ?, ?, incoming.confidence, ?
+                    FROM incoming JOIN students s ON s.name = incoming.name
+                    WHERE true
+                    ON CONFLICT DO NOTHING
+                    RETURNING student_name
+                ''', params + [day, status, image_path, remark]).fetchall()
+                inserted.update(row[0] for row in rows)
+                registered.update(row[0] for row in conn.execute(
+                    f"SELECT name FROM students WHERE name IN ({','.join('?' * len(chunk))})", chunk))
+    finally:
+        conn.close()
+
+    outcomes = {}
+    for name in names:
+        if name in inserted:
+            outcomes[name] = SIGNIN_NEW
+        elif name in registered:
+            outcomes[name] = SIGNIN_ALREADY
+        else:
+            outcomes[name] = SIGNIN_UNKNOWN
+    if inserted:
+        print(f"✅ 批量签到 {len(inserted)} 人 ({course_date})")
+    return outcomes
+
 def manual_sign_in(student_name: str, course_date: date = None, remark: str = "补签"):
     """手动补签（管理员用）"""
     if course_date is None:
@@ -52,35 +185,40 @@ def manual_sign_in(student_name: str, course_date: date = None, remark: str = "
 
 def query_attendance(student_name: Optional[str] = None, course_date: Optional[date] = None) -> List[dict]:
     """查询签到状态"""
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
-
-    # 只从 attendance_records 查询（因为学生信息已冗余在 student_name 中）
-    query = '''
-        SELECT 
-            student_name AS name,
-            '' AS student_id,          -- 如果需要，可后续通过 name 查 students 表补全
-            course_date,
-            status,
-            remark,
-            created_at
-        FROM attendance_records
-        WHERE 1=1
-    '''
-    params = []
-
-    if student_name:
-        query += " AND student_name = ?"
-        params.append(student_name)
-    
-    if course_date:
-        query += " AND course_date = ?"
-        params.append(course_date.isoformat())
+    conn = get_connection()
+    try:
+        cursor = conn.cursor()
 
-    query += " ORDER BY created_at DESC"
+        # 通过 student_ref 关联学生，返回学生当前的姓名与学号
+        query = '''
+            SELECT 
+                COALESCE(s.name, ar.student_name) AS name,
+                COALESCE(s.student_id, '') AS student_id,
+                ar.course_date,
+                ar.status,
+                ar.remark,
+                ar.created_at
+            FROM attendance_records ar
+            LEFT JOIN students s ON ar.student_ref = s.id
+            WHERE 1=1
+        '''
+        params = []
 
-    cursor.execute(query, params)
-    rows = cursor.fetchall()
-    conn.close()
+        if student_name:
+            # 按学生 id 查询（改名前的记录同样返回）；未关联学生的记录按签到时的姓名
+            query += '''
+                AND (ar.student_ref = (SELECT id FROM students WHERE name = ?)
+                     OR (ar.student_ref IS NULL AND ar.student_name = ?))'''
+            params.extend([student_name, student_name])
+        
+        if course_date:
+            query += " AND ar.course_date = ?"
+            params.append(course_date.isoformat())
+
+        query += " ORDER BY ar.created_at DESC"
+
+        cursor.execute(query, params)
+        rows = cursor.fetchall()
+    finally:
+        conn.close()
     return [dict(row) for row in rows]
\ No newline at end of file
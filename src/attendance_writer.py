@@ -0,0 +1,193 @@
+# 考勤异步写入：单写线程批量提交（group commit），识别线程只负责入队
+import sys
+import time
+import queue
+import atexit
+import threading
+from concurrent.futures import Future
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from src import config
+from src.attendance import UPSERT_ATTENDANCE_SQL, UPDATE_IMAGE_PATH_SQL, attendance_params
+from src.databaseBuild.db import DB_PATH
+from src.databaseBuild.dal import get_connection
+
+_STOP = object()
+
+
+class AttendanceWriter:
+    """
+    考勤写入线程
+
+    识别请求 / 实时循环调用 submit() 入队后立即返回；写线程每积累 batch_size 条
+    或等待 flush_ms 毫秒后，在同一个连接、同一个事务中写入整批记录并提交一次。
+    每条记录对应一个 Future（结果为 True/False），提交成功后依次调用完成回调
+    （例如广播 WebSocket 签到事件）。
+    """
+
+    def __init__(self, db_path=DB_PATH, batch_size=None, flush_ms=None):
+        self.db_path = db_path
+        self.batch_size = batch_size or config.ATTENDANCE_BATCH_SIZE
+        self.flush_ms = config.ATTENDANCE_FLUSH_MS if flush_ms is None else flush_ms
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._closed = False
+        self._batches = 0
+        self._written = 0
+        self._failed = 0
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='attendance-writer', daemon=True)
+                self._thread.start()
+        return self
+
+    def submit(self, name, course_date, image_path="", confidence=0.0,
+               status="present", remark="", callback=None):
+        """
+        提交一条签到记录（参数与 record_attendance 相同）
+
+        Args:
+            callback: 可选，写入完成后以 (name, success) 调用（在写线程中执行）
+
+        Returns:
+            Future: 写入完成后结果为 bool
+        """
+        future = self._enqueue(UPSERT_ATTENDANCE_SQL,
+                               attendance_params(name, course_date, image_path, confidence, status, remark),
+                               f"✅ {name} 签到成功 ({course_date})")
+        if callback is not None:
+            future.add_done_callback(lambda f: callback(name, not f.exception() and f.result()))
+        return future
+
+    def update_image_path(self, name, course_date, image_path):
+        """
+        更新签到记录的抓拍图路径（截图异步写盘完成后调用）
+
+        Returns:
+            Future: 写入完成后结果为 bool
+        """
+        return self._enqueue(UPDATE_IMAGE_PATH_SQL, {
+            'image_path': image_path, 'name': name, 'course_date': course_date.isoformat()
+        })
+
+    def _enqueue(self, sql, params, message=None):
+        future = Future()
+        if self._closed:
+            future.set_result(False)
+            return future
+        self.start()
+        self._queue.put(((sql, params, message), future))
+        return future
+
+    def flush(self, timeout=None):
+        """等待此前提交的记录全部写入"""
+        if self._thread is None:
+            return True
+        marker = Future()
+        self._queue.put((None, marker))
+        try:
+            marker.result(timeout)
+            return True
+        except Exception:
+            return False
+
+    def close(self, timeout=5.0):
+        """写入剩余记录并停止写线程（进程退出时自动调用）"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        if self._thread is not None:
+            self._queue.put((_STOP, None))
+            self._thread.join(timeout)
+
+    def stats(self):
+        return {
+            'pending': self._queue.qsize(),
+            'batches': self._batches,
+            'written': self._written,
+            'failed': self._failed,
+            'avg_batch_size': round(self._written / self._batches, 2) if self._batches else 0.0,
+        }
+
+    def _run(self):
+        # 写线程独占一条连接（WAL + synchronous=NORMAL），直到写线程退出才归还
+        conn = get_connection(path=self.db_path)
+        try:
+            stopping = False
+            while not stopping:
+                batch, markers, stopping = self._collect()
+                if batch:
+                    self._write(conn, batch)
+                for marker in markers:
+                    marker.set_result(True)
+        finally:
+            conn.close()
+
+    def _collect(self):
+        """取出一批记录：第一条到达后最多再等待 flush_ms，或凑满 batch_size 条"""
+        batch, markers = [], []
+        item, future = self._queue.get()
+        deadline = time.perf_counter() + self.flush_ms / 1000
+        while True:
+            if item is _STOP:
+                return batch, markers, True
+            if item is None:
+                # flush() 的标记：写完本批后通知
+                markers.append(future)
+                return batch, markers, False
+            batch.append((item, future))
+            remaining = deadline - time.perf_counter()
+            if len(batch) >= self.batch_size or remaining <= 0:
+                return batch, markers, False
+            try:
+                item, future = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                return batch, markers, False
+
+    def _write(self, conn, batch):
+        try:
+            with conn:
+                for (sql, params, _), _ in batch:
+                    conn.execute(sql, params)
+            results = [True] * len(batch)
+        except Exception as e:
+            # 整批失败时逐条重试，避免一条坏记录拖累整批
+            print(f"⚠️ 批量签到写入失败，逐条重试: {e}")
+            results = []
+            for (sql, params, _), _ in batch:
+                try:
+                    with conn:
+                        conn.execute(sql, params)
+                    results.append(True)
+                except Exception as row_error:
+                    print(f"❌ 签到失败: {params} - {row_error}")
+                    results.append(False)
+
+        self._batches += 1
+        self._written += sum(results)
+        self._failed += len(results) - sum(results)
+        for ((_, _, message), future), ok in zip(batch, results):
+            if ok and message:
+                print(message)
+            future.set_result(ok)
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_attendance_writer():
+    """进程内共享的考勤写入线程（退出时自动写完队列中的记录）"""
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = AttendanceWriter()
+            atexit.register(_writer.close)
+        return _writer
@@ -0,0 +1,123 @@
+# 跨请求的人脸特征微批处理
+import sys
+import time
+import queue
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+PROJECT_ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from src import config
+
+
+class EmbeddingBatcher:
+    """
+    特征提取微批调度器
+
+    各请求 / 视频帧提交已对齐的 112x112 人脸图像并得到 Future；后台线程收集
+    最多 max_wait_ms 毫秒或 max_batch_size 张人脸后，交给执行线程从推理池借出一份模型，
+    对整批调用一次 get_feat，再把结果分发回各个 Future。
+    最多同时执行 pool.size 批（每份模型实例一批）；实例全忙时收集线程暂停取批，
+    期间到达的人脸并入下一批。
+    """
+
+    def __init__(self, pool, max_batch_size=None, max_wait_ms=None):
+        self.pool = pool
+        self.max_batch_size = max(1, max_batch_size or config.EMBED_BATCH_MAX_SIZE)
+        wait_ms = config.EMBED_BATCH_MAX_WAIT_MS if max_wait_ms is None else max_wait_ms
+        self.max_wait = wait_ms / 1000.0
+        self._queue = queue.Queue()
+        self._thread = None
+        self._executor = None
+        self._slots = threading.Semaphore(pool.size)
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._batches = 0
+        self._items = 0
+        self._max_batch = 0
+
+    def _ensure_started(self):
+        if self._thread is None:
+            with self._start_lock:
+                if self._thread is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.pool.size,
+                                                        thread_name_prefix='embedding-batch')
+                    self._thread = threading.Thread(target=self._run, name='embedding-batcher', daemon=True)
+                    self._thread.start()
+
+    def submit(self, crop):
+        """
+        提交一张对齐后的人脸图像，返回 Future（结果为一维特征向量）
+
+        完成后 Future.inference 为所在批次的模型推理耗时（秒，不含等待合批与借出模型）
+        """
+        self._ensure_started()
+        future = Future()
+        self._queue.put((crop, future))
+        return future
+
+    def embed(self, crops):
+        """
+        批量提交并等待结果
+
+        Returns:
+            (feats, inference): (M, D) 特征矩阵；涉及批次中最长的模型推理耗时（秒，各批并行执行）
+        """
+        futures = [self.submit(crop) for crop in crops]
+        if not futures:
+            return np.zeros((0, 512), dtype=np.float32), 0.0
+        feats = np.stack([future.result() for future in futures])
+        return feats, max(future.inference for future in futures)
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            # 等到有空闲的模型实例再封批，实例全忙时新到的人脸继续进入队列
+            self._slots.acquire()
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                try:
+                    # 等待时间到后仍取走已在队列中的请求，不额外等待
+                    batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            self._executor.submit(self._dispatch, batch)
+
+    def _dispatch(self, batch):
+        crops = [crop for crop, _ in batch]
+        try:
+            with self.pool.acquire() as models:
+                t0 = time.perf_counter()
+                feats = models.rec_model.get_feat(crops)
+                inference = time.perf_counter() - t0
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        finally:
+            self._slots.release()
+
+        for (_, future), feat in zip(batch, feats):
+            future.inference = inference
+            future.set_result(feat)
+        with self._stats_lock:
+            self._batches += 1
+            self._items += len(batch)
+            self._max_batch = max(self._max_batch, len(batch))
+
+    def stats(self):
+        with self._stats_lock:
+            return {
+                'max_batch_size': self.max_batch_size,
+                'max_wait_ms': round(self.max_wait * 1000, 2),
+                'batches': self._batches,
+                'faces': self._items,
+                'avg_batch_size': round(self._items / self._batches, 2) if self._batches else 0.0,
+                'largest_batch': self._max_batch,
+                'queued': self._queue.qsize(),
+            }
@@ -0,0 +1,104 @@
+# 服务端摄像头引擎：后台采集 + 识别，MJPEG 推流与结果推送
+import sys
+import time
+import threading
+from pathlib import Path
+
+import cv2
+
+PROJECT_ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from src import config
+from src.pipeline import FramePipeline
+
+
+class CameraEngine:
+    """
+    服务端摄像头引擎
+
+    在服务端直接读取摄像头，经 FramePipeline 在后台完成识别，
+    省去浏览器编码 JPEG -> base64 -> JSON -> 服务端解码的往返：
+    - process(frame) 返回 (payload, annotated_frame)
+    - 输出线程把标注后的画面编码为 JPEG 供 MJPEG 流读取，并调用 on_result(payload) 推送结果
+    """
+
+    def __init__(self, camera_index, process, on_result=None, stream_id='camera'):
+        self.camera_index = camera_index
+        self.process = process
+        self.on_result = on_result
+        self.stream_id = stream_id
+        self.capture = None
+        self.pipeline = None
+        self._sink_thread = None
+        self._frame_cond = threading.Condition()
+        self._jpeg = None
+        self._frame_id = 0
+
+    def start(self):
+        """打开摄像头并启动后台线程；摄像头无法打开时返回 False"""
+        self.capture = cv2.VideoCapture(self.camera_index)
+        if not self.capture.isOpened():
+            self.capture.release()
+            self.capture = None
+            return False
+        # 只保留最新帧，避免驱动缓冲区中积压旧帧
+        self.capture.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+
+        self.pipeline = FramePipeline(self._read, self.process, self._publish).start()
+        self._sink_thread = threading.Thread(target=self._sink_loop, name='camera-sink', daemon=True)
+        self._sink_thread.start()
+        return True
+
+    def stop(self):
+        if self.pipeline:
+            self.pipeline.stop()
+        if self._sink_thread:
+            self._sink_thread.join(timeout=2)
+        if self.capture:
+            self.capture.release()
+            self.capture = None
+        with self._frame_cond:
+            self._jpeg = None
+            self._frame_cond.notify_all()
+
+    @property
+    def running(self):
+        return self.pipeline is not None and self.pipeline.running
+
+    def _read(self):
+        ret, frame = self.capture.read()
+        return frame if ret else None
+
+    def _sink_loop(self):
+        while self.pipeline.run_sink():
+            pass
+        self.pipeline.stop()
+
+    def _publish(self, frame, result, packet):
+        payload, annotated = result
+        ok, buffer = cv2.imencode('.jpg', annotated, [cv2.IMWRITE_JPEG_QUALITY, config.CAMERA_JPEG_QUALITY])
+        if ok:
+            with self._frame_cond:
+                self._jpeg = buffer.tobytes()
+                self._frame_id += 1
+                self._frame_cond.notify_all()
+        if self.on_result:
+            payload['latency_ms'] = round((time.perf_counter() - packet['captured_at']) * 1000, 2)
+            self.on_result(payload)
+
+    def mjpeg_frames(self):
+        """MJPEG 流生成器（multipart/x-mixed-replace），每个新标注帧输出一段"""
+        last_id = 0
+        while self.running:
+            with self._frame_cond:
+                if self._frame_id == last_id:
+                    self._frame_cond.wait(timeout=1.0)
+                if self._jpeg is None or self._frame_id == last_id:
+                    continue
+                jpeg, last_id = self._jpeg, self._frame_id
+            yield (b'--frame\r\nContent-Type: image/jpeg\r\nContent-Length: '
+                   + str(len(jpeg)).encode() + b'\r\n\r\n' + jpeg + b'\r\n')
+
+    def stats(self):
+        return self.pipeline.stats() if self.pipeline else None
@@ -0,0 +1,148 @@
+# 抓拍图异步保存：小线程池编码写盘，每个会话每名学生只保留质量最高的一张
+import os
+import re
+import sys
+import atexit
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+import cv2
+
+PROJECT_ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from src import config
+
+
+class CaptureStore:
+    """
+    抓拍图存储
+
+    - submit() 在调用线程中只复制人脸区域，编码与写盘交给线程池，识别不再等待磁盘
+    - 同一会话中同一学生只保留分数最高的裁剪图：分数不高于已保存的图时不写盘，
+      直接返回已保存图的路径；更高分的图覆盖同一个文件（先写临时文件再替换）
+    - 返回的 Future 结果为最终保存路径（失败时为 None），可据此回填签到记录
+    """
+
+    def __init__(self, capture_dir=None, workers=None):
+        self.capture_dir = Path(capture_dir or config.CAPTURE_DIR)
+        self.capture_dir.mkdir(parents=True, exist_ok=True)
+        self._executor = ThreadPoolExecutor(max_workers=workers or config.CAPTURE_WORKERS,
+                                            thread_name_prefix='capture')
+        self._lock = threading.Lock()
+        self._sessions = {}  # {session_id: {'tag': str, 'best': {name: (score, future)}}}
+        self._written = 0
+        self._skipped = 0
+
+    def submit(self, name, frame, bbox, score, session_id='default'):
+        """
+        保存一张人脸裁剪图
+
+        Args:
+            name: 学生姓名
+            frame: 整帧 BGR 图像（只复制人脸区域，调用后可继续复用该帧）
+            bbox: 人脸框 [x1, y1, x2, y2]
+            score: 质量分数（如匹配相似度），越高越好
+            session_id: 会话（视频流）标识
+
+        Returns:
+            Future: 结果为保存路径（str），无法裁剪或写盘失败时为 None
+        """
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                session = self._sessions[session_id] = {
+                    'tag': f"{_safe(session_id)}_{datetime.now().strftime('%Y%m%d_%H%M%S')}",
+                    'best': {}
+                }
+            best = session['best'].get(name)
+            if best is not None and score <= best[0]:
+                self._skipped += 1
+                return best[1]
+
+            crop = _crop(frame, bbox)
+            if crop is None:
+                future = Future()
+                future.set_result(None)
+                return future
+            path = self.capture_dir / f"{_safe(name)}_{session['tag']}.jpg"
+            future = self._executor.submit(self._write, crop, path, session_id, name, score)
+            session['best'][name] = (score, future)
+            return future
+
+    def end_session(self, session_id):
+        """结束会话（停止摄像头 / 断开连接时调用），之后的抓拍重新开始计分"""
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def close(self):
+        """等待未完成的写盘任务（进程退出时自动调用）"""
+        self._executor.shutdown(wait=True)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'sessions': len(self._sessions),
+                'written': self._written,
+                'skipped': self._skipped,
+            }
+
+    def _write(self, crop, path, session_id, name, score):
+        # 限制尺寸，避免高分辨率画面中的大脸生成过大的文件
+        max_side = config.CAPTURE_MAX_SIDE
+        if max(crop.shape[:2]) > max_side:
+            scale = max_side / max(crop.shape[:2])
+            crop = cv2.resize(crop, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        ok, buffer = cv2.imencode('.jpg', crop, [cv2.IMWRITE_JPEG_QUALITY, config.CAPTURE_JPEG_QUALITY])
+        if not ok:
+            return None
+        tmp_path = path.with_name(f"{path.name}.{threading.get_ident()}.tmp")
+        try:
+            tmp_path.write_bytes(buffer.tobytes())
+            with self._lock:
+                # 写盘期间已有更高分的裁剪图提交时放弃本次结果，避免旧图覆盖新图
+                best = self._sessions.get(session_id, {}).get('best', {}).get(name)
+                if best is not None and best[0] > score:
+                    tmp_path.unlink()
+                    return str(path)
+                os.replace(tmp_path, path)
+                self._written += 1
+        except OSError as e:
+            print(f"⚠️ 抓拍图保存失败: {path} - {e}")
+            return None
+        return str(path)
+
+
+def _crop(frame, bbox):
+    height, width = frame.shape[:2]
+    x1, y1, x2, y2 = [int(v) for v in bbox[:4]]
+    x1, y1 = max(x1, 0), max(y1, 0)
+    x2, y2 = min(x2, width), min(y2, height)
+    if x2 <= x1 or y2 <= y1:
+        return None
+    return frame[y1:y2, x1:x2].copy()
+
+
+def _safe(text):
+    """文件名中去掉路径分隔符等字符"""
+    return re.sub(r'[\\/:*?"<>|\s]+', '_', str(text))
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_capture_store():
+    """进程内共享的抓拍图存储"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            # 先创建考勤写入线程：atexit 后注册先执行，保证退出时
+            # 抓拍图写完、回填路径入队之后写入线程才关闭
+            from src.attendance_writer import get_attendance_writer
+            get_attendance_writer()
+            _store = CaptureStore()
+            atexit.register(_store.close)
+        return _store
@@ -7,7 +7,9 @@ DATA_DIR = os.path.join(BASE_DIR, 'data')
 KNOWN_FACES_DIR = os.path.join(DATA_DIR, 'train')
 CLASSROOM_DIR = os.path.join(DATA_DIR, 'test')
 OUTPUT_DIR = os.path.join(DATA_DIR, 'outputs')
-DB_PATH = os.path.join(DATA_DIR, 'students.pkl')
+DB_PATH = os.path.join(DATA_DIR, 'students.pkl')  # 旧版 pickle 特征库，仅用于一次性转换
+GALLERY_PATH = os.path.join(DATA_DIR, 'students.gallery')  # 内存映射特征库
+GALLERY_DTYPE = 'float32'  # 'float32' 可零拷贝共享；'float16' 文件减半但匹配时需转换
 
 # Model Settings
 # Cosine similarity threshold for face matching
@@ -30,4 +32,97 @@ SIMILARITY_THRESHOLD = 0.35  # 根据你的数据调整
 
 # 路径配置
 CAPTURE_DIR = PROJECT_ROOT / "data" / "captures"  # 保存抓拍图像
-OUTPUTS_DIR = PROJECT_ROOT / "data" / "results"  # 保存输出视频
\ No newline at end of file
+OUTPUTS_DIR = PROJECT_ROOT / "data" / "results"  # 保存输出视频
+
+# 近似最近邻（ANN）索引配置
+# 特征库规模达到 ANN_MIN_GALLERY_SIZE 后，注册时自动构建 IVF 索引，识别时优先使用；
+# 规模较小时暴力检索更快，作为默认回退。
+ANN_ENABLED = True
+ANN_INDEX_PATH = os.path.join(DATA_DIR, 'students.ivf.npz')
+ANN_MIN_GALLERY_SIZE = 20000
+ANN_NLIST = None        # 簇数，None 表示 4 * sqrt(N)
+ANN_NPROBE = 16         # 每次查询扫描的簇数：越大召回越高、延迟越大
+ANN_RERANK_TOPK = 10    # 精确重排的候选数
+
+# 特征库量化配置
+# None 表示全精度暴力检索；'int8' 表示按维度缩放的 int8 粗排 + 全精度重排
+# （python src/quantization.py 可查看内存节省与召回损失）
+GALLERY_QUANTIZATION = None
+QUANT_RERANK_TOPK = 20  # 全精度重排的候选数
+
+# 多模板匹配配置（每张注册照片保存一个模板）
+TEMPLATE_AGGREGATION = 'max'  # 'max' 取最相似模板；'topm' 取最相似 m 个模板的均值
+TEMPLATE_TOP_M = 2
+
+# 注册照片特征缓存（按内容哈希 + 模型名 + 检测尺寸）
+EMBEDDING_CACHE_PATH = os.path.join(DATA_DIR, 'embedding_cache.db')
+
+# 批量注册并行度：未命中缓存的照片按 解码 -> 检测 -> 特征 流水线处理，
+# 大于 1 时使用多进程，每个进程加载一份模型，onnxruntime 线程数为 CPU 核数 / 进程数
+# （命令行 python src/register.py --workers N 可临时覆盖）
+REGISTER_WORKERS = 1
+
+# 推理池：并发请求最多同时使用的模型实例数（每份约数百 MB 内存），
+# 每份实例的 onnxruntime intra-op 线程数为 CPU 核数 / INFERENCE_POOL_SIZE
+INFERENCE_POOL_SIZE = 2
+
+# 特征提取微批处理：并发请求 / 视频帧的人脸对齐后合并为一批推理
+EMBED_BATCHING = True
+EMBED_BATCH_MAX_SIZE = 32     # 每批最多人脸数
+EMBED_BATCH_MAX_WAIT_MS = 5   # 凑批最长等待（毫秒）
+
+# 大图分块检测：长边超过 TILE_MIN_IMAGE_SIDE 时，在整图检测之外切成重叠分块并行检测，NMS 合并
+TILED_DETECTION = True
+TILE_MIN_IMAGE_SIDE = 1600  # 长边不超过该值时只做整图检测
+TILE_MIN_SCALE = 0.5        # 分块缩放到检测输入后的最小缩放比例（决定分块边长）
+TILE_OVERLAP = 0.2          # 相邻分块重叠比例，需大于后排人脸尺寸 / 分块边长
+TILE_MAX_TILES = 16         # 分块数上限，超过时自动增大分块
+TILE_NMS_IOU = 0.4
+
+# 检测级联（仅实时识别使用）：先以低分辨率检测，人脸过小、分数偏低或人数不足时才升级
+DETECTION_CASCADE = True
+CASCADE_LOW_SIZE = (320, 320)
+CASCADE_MIN_SCORE = 0.65     # 低于该分数的人脸在局部区域复检
+CASCADE_MIN_FACE_PX = 20     # 人脸在低分辨率检测输入中的最小边长（像素）
+CASCADE_CROP_SCALE = 3.0     # 复检区域边长 / 人脸边长
+
+# 实时识别人脸跟踪：IoU + Kalman 关联，按轨迹缓存身份
+REALTIME_TRACKING = True
+TRACK_IOU_THRESHOLD = 0.3        # 检测框与预测框的最小 IoU
+TRACK_MAX_MISSES = 10            # 连续未匹配帧数超过该值时删除轨迹
+TRACK_REVERIFY_FRAMES = 30       # 已识别轨迹每隔多少帧重新提取特征复核
+TRACK_UNKNOWN_RETRY_FRAMES = 5   # 未识别轨迹的重试间隔（帧）
+TRACK_VOTE_DECAY = 0.8           # 身份投票的衰减系数，越小越偏向最近的比对结果
+TRACKER_IDLE_SECONDS = 300       # 视频流跟踪器闲置多久后清理
+
+# 实时流水线（采集 -> 推理 -> 输出）
+PIPELINE_QUEUE_SIZE = 2        # 各级队列长度，满时丢弃最旧帧
+PIPELINE_WORKERS = 1           # 推理线程数（开启跟踪时固定为 1，保证帧序）
+PIPELINE_STATS_INTERVAL = 5    # 统计输出间隔（秒）
+
+# 服务端摄像头 MJPEG 推流的 JPEG 质量
+CAMERA_JPEG_QUALITY = 80
+
+# 识别接口的响应模式：'results' 只返回结果数据（前端自行绘制），
+# 'preview' 附带缩略标注图，'full' 附带原尺寸标注图（兼容旧前端）
+RESPONSE_MODE_DEFAULT = 'full'
+PREVIEW_MAX_SIDE = 640            # 缩略标注图的最长边（像素）
+ANNOTATION_JPEG_QUALITY = 85
+# 标注图缓存：按请求 id 保存原图与结果，前端按需获取标注图
+ANNOTATION_CACHE_MAX_ITEMS = 64
+ANNOTATION_CACHE_MAX_BYTES = 256 * 1024 * 1024
+ANNOTATION_CACHE_TTL = 600        # 秒
+
+# 考勤异步写入：单写线程批量提交
+ATTENDANCE_BATCH_SIZE = 64    # 每批最多写入的记录数
+ATTENDANCE_FLUSH_MS = 20      # 第一条记录入队后最多等待多久提交（毫秒）
+
+# 抓拍图异步保存：每个会话每名学生只保留质量最高的一张
+CAPTURE_WORKERS = 2           # 编码写盘线程数
+CAPTURE_MAX_SIDE = 256        # 裁剪图最长边（像素）
+CAPTURE_JPEG_QUALITY = 90
+
+# SQLite 连接池（WAL 模式）
+DB_POOL_SIZE = 8                 # 每个数据库保留的空闲连接数
+DB_BUSY_TIMEOUT_MS = 5000        # 写锁等待时间，超时才报 database is locked
+DB_STATEMENT_CACHE_SIZE = 256    # 每条连接缓存的预编译语句数
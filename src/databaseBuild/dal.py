@@ -0,0 +1,140 @@
+# 数据库访问层：按线程复用的 SQLite 连接（WAL、busy_timeout、语句缓存、只读连接）
+# src/databaseBuild/dal.py
+import sys
+import sqlite3
+import threading
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from src import config
+from src.databaseBuild.db import DB_PATH
+from src.databaseBuild.migrations import migrate
+
+# 线程正在使用的连接：{(数据库路径, 是否只读): _Slot}
+_local = threading.local()
+# 空闲连接：{(数据库路径, 是否只读): [sqlite3.Connection]}
+# 开发服务器每个请求一个线程，连接归还后放回这里供后续线程复用
+_idle = {}
+_idle_lock = threading.Lock()
+# 本进程已迁移到最新版本的数据库路径（命令行脚本不经过 init_db，首次连接时补齐迁移）
+_migrated = set()
+_migrate_lock = threading.Lock()
+
+
+class _Slot:
+    """线程内的一条底层连接及其当前借用数"""
+
+    def __init__(self, key, conn):
+        self.key = key
+        self.conn = conn
+        self.users = 0
+
+
+class PooledConnection:
+    """
+    借出的连接
+
+    用法与 sqlite3.Connection 相同（cursor / execute / commit / with 事务），
+    close() 只归还连接而不真正关闭；同一线程内嵌套借用得到同一条连接，
+    最后一个借用者归还时回滚未提交的事务并把连接放回空闲池。
+    调用方必须在 try/finally 中 close()（with 只管理事务，不归还连接）。
+    """
+
+    def __init__(self, slot):
+        self._slot = slot
+        self._released = False
+        slot.users += 1
+
+    def __getattr__(self, name):
+        return getattr(self._slot.conn, name)
+
+    def __enter__(self):
+        self._slot.conn.__enter__()
+        return self
+
+    def __exit__(self, *exc):
+        return self._slot.conn.__exit__(*exc)
+
+    def close(self):
+        """归还连接"""
+        if self._released:
+            return
+        self._released = True
+        slot = self._slot
+        slot.users -= 1
+        if slot.users > 0:
+            return
+        if slot.conn.in_transaction:
+            slot.conn.rollback()
+        slots = getattr(_local, 'slots', {})
+        if slots.get(slot.key) is slot:
+            del slots[slot.key]
+        with _idle_lock:
+            idle = _idle.setdefault(slot.key, [])
+            if len(idle) < config.DB_POOL_SIZE:
+                idle.append(slot.conn)
+                return
+        slot.conn.close()
+
+
+def _connect(path, readonly):
+    timeout = config.DB_BUSY_TIMEOUT_MS / 1000
+    if readonly and Path(path).exists():
+        conn = sqlite3.connect(f"file:{Path(path).as_posix()}?mode=ro", uri=True, timeout=timeout,
+                               cached_statements=config.DB_STATEMENT_CACHE_SIZE, check_same_thread=False)
+        conn.execute("PRAGMA query_only = ON")
+    else:
+        conn = sqlite3.connect(path, timeout=timeout, cached_statements=config.DB_STATEMENT_CACHE_SIZE,
+                               check_same_thread=False)
+        # WAL：读不阻塞写、写不阻塞读；NORMAL 下只在检查点时 fsync
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = NORMAL")
+    conn.execute(f"PRAGMA busy_timeout = {int(config.DB_BUSY_TIMEOUT_MS)}")
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def get_connection(readonly=False, path=None):
+    """
+    借出数据库连接（当前线程已借出时复用同一条，否则取空闲连接或新建）
+
+    Args:
+        readonly: 只读连接（统计等查询接口使用，不会持有写锁）
+        path: 数据库文件路径，默认 DB_PATH
+
+    Returns:
+        PooledConnection: 用完调用 close() 归还；行类型为 sqlite3.Row，可按列名或下标访问
+    """
+    key = (str(path or DB_PATH), readonly)
+    slots = getattr(_local, 'slots', None)
+    if slots is None:
+        slots = _local.slots = {}
+    slot = slots.get(key)
+    if slot is None:
+        _ensure_migrated(key[0])
+        with _idle_lock:
+            idle = _idle.get(key)
+            conn = idle.pop() if idle else None
+        slot = slots[key] = _Slot(key, conn or _connect(key[0], readonly))
+    return PooledConnection(slot)
+
+
+def _ensure_migrated(path):
+    """每个数据库文件在进程内首次借出连接前执行一次迁移"""
+    if path in _migrated:
+        return
+    with _migrate_lock:
+        if path not in _migrated:
+            migrate(path)
+            _migrated.add(path)
+
+
+def reset_connections():
+    """关闭所有空闲连接（数据库文件被替换或重建后调用）"""
+    with _idle_lock:
+        for idle in _idle.values():
+            for conn in idle:
+                conn.close()
+        _idle.clear()
@@ -0,0 +1,295 @@
+# 数据库结构版本迁移：按 PRAGMA user_version 记录版本，启动时补齐未执行的迁移
+# src/databaseBuild/migrations.py
+import sys
+import sqlite3
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from src.databaseBuild.db import DB_PATH
+
+
+def _v1_base_schema(conn):
+    """基础表结构（旧版本 init_db 创建的表，已存在时跳过）"""
+    # 学生信息表：
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS students (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL UNIQUE,
+            student_id TEXT UNIQUE,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    # 考勤记录表：
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS attendance_records (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            student_name TEXT NOT NULL,
+            course_date DATE NOT NULL,
+            status TEXT DEFAULT 'absent',
+            image_path TEXT,
+            confidence REAL,
+            remark TEXT,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE(student_name, course_date)
+        )
+    ''')
+
+
+def _v2_attendance_indexes(conn):
+    """考勤热点查询的索引"""
+    # /overview、/distribution、/trend、/alerts、/realtime/status：按日期 + 状态过滤，
+    # 附带 confidence 使 COUNT / AVG(confidence) 只读索引即可完成
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_attendance_date_status
+        ON attendance_records(course_date, status, confidence)
+    ''')
+    # /recent、/records、导出：按日期过滤并按签到时间排序
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_attendance_date_created
+        ON attendance_records(course_date, created_at)
+    ''')
+    # 学生列表按创建时间倒序分页
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_students_created
+        ON students(created_at)
+    ''')
+    conn.execute("ANALYZE")
+
+
+def _v3_student_ref(conn):
+    """考勤记录以 students.id 关联学生（student_name 保留为签到时的姓名）"""
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(attendance_records)")}
+    if 'student_ref' not in columns:
+        conn.execute("ALTER TABLE attendance_records ADD COLUMN student_ref INTEGER REFERENCES students(id)")
+    # 一次性回填已有记录
+    conn.execute('''
+        UPDATE attendance_records
+        SET student_ref = (SELECT id FROM students WHERE students.name = attendance_records.student_name)
+        WHERE student_ref IS NULL
+    ''')
+    # 同一学生每天一条记录（改名后仍按 id 判重）；也用于按学生 + 日期范围查询
+    conn.execute('''
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_attendance_ref_date
+        ON attendance_records(student_ref, course_date)
+    ''')
+    # 兼容只按姓名写入的旧代码：插入时自动补齐 student_ref
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_attendance_fill_ref
+        AFTER INSERT ON attendance_records
+        WHEN NEW.student_ref IS NULL
+        BEGIN
+            UPDATE attendance_records
+            SET student_ref = (SELECT id FROM students WHERE name = NEW.student_name)
+            WHERE id = NEW.id;
+        END
+    ''')
+    # 先签到后注册（或删除后重新注册）的学生：注册时认领同名的未关联记录
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_students_claim_records
+        AFTER INSERT ON students
+        BEGIN
+            UPDATE attendance_records
+            SET student_ref = NEW.id
+            WHERE student_ref IS NULL AND student_name = NEW.name;
+        END
+    ''')
+    conn.execute("ANALYZE")
+
+
+def _v4_daily_stats(conn):
+    """按日期 × 状态增量维护的签到汇总表，以及学生总数计数（均由触发器维护）"""
+    # confidence_count 只计非空置信度，AVG = confidence_sum / confidence_count，与 AVG() 语义一致
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS daily_attendance_stats (
+            course_date DATE NOT NULL,
+            status TEXT NOT NULL,
+            record_count INTEGER NOT NULL DEFAULT 0,
+            confidence_sum REAL NOT NULL DEFAULT 0,
+            confidence_count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (course_date, status)
+        ) WITHOUT ROWID
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS table_row_counts (
+            table_name TEXT PRIMARY KEY,
+            row_count INTEGER NOT NULL DEFAULT 0
+        ) WITHOUT ROWID
+    ''')
+
+    # 写入、UPSERT 更新、修改、删除考勤记录时同步汇总（status 为空时按默认值 absent 计）
+    add = '''
+            INSERT INTO daily_attendance_stats
+                (course_date, status, record_count, confidence_sum, confidence_count)
+            VALUES (NEW.course_date, COALESCE(NEW.status, 'absent'), 1,
+                    COALESCE(NEW.confidence, 0), NEW.confidence IS NOT NULL)
+            ON CONFLICT(course_date, status) DO UPDATE SET
+                record_count = record_count + 1,
+                confidence_sum = confidence_sum + excluded.confidence_sum,
+                confidence_count = confidence_count + excluded.confidence_count;
+    '''
+    remove = '''
+            UPDATE daily_attendance_stats
+            SET record_count = record_count - 1,
+                confidence_sum = confidence_sum - COALESCE(OLD.confidence, 0),
+                confidence_count = confidence_count - (OLD.confidence IS NOT NULL)
+            WHERE course_date = OLD.course_date AND status = COALESCE(OLD.status, 'absent');
+            DELETE FROM daily_attendance_stats
+            WHERE course_date = OLD.course_date AND status = COALESCE(OLD.status, 'absent')
+              AND record_count <= 0;
+    '''
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_attendance_stats_insert
+        AFTER INSERT ON attendance_records
+        BEGIN{add}
+        END
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_attendance_stats_delete
+        AFTER DELETE ON attendance_records
+        BEGIN{remove}
+        END
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_attendance_stats_update
+        AFTER UPDATE OF course_date, status, confidence ON attendance_records
+        WHEN OLD.course_date IS NOT NEW.course_date
+          OR OLD.status IS NOT NEW.status
+          OR OLD.confidence IS NOT NEW.confidence
+        BEGIN{remove}{add}
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_students_count_insert
+        AFTER INSERT ON students
+        BEGIN
+            UPDATE table_row_counts SET row_count = row_count + 1 WHERE table_name = 'students';
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_students_count_delete
+        AFTER DELETE ON students
+        BEGIN
+            UPDATE table_row_counts SET row_count = row_count - 1 WHERE table_name = 'students';
+        END
+    ''')
+
+    # 一次性回填
+    conn.execute("DELETE FROM daily_attendance_stats")
+    conn.execute('''
+        INSERT INTO daily_attendance_stats
+            (course_date, status, record_count, confidence_sum, confidence_count)
+        SELECT course_date, COALESCE(status, 'absent'), COUNT(*),
+               COALESCE(SUM(confidence), 0), COUNT(confidence)
+        FROM attendance_records
+        GROUP BY course_date, COALESCE(status, 'absent')
+    ''')
+    conn.execute('''
+        INSERT INTO table_row_counts (table_name, row_count)
+        VALUES ('students', (SELECT COUNT(*) FROM students))
+        ON CONFLICT(table_name) DO UPDATE SET row_count = excluded.row_count
+    ''')
+
+
+def _v5_unlinked_name_unique(conn):
+    """姓名判重只作用于未关联学生的记录：新学生沿用改名学生的旧姓名时不会覆盖对方当天的记录"""
+    # 表级 UNIQUE(student_name, course_date) 无法直接删除，按 SQLite 推荐的方式重建表；
+    # 先保存依赖该表的索引和触发器（包括 students 上引用该表的触发器），重建后原样恢复
+    dependents = conn.execute('''
+        SELECT type, name, sql FROM sqlite_master
+        WHERE sql IS NOT NULL AND type IN ('index', 'trigger')
+          AND (tbl_name = 'attendance_records' OR sql LIKE '%attendance_records%')
+    ''').fetchall()
+    for kind, name, _ in dependents:
+        conn.execute(f'DROP {kind.upper()} IF EXISTS "{name}"')
+
+    conn.execute('''
+        CREATE TABLE attendance_records_new (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            student_name TEXT NOT NULL,
+            course_date DATE NOT NULL,
+            status TEXT DEFAULT 'absent',
+            image_path TEXT,
+            confidence REAL,
+            remark TEXT,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            student_ref INTEGER REFERENCES students(id)
+        )
+    ''')
+    columns = "id, student_name, course_date, status, image_path, confidence, remark, created_at, student_ref"
+    conn.execute(f"INSERT INTO attendance_records_new ({columns}) SELECT {columns} FROM attendance_records")
+    conn.execute("DROP TABLE attendance_records")
+    conn.execute("ALTER TABLE attendance_records_new RENAME TO attendance_records")
+
+    for _, _, sql in dependents:
+        conn.execute(sql)
+    # 未关联学生的记录仍按姓名 + 日期唯一（UPSERT_ATTENDANCE_SQL 的第二个冲突目标）
+    conn.execute('''
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_attendance_unlinked_name_date
+        ON attendance_records(student_name, course_date)
+        WHERE student_ref IS NULL
+    ''')
+    conn.execute("ANALYZE")
+
+
+# (版本号, 说明, 迁移函数)，版本号必须递增；已发布的迁移不要修改，新增变更追加新版本
+MIGRATIONS = [
+    (1, "基础表结构", _v1_base_schema),
+    (2, "考勤查询索引", _v2_attendance_indexes),
+    (3, "考勤记录按学生 id 关联", _v3_student_ref),
+    (4, "每日签到汇总表", _v4_daily_stats),
+    (5, "姓名判重仅限未关联学生的记录", _v5_unlinked_name_unique),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def get_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(path=None):
+    """
+    把数据库迁移到最新版本（每个版本一个事务，失败时回滚该版本并抛出异常）
+
+    Args:
+        path: 数据库文件路径，默认 DB_PATH
+
+    Returns:
+        int: 迁移后的版本号
+    """
+    path = Path(path or DB_PATH)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # 另一个进程正在迁移时等待其完成（表重建等迁移可能耗时较长）
+    conn = sqlite3.connect(path, isolation_level=None, timeout=60)
+    try:
+        conn.execute("PRAGMA journal_mode = WAL")
+        version = get_version(conn)
+        for target, description, apply in MIGRATIONS:
+            if target <= version:
+                continue
+            conn.execute("BEGIN IMMEDIATE")
+            # 持有写锁后重新读取版本：API 服务与命令行脚本同时启动时，
+            # 另一个进程可能已在我们等锁期间执行完该版本
+            version = get_version(conn)
+            if target <= version:
+                conn.execute("COMMIT")
+                continue
+            try:
+                apply(conn)
+                conn.execute(f"PRAGMA user_version = {int(target)}")
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                print(f"❌ 数据库迁移失败: v{target} {description}")
+                raise
+            version = target
+            print(f"✅ 数据库迁移完成: v{target} {description}")
+        return version
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    print(f"📂 数据库版本: v{migrate()}")
@@ -0,0 +1,199 @@
+# 接口热点查询语句：各接口与执行计划检查（query_plans.py）共用同一份 SQL
+# src/databaseBuild/queries.py
+
+# ==================== 汇总表（daily_attendance_stats / table_row_counts） ====================
+
+# 学生总数（触发器维护的计数）
+TOTAL_STUDENTS_SQL = "SELECT row_count as total FROM table_row_counts WHERE table_name = 'students'"
+
+# 某天正常签到人数与平均置信度：/api/statistics/overview、/api/realtime/status
+# 参数: (日期,)
+DAILY_PRESENT_STATS_SQL = """
+    SELECT
+        COALESCE(SUM(record_count), 0) as signed_count,
+        SUM(confidence_sum) / NULLIF(SUM(confidence_count), 0) as avg_confidence
+    FROM daily_attendance_stats
+    WHERE course_date = ? AND status = 'present'
+"""
+
+# 某天各状态人数：/api/statistics/distribution
+# 参数: (日期,)
+DAILY_STATUS_COUNTS_SQL = """
+    SELECT
+        status,
+        record_count as count
+    FROM daily_attendance_stats
+    WHERE course_date = ?
+"""
+
+# 每日正常签到人数：/api/statistics/trend
+# 参数: (开始日期, 结束日期)
+PRESENT_TREND_SQL = """
+    SELECT
+        course_date,
+        record_count as signed_count
+    FROM daily_attendance_stats
+    WHERE course_date BETWEEN ? AND ?
+        AND status = 'present'
+    ORDER BY course_date ASC
+"""
+
+# 统计期间内有签到记录的天数：/api/statistics/alerts、/api/statistics/student/<name>
+# 参数: (开始日期, 结束日期)
+ACTIVE_DAYS_SQL = """
+    SELECT COUNT(DISTINCT course_date) as total_days
+    FROM daily_attendance_stats
+    WHERE course_date BETWEEN ? AND ?
+"""
+
+# ==================== 考勤记录（attendance_records） ====================
+
+# 每个学生在统计期间内的正常签到天数：/api/statistics/alerts
+# 参数: (开始日期, 结束日期)
+STUDENT_ATTENDED_DAYS_SQL = """
+    SELECT
+        s.name,
+        s.student_id,
+        COUNT(ar.id) as attended_days
+    FROM students s
+    LEFT JOIN attendance_records ar
+        ON ar.student_ref = s.id
+        AND ar.course_date BETWEEN ? AND ?
+        AND ar.status = 'present'
+    GROUP BY s.id
+"""
+
+# 单个学生的正常签到天数与平均置信度：/api/statistics/student/<name>
+# 参数: (学生 id, 开始日期, 结束日期)
+STUDENT_PRESENT_STATS_SQL = """
+    SELECT
+        COUNT(*) as attended_days,
+        AVG(confidence) as avg_confidence
+    FROM attendance_records
+    WHERE student_ref = ?
+        AND course_date BETWEEN ? AND ?
+        AND status = 'present'
+"""
+
+# 单个学生最近的签到记录：/api/statistics/student/<name>
+# 参数: (学生 id, 开始日期, 结束日期)
+STUDENT_RECENT_RECORDS_SQL = """
+    SELECT
+        course_date,
+        status,
+        confidence,
+        created_at,
+        remark
+    FROM attendance_records
+    WHERE student_ref = ?
+        AND course_date BETWEEN ? AND ?
+    ORDER BY course_date DESC
+    LIMIT 10
+"""
+
+# 当天最近的签到：/api/realtime/recent
+# 参数: (日期, 条数)
+RECENT_SIGNINS_SQL = """
+    SELECT
+        COALESCE(s.name, ar.student_name) AS student_name,
+        ar.course_date,
+        ar.status,
+        ar.confidence,
+        ar.created_at,
+        ar.remark,
+        s.student_id
+    FROM attendance_records ar
+    LEFT JOIN students s ON ar.student_ref = s.id
+    WHERE ar.course_date = ?
+    ORDER BY ar.created_at DESC
+    LIMIT ?
+"""
+
+# 考勤记录分页：/api/attendance/records（{base_query} 由 build_records_filter 生成）
+RECORDS_COUNT_SQL = "SELECT COUNT(*) as total {base_query}"
+RECORDS_PAGE_SQL = """
+    SELECT
+        ar.id,
+        COALESCE(s.name, ar.student_name) AS student_name,
+        s.student_id,
+        ar.course_date,
+        ar.status,
+        ar.confidence,
+        ar.created_at,
+        ar.remark,
+        ar.image_path
+    {base_query}
+    ORDER BY ar.course_date DESC, ar.created_at DESC
+    LIMIT ? OFFSET ?
+"""
+
+
+def build_records_filter(target_date=None, start_date=None, end_date=None, student_name=None, status=None):
+    """
+    生成考勤记录查询的 FROM / WHERE 部分
+
+    Args:
+        target_date: 指定日期（优先于日期范围）
+        start_date, end_date: 日期范围
+        student_name: 按学生当前姓名模糊筛选
+        status: 签到状态
+
+    Returns:
+        (base_query, params)
+    """
+    base_query = """
+        FROM attendance_records ar
+        LEFT JOIN students s ON ar.student_ref = s.id
+        WHERE 1=1
+    """
+    params = []
+
+    # 日期筛选
+    if target_date:
+        base_query += " AND ar.course_date = ?"
+        params.append(target_date)
+    else:
+        if start_date:
+            base_query += " AND ar.course_date >= ?"
+            params.append(start_date)
+        base_query += " AND ar.course_date <= ?"
+        params.append(end_date)
+
+    # 学生筛选
+    if student_name:
+        # 按学生当前姓名筛选（未关联学生的记录按签到时的姓名）
+        base_query += " AND COALESCE(s.name, ar.student_name) LIKE ?"
+        params.append(f"%{student_name}%")
+
+    # 状态筛选
+    if status:
+        base_query += " AND ar.status = ?"
+        params.append(status)
+
+    return base_query, params
+
+
+# 日期范围内有签到记录的日期：/api/attendance/summary
+# 参数: (开始日期, 结束日期)
+SUMMARY_DATES_SQL = """
+    SELECT DISTINCT course_date
+    FROM attendance_records
+    WHERE course_date BETWEEN ? AND ?
+    ORDER BY course_date DESC
+"""
+
+# 日期范围内已关联学生的签到状态：/api/attendance/summary
+# 参数: (开始日期, 结束日期)
+SUMMARY_RECORDS_SQL = """
+    SELECT student_ref, course_date, status
+    FROM attendance_records
+    WHERE course_date BETWEEN ? AND ? AND student_ref IS NOT NULL
+"""
+
+# 某天已签到（正常或迟到）的学生 id：/api/attendance/absent-list
+# 参数: (日期,)
+SIGNED_STUDENT_REFS_SQL = """
+    SELECT student_ref
+    FROM attendance_records
+    WHERE course_date = ? AND status IN ('present', 'late') AND student_ref IS NOT NULL
+"""
@@ -0,0 +1,93 @@
+# 接口热点查询的执行计划检查：发现考勤表上的全表扫描
+# src/databaseBuild/query_plans.py
+import re
+import sys
+import sqlite3
+from datetime import date
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from src.databaseBuild.db import DB_PATH
+from src.databaseBuild.migrations import migrate
+from src.databaseBuild import queries
+
+_TODAY = date.today().isoformat()
+
+# 按日期 + 状态筛选的一页考勤记录（/api/attendance/records 最常见的筛选组合）
+_RECORDS_FILTER, _RECORDS_PARAMS = queries.build_records_filter(target_date=_TODAY, status='present')
+
+# {接口: (SQL, 示例参数)}，SQL 与接口共用 queries.py 中的常量
+ENDPOINT_QUERIES = {
+    '/api/statistics/overview': (queries.DAILY_PRESENT_STATS_SQL, (_TODAY,)),
+    '/api/statistics/overview (total_students)': (queries.TOTAL_STUDENTS_SQL, ()),
+    '/api/statistics/distribution': (queries.DAILY_STATUS_COUNTS_SQL, (_TODAY,)),
+    '/api/statistics/trend': (queries.PRESENT_TREND_SQL, (_TODAY, _TODAY)),
+    '/api/statistics/alerts': (queries.STUDENT_ATTENDED_DAYS_SQL, (_TODAY, _TODAY)),
+    '/api/statistics/alerts (total_days)': (queries.ACTIVE_DAYS_SQL, (_TODAY, _TODAY)),
+    '/api/statistics/student/<name>': (queries.STUDENT_PRESENT_STATS_SQL, (1, _TODAY, _TODAY)),
+    '/api/statistics/student/<name> (recent)': (queries.STUDENT_RECENT_RECORDS_SQL, (1, _TODAY, _TODAY)),
+    '/api/realtime/status': (queries.DAILY_PRESENT_STATS_SQL, (_TODAY,)),
+    '/api/realtime/recent': (queries.RECENT_SIGNINS_SQL, (_TODAY, 10)),
+    '/api/attendance/records': (queries.RECORDS_PAGE_SQL.format(base_query=_RECORDS_FILTER),
+                                (*_RECORDS_PARAMS, 20, 0)),
+    '/api/attendance/records (count)': (queries.RECORDS_COUNT_SQL.format(base_query=_RECORDS_FILTER),
+                                        tuple(_RECORDS_PARAMS)),
+    '/api/attendance/summary': (queries.SUMMARY_RECORDS_SQL, (_TODAY, _TODAY)),
+    '/api/attendance/summary (dates)': (queries.SUMMARY_DATES_SQL, (_TODAY, _TODAY)),
+    '/api/attendance/absent-list': (queries.SIGNED_STUDENT_REFS_SQL, (_TODAY,)),
+}
+
+# 不允许全表扫描的表（及其在查询中的别名）
+WATCHED_TABLES = {'attendance_records', 'ar', 'daily_attendance_stats'}
+
+_SCAN = re.compile(r'^SCAN (?:TABLE )?(\w+)(.*)$')
+
+
+def explain(conn, sql, params=()):
+    """返回查询计划的描述行（EXPLAIN QUERY PLAN 的 detail 列）"""
+    return [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params).fetchall()]
+
+
+def find_full_scans(conn, queries=None):
+    """
+    检查各接口查询是否对 WATCHED_TABLES 做全表扫描
+
+    Returns:
+        dict: {接口: [全表扫描的计划行]}，只包含有问题的接口
+    """
+    problems = {}
+    for endpoint, (sql, params) in (queries or ENDPOINT_QUERIES).items():
+        scans = []
+        for detail in explain(conn, sql, params):
+            match = _SCAN.match(detail)
+            if match and match.group(1) in WATCHED_TABLES and 'USING' not in match.group(2):
+                scans.append(detail)
+        if scans:
+            problems[endpoint] = scans
+    return problems
+
+
+def main():
+    migrate()
+    conn = sqlite3.connect(DB_PATH)
+    try:
+        for endpoint, (sql, params) in ENDPOINT_QUERIES.items():
+            print(f"\n{endpoint}")
+            for detail in explain(conn, sql, params):
+                print(f"    {detail}")
+        problems = find_full_scans(conn)
+    finally:
+        conn.close()
+
+    print()
+    if problems:
+        for endpoint, scans in problems.items():
+            print(f"❌ {endpoint} 全表扫描: {'; '.join(scans)}")
+        sys.exit(1)
+    print("✅ 所有接口查询均使用索引")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,236 @@
+# 人脸检测策略：高分辨率照片分块多尺度检测、低分辨率优先的检测级联
+import sys
+import time
+import threading
+from pathlib import Path
+
+import numpy as np
+from insightface.app.common import Face
+
+PROJECT_ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from src import config
+from src.models import get_models
+
+
+def choose_tile_size(height, width, det_size=(640, 640)):
+    """
+    根据图像分辨率选择分块边长
+
+    分块缩放到检测输入后的缩放比例不低于 TILE_MIN_SCALE，使后排小脸在检测输入中
+    仍有足够像素；分块数超过 TILE_MAX_TILES 时增大分块以限制开销。
+
+    Returns:
+        int | None: 分块边长（像素），图像不需要分块时返回 None
+    """
+    long_side = max(height, width)
+    if long_side <= config.TILE_MIN_IMAGE_SIDE:
+        return None
+
+    tile = int(max(det_size) / config.TILE_MIN_SCALE)
+    while len(tile_grid(height, width, tile)) > config.TILE_MAX_TILES:
+        tile = int(tile * 1.25)
+    if tile >= long_side:
+        return None
+    return tile
+
+
+def tile_grid(height, width, tile):
+    """按 TILE_OVERLAP 重叠比例生成覆盖整幅图像的分块 (x1, y1, x2, y2)"""
+    stride = max(1, int(tile * (1 - config.TILE_OVERLAP)))
+
+    def starts(length):
+        if length <= tile:
+            return [0]
+        positions = list(range(0, length - tile, stride))
+        positions.append(length - tile)
+        return positions
+
+    return [(x, y, min(x + tile, width), min(y + tile, height))
+            for y in starts(height) for x in starts(width)]
+
+
+def nms(bboxes, scores, iou_threshold=None):
+    """
+    非极大值抑制
+
+    除 IoU 外，还抑制大部分面积落在更高分框内的框（分块边缘被截断的半张脸）。
+
+    Returns:
+        保留下来的下标（按分数降序）
+    """
+    iou_threshold = iou_threshold or config.TILE_NMS_IOU
+    x1, y1, x2, y2 = bboxes[:, 0], bboxes[:, 1], bboxes[:, 2], bboxes[:, 3]
+    areas = np.maximum(x2 - x1, 0) * np.maximum(y2 - y1, 0)
+    order = np.argsort(-scores)
+    keep = []
+    while order.size > 0:
+        i = order[0]
+        keep.append(i)
+        rest = order[1:]
+        w = np.maximum(0.0, np.minimum(x2[i], x2[rest]) - np.maximum(x1[i], x1[rest]))
+        h = np.maximum(0.0, np.minimum(y2[i], y2[rest]) - np.maximum(y1[i], y1[rest]))
+        inter = w * h
+        iou = inter / (areas[i] + areas[rest] - inter + 1e-6)
+        contained = inter / (areas[rest] + 1e-6)
+        order = rest[(iou <= iou_threshold) & (contained <= 0.8)]
+    return np.array(keep, dtype=np.int64)
+
+
+def detect_cascade(img, low_size=None, high_size=(640, 640), expected_count=None, stats=None):
+    """
+    检测级联：先低分辨率检测，仅在必要时升级
+
+    1. low：整帧以 low_size 检测；人脸足够大、分数足够高且人数达到 expected_count 时直接返回
+    2. crops：对过小或低分的人脸，裁出周围区域重新检测（局部等效于更高分辨率）
+    3. high：人数仍不足 expected_count 时以 high_size 整帧检测
+
+    Args:
+        img: BGR 图像
+        low_size: 低分辨率检测尺寸，默认 config.CASCADE_LOW_SIZE
+        high_size: 升级时的整帧检测尺寸
+        expected_count: 期望人数（可选）
+        stats: 可选 dict，写入本帧各阶段耗时与最终决定的阶段
+
+    Returns:
+        list[Face]: 尚未提取特征的人脸
+    """
+    pool = get_models()
+    low_size = tuple(low_size or config.CASCADE_LOW_SIZE)
+    height, width = img.shape[:2]
+    stats = stats if stats is not None else {}
+
+    t0 = time.perf_counter()
+    faces = pool.detect(img, det_size=low_size)
+    stats['low_ms'] = round((time.perf_counter() - t0) * 1000, 2)
+    stage = 'low'
+
+    # 人脸在低分辨率检测输入中的边长（像素）
+    input_scale = min(low_size[0] / width, low_size[1] / height)
+    uncertain = [face for face in faces
+                 if face.det_score < config.CASCADE_MIN_SCORE
+                 or min(face.bbox[2] - face.bbox[0], face.bbox[3] - face.bbox[1]) * input_scale < config.CASCADE_MIN_FACE_PX]
+
+    if uncertain:
+        t0 = time.perf_counter()
+        windows = [_crop_window(face.bbox, width, height) for face in uncertain]
+        results = pool.detect_many([img[y1:y2, x1:x2] for x1, y1, x2, y2 in windows], det_size=low_size)
+        faces = [face for face in faces if not any(face is u for u in uncertain)]
+        for face, (x1, y1, _, _), crop_faces in zip(uncertain, windows, results):
+            if crop_faces:
+                faces.extend(_shift_faces(crop_faces, x1, y1))
+            elif face.det_score >= config.CASCADE_MIN_SCORE:
+                # 小脸在局部区域未复现时保留原检测；低分且未复现视为误检
+                faces.append(face)
+        faces = _merge(faces)
+        stats['crops_ms'] = round((time.perf_counter() - t0) * 1000, 2)
+        stats['crops'] = len(windows)
+        stage = 'crops'
+
+    if expected_count and len(faces) < expected_count and tuple(high_size) != low_size:
+        t0 = time.perf_counter()
+        faces = _merge(faces + pool.detect(img, det_size=high_size))
+        stats['high_ms'] = round((time.perf_counter() - t0) * 1000, 2)
+        stage = 'high'
+
+    stats['stage'] = stage
+    stats['faces'] = len(faces)
+    _record_cascade(stage)
+    return faces
+
+
+def detect_faces(img, det_size=(640, 640), tiled=None, cascade=False, expected_count=None, stats=None):
+    """
+    检测人脸（大图自动分块）
+
+    小图直接整图检测（cascade 时先以低分辨率检测，必要时升级到 det_size）；
+    大图在整图检测（大脸）之外，按分辨率切成重叠分块，
+    各分块经推理池并行检测，坐标映射回原图后用 NMS 合并。
+
+    Args:
+        img: BGR 图像
+        det_size: 检测输入尺寸
+        tiled: 是否允许分块，默认 config.TILED_DETECTION
+        cascade: 是否使用检测级联（实时视频等对延迟敏感的调用方按需开启；
+                 照片默认关闭，低分辨率会漏检合影后排的小脸）
+        expected_count: 级联的期望人数，低分辨率人数不足时升级到 det_size
+        stats: 可选 dict，写入检测方式与级联阶段统计
+
+    Returns:
+        list[Face]: 尚未提取特征的人脸
+    """
+    pool = get_models()
+    tiled = config.TILED_DETECTION if tiled is None else tiled
+    height, width = img.shape[:2]
+    tile = choose_tile_size(height, width, det_size) if tiled else None
+    if tile is None:
+        if cascade:
+            return detect_cascade(img, high_size=det_size, expected_count=expected_count, stats=stats)
+        return pool.detect(img, det_size=det_size)
+
+    windows = [(0, 0, width, height)] + tile_grid(height, width, tile)
+    crops = [img[y1:y2, x1:x2] for x1, y1, x2, y2 in windows]
+    results = pool.detect_many(crops, det_size=det_size)
+
+    faces = []
+    for (x1, y1, _, _), tile_faces in zip(windows, results):
+        faces.extend(_shift_faces(tile_faces, x1, y1))
+    if stats is not None:
+        stats['stage'] = 'tiled'
+        stats['tiles'] = len(windows) - 1
+    return _merge(faces)
+
+
+def analyze(img, det_size=(640, 640), tiled=None):
+    """分块检测 + 提取特征"""
+    return get_models().embed(img, detect_faces(img, det_size=det_size, tiled=tiled))
+
+
+def _shift_faces(faces, x, y):
+    """将局部区域中的检测结果映射回原图坐标"""
+    offset = np.array([x, y], dtype=np.float32)
+    return [Face(bbox=face.bbox + np.tile(offset, 2),
+                 kps=face.kps + offset if face.kps is not None else None,
+                 det_score=face.det_score)
+            for face in faces]
+
+
+def _merge(faces):
+    """NMS 合并多次检测的结果"""
+    if not faces:
+        return []
+    bboxes = np.stack([face.bbox for face in faces])
+    scores = np.array([face.det_score for face in faces], dtype=np.float32)
+    return [faces[i] for i in nms(bboxes, scores)]
+
+
+def _crop_window(bbox, width, height):
+    """以人脸为中心、边长为人脸 CASCADE_CROP_SCALE 倍的裁剪区域"""
+    cx, cy = (bbox[0] + bbox[2]) / 2, (bbox[1] + bbox[3]) / 2
+    half = max(bbox[2] - bbox[0], bbox[3] - bbox[1]) * config.CASCADE_CROP_SCALE / 2
+    half = max(half, 32)
+    x1, y1 = int(max(0, cx - half)), int(max(0, cy - half))
+    x2, y2 = int(min(width, cx + half)), int(min(height, cy + half))
+    return x1, y1, max(x2, x1 + 1), max(y2, y1 + 1)
+
+
+# 级联各阶段的帧数统计（进程内累计）
+_cascade_counts = {'low': 0, 'crops': 0, 'high': 0}
+_cascade_lock = threading.Lock()
+
+
+def _record_cascade(stage):
+    with _cascade_lock:
+        _cascade_counts[stage] += 1
+
+
+def cascade_stats():
+    """各阶段完成检测的帧数与占比"""
+    with _cascade_lock:
+        total = sum(_cascade_counts.values())
+        return {
+            'frames': total,
+            'resolved': dict(_cascade_counts),
+            'low_ratio': round(_cascade_counts['low'] / total, 4) if total else 0.0,
+        }
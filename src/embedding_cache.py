@@ -0,0 +1,79 @@
+# 注册照片特征缓存（按内容哈希）
+import sqlite3
+import hashlib
+import json
+import threading
+
+import numpy as np
+
+from src import config
+
+# 缓存命中但照片中未检测到人脸
+NO_FACE = object()
+
+
+def content_hash(data: bytes) -> str:
+    """照片内容哈希（与文件名、修改时间无关）"""
+    return hashlib.sha1(data).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    注册照片特征的持久化缓存
+
+    以 (内容哈希, 模型名, 检测尺寸) 为键，保存所选人脸的特征与人脸框；
+    未检测到人脸的照片同样记录，重新扫描时不再重复推理。
+    """
+
+    def __init__(self, path=None, model_name=None, det_size=(320, 320)):
+        self.path = str(path or config.EMBEDDING_CACHE_PATH)
+        self.model_name = model_name or config.MODEL_NAME
+        self.det_size = f"{det_size[0]}x{det_size[1]}"
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS embeddings (
+                content_hash TEXT NOT NULL,
+                model_name TEXT NOT NULL,
+                det_size TEXT NOT NULL,
+                embedding BLOB,
+                bbox TEXT,
+                created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (content_hash, model_name, det_size)
+            )
+        ''')
+        self._conn.commit()
+
+    def get(self, digest):
+        """
+        查询缓存
+
+        Returns:
+            None 表示未命中；NO_FACE 表示已知无人脸；否则为 (embedding, bbox)
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT embedding, bbox FROM embeddings WHERE content_hash = ? AND model_name = ? AND det_size = ?",
+                (digest, self.model_name, self.det_size)
+            ).fetchone()
+        if row is None:
+            return None
+        if row[0] is None:
+            return NO_FACE
+        return np.frombuffer(row[0], dtype=np.float32).copy(), json.loads(row[1])
+
+    def put(self, digest, embedding=None, bbox=None):
+        """写入缓存；embedding 为 None 表示照片中未检测到人脸"""
+        blob = None if embedding is None else np.asarray(embedding, dtype=np.float32).tobytes()
+        bbox_text = None if bbox is None else json.dumps([float(v) for v in bbox])
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO embeddings (content_hash, model_name, det_size, embedding, bbox) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (digest, self.model_name, self.det_size, blob, bbox_text)
+            )
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,186 @@
+# 紧凑的内存映射特征库文件（替代 students.pkl）
+#
+# 文件布局（小端，版本 2）：
+#   [0, 64)            文件头，见 HEADER_STRUCT
+#   [matrix_offset, …) 模板特征矩阵 (count, dim)，float16/float32，已 L2 归一化，按 64 字节对齐
+#   [labels_offset, …) 每个模板所属学生的下标 (count,) int32，按学生连续排列
+#   [meta_offset, …)   元数据，UTF-8 编码的 JSON：{"names": [...], "sources": [...]}
+#
+# 每名学生可有多个模板（每张注册照片一个），sources 记录模板来源的文件名。
+# 通过 np.memmap 只读打开，多个进程（Flask worker、realtime.py、inference.py）
+# 经由操作系统页缓存共享同一份物理内存，打开耗时与特征库规模无关。
+import sys
+import os
+import json
+import struct
+import argparse
+from pathlib import Path
+
+import numpy as np
+
+PROJECT_ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from src import config
+from src import utils
+
+MAGIC = b'FRASGAL\0'
+STORE_VERSION = 2
+# magic, version, dtype_code, count, dim, matrix_offset, labels_offset, meta_offset, meta_size, 保留
+HEADER_STRUCT = struct.Struct('<8sIIQIQQQQ4x')
+# 版本 1：每名学生一个特征，无 labels，元数据只有姓名数组
+HEADER_STRUCT_V1 = struct.Struct('<8sIIQIQQQ12x')
+HEADER_SIZE = 64
+ALIGNMENT = 64
+
+DTYPE_CODES = {'float16': 1, 'float32': 2}
+CODE_DTYPES = {code: name for name, code in DTYPE_CODES.items()}
+
+
+def save_store(path, names, feats, labels=None, sources=None, dtype=None):
+    """
+    写入特征库文件（先写临时文件再原子替换，已打开的 memmap 不受影响）
+
+    Args:
+        path: 目标文件路径
+        names: 学生姓名列表
+        feats: (T, D) 模板特征矩阵，写入前统一做 L2 归一化
+        labels: (T,) 每个模板所属学生在 names 中的下标，须按学生连续排列；
+                默认每名学生一个模板
+        sources: 每个模板的来源文件名，默认为空字符串
+        dtype: 'float32' 或 'float16'，默认 config.GALLERY_DTYPE
+    """
+    dtype = dtype or config.GALLERY_DTYPE
+    if dtype not in DTYPE_CODES:
+        raise ValueError(f"不支持的特征精度: {dtype}")
+
+    names = list(names)
+    count = len(feats)
+    dim = np.asarray(feats[0]).shape[-1] if count else 512
+    matrix = np.asarray(feats, dtype=np.float32).reshape(count, dim)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    matrix = np.ascontiguousarray(matrix / norms, dtype=dtype)
+
+    labels = np.arange(count) if labels is None else np.asarray(labels)
+    labels = np.ascontiguousarray(labels, dtype=np.int32)
+    if count and np.any(np.diff(labels) < 0):
+        raise ValueError("模板必须按学生连续排列")
+    sources = list(sources) if sources is not None else [""] * count
+
+    meta_blob = json.dumps({"names": names, "sources": sources}, ensure_ascii=False).encode('utf-8')
+    matrix_offset = HEADER_SIZE
+    labels_offset = _align(matrix_offset + matrix.nbytes)
+    meta_offset = _align(labels_offset + labels.nbytes)
+    header = HEADER_STRUCT.pack(
+        MAGIC, STORE_VERSION, DTYPE_CODES[dtype], count, dim,
+        matrix_offset, labels_offset, meta_offset, len(meta_blob)
+    )
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(header)
+        f.write(matrix.tobytes())
+        f.write(b'\0' * (labels_offset - matrix_offset - matrix.nbytes))
+        f.write(labels.tobytes())
+        f.write(b'\0' * (meta_offset - labels_offset - labels.nbytes))
+        f.write(meta_blob)
+    os.replace(tmp_path, path)
+
+
+def open_store(path):
+    """
+    只读打开特征库文件
+
+    Returns:
+        (names, feats, labels, sources): 姓名列表、(T, D) 的 np.memmap（只读，不复制数据）、
+        (T,) 模板所属学生下标、模板来源文件名列表
+    """
+    with open(path, 'rb') as f:
+        header = f.read(HEADER_SIZE)
+        if len(header) < HEADER_SIZE:
+            raise ValueError(f"特征库文件已损坏: {path}")
+        magic, version = struct.unpack_from('<8sI', header)
+        if magic != MAGIC:
+            raise ValueError(f"不是有效的特征库文件: {path}")
+
+        if version == 1:
+            (_, _, dtype_code, count, dim,
+             matrix_offset, meta_offset, meta_size) = HEADER_STRUCT_V1.unpack(header)
+            f.seek(meta_offset)
+            names = json.loads(f.read(meta_size).decode('utf-8'))
+            labels = np.arange(count, dtype=np.int32)
+            sources = [""] * count
+        elif version == STORE_VERSION:
+            (_, _, dtype_code, count, dim,
+             matrix_offset, labels_offset, meta_offset, meta_size) = HEADER_STRUCT.unpack(header)
+            f.seek(meta_offset)
+            meta = json.loads(f.read(meta_size).decode('utf-8'))
+            names, sources = meta["names"], meta["sources"]
+            f.seek(labels_offset)
+            labels = np.frombuffer(f.read(count * 4), dtype=np.int32)
+        else:
+            raise ValueError(f"不支持的特征库版本: {version}")
+
+    dtype = CODE_DTYPES[dtype_code]
+    if count == 0:
+        return names, np.zeros((0, dim), dtype=dtype), labels, sources
+    feats = np.memmap(path, dtype=dtype, mode='r', offset=matrix_offset, shape=(count, dim))
+    return names, feats, labels, sources
+
+
+def load_templates(path):
+    """
+    以 {name: [(source, embedding), ...]} 形式读取全部模板（用于增量注册时修改特征库）
+    """
+    if not os.path.exists(path):
+        return {}
+    names, feats, labels, sources = open_store(path)
+    templates = {name: [] for name in names}
+    for i, label in enumerate(labels):
+        templates[names[label]].append((sources[i], np.array(feats[i], dtype=np.float32)))
+    return templates
+
+
+def save_templates(templates, path, dtype=None):
+    """将 {name: [(source, embedding), ...]} 写入特征库文件（没有模板的学生不写入）"""
+    names, feats, labels, sources = [], [], [], []
+    for name, items in templates.items():
+        if not items:
+            continue
+        for source, embedding in items:
+            feats.append(embedding)
+            labels.append(len(names))
+            sources.append(source)
+        names.append(name)
+    save_store(path, names, feats, labels=labels, sources=sources, dtype=dtype)
+
+
+def convert_pickle(pkl_path=None, store_path=None, dtype=None):
+    """
+    一次性将旧版 students.pkl（每名学生一个平均特征）转换为内存映射特征库文件
+
+    Returns:
+        int: 转换的学生数
+    """
+    pkl_path = pkl_path or config.DB_PATH
+    store_path = store_path or config.GALLERY_PATH
+    database = utils.load_database(pkl_path)
+    save_store(store_path, list(database.keys()), list(database.values()), dtype=dtype)
+    print(f"✅ 已将 {pkl_path} 转换为 {store_path}（{len(database)} 名学生）")
+    return len(database)
+
+
+def _align(offset):
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="将 students.pkl 转换为内存映射特征库文件")
+    parser.add_argument("--pkl", default=config.DB_PATH, help="旧版 pickle 特征库路径")
+    parser.add_argument("--out", default=config.GALLERY_PATH, help="输出文件路径")
+    parser.add_argument("--dtype", choices=list(DTYPE_CODES), default=config.GALLERY_DTYPE,
+                        help="特征存储精度（float16 文件减半，但匹配时需转换为 float32 私有副本）")
+    args = parser.parse_args()
+
+    convert_pickle(args.pkl, args.out, args.dtype)
@@ -0,0 +1,258 @@
+# 人脸特征库（向量化匹配 + 进程内缓存）
+import os
+import threading
+
+import numpy as np
+
+from src import config
+from src.ann_index import load_index_for
+from src.embedding_store import open_store, convert_pickle
+from src.quantization import Int8Quantizer
+
+
+class FaceGallery:
+    """
+    已注册学生的人脸特征库
+
+    每名学生保存多个模板（每张注册照片一个），所有模板预先归一化并堆叠为
+    连续的 float32 矩阵 (T, D)，按学生连续排列，labels 记录模板所属学生。
+    一帧中的全部人脸只需一次矩阵乘法即可与全部模板完成比对，再用
+    np.maximum.reduceat 按学生聚合（取最大值或 top-m 均值）。
+    挂载 ANN 索引（self.index）后改为 IVF 检索 + 精确重排；挂载量化器
+    （self.quantizer）后改为 int8 粗排 + 全精度重排；暴力检索作为回退。
+    """
+
+    def __init__(self, names, feats, labels=None, sources=None, normalized=False):
+        self.names = list(names)
+        count = len(feats)
+        dim = np.asarray(feats[0]).shape[-1] if count > 0 else 512
+        feats = np.asarray(feats, dtype=np.float32).reshape(count, dim)
+        if not normalized:
+            feats = _l2_normalize(feats)
+        # 已归一化的 float32 memmap 直接使用，不产生私有副本
+        self.feats = feats if feats.flags['C_CONTIGUOUS'] else np.ascontiguousarray(feats)
+        self.labels = np.arange(count, dtype=np.int32) if labels is None else np.asarray(labels, dtype=np.int32)
+        self.sources = list(sources) if sources is not None else [""] * count
+        # 每名学生第一个模板的位置，供 reduceat 按学生分段聚合
+        self.offsets = np.searchsorted(self.labels, np.arange(len(self.names)))
+        self.index = None
+        self.quantizer = None
+
+    @classmethod
+    def from_database(cls, database):
+        """由 {name: embedding} 字典构建特征库（每名学生一个模板）"""
+        return cls(list(database.keys()), list(database.values()))
+
+    @classmethod
+    def from_templates(cls, templates):
+        """由 {name: [(source, embedding), ...]} 构建特征库（没有模板的学生被忽略）"""
+        names, feats, labels, sources = [], [], [], []
+        for name, items in templates.items():
+            if not items:
+                continue
+            for source, embedding in items:
+                feats.append(embedding)
+                labels.append(len(names))
+                sources.append(source)
+            names.append(name)
+        return cls(names, feats, labels, sources)
+
+    @classmethod
+    def from_store(cls, path):
+        """由内存映射特征库文件构建（float32 文件零拷贝）"""
+        names, feats, labels, sources = open_store(path)
+        return cls(names, feats, labels, sources, normalized=True)
+
+    def __len__(self):
+        return len(self.names)
+
+    @property
+    def num_templates(self):
+        return len(self.feats)
+
+    @property
+    def dim(self):
+        return self.feats.shape[1]
+
+    def search(self, embeddings):
+        """
+        为每个查询特征找到最相似的学生
+
+        Args:
+            embeddings: 查询特征，形状 (M, D) 或 (D,)，无需预先归一化
+
+        Returns:
+            (best_idx, best_sims): 每个查询对应的学生下标与相似度，形状均为 (M,)
+        """
+        queries = _as_queries(embeddings, self.dim)
+        if len(queries) == 0 or len(self) == 0:
+            return np.zeros(len(queries), dtype=np.int64), np.full(len(queries), -1.0, dtype=np.float32)
+
+        # topm 聚合需要候选学生的全部模板：对候选学生精确打分后与暴力检索同样按学生聚合
+        topm = config.TEMPLATE_AGGREGATION == 'topm' and self.num_templates > len(self)
+        if topm and (self.index is not None or self.quantizer is not None):
+            if self.index is not None:
+                cand_tpl, _ = self.index.search(queries, self.feats)
+            else:
+                cand_tpl = self.quantizer.candidates(queries)
+            return self._rerank_students(queries, cand_tpl)
+
+        # ANN / 量化模式只对候选模板重排，取最佳模板所属的学生
+        if self.index is not None:
+            cand_idx, cand_sims = self.index.search(queries, self.feats)
+            # 探测到的簇全部为空时没有候选，视为未匹配
+            return self.labels[np.maximum(cand_idx[:, 0], 0)], cand_sims[:, 0]
+
+        if self.quantizer is not None:
+            best_tpl, best_sims = self.quantizer.search(queries, self.feats)
+            return self.labels[best_tpl], best_sims
+
+        student_sims = self.aggregate(queries @ self.feats.T)
+        best_idx = np.argmax(student_sims, axis=1)
+        best_sims = student_sims[np.arange(len(queries)), best_idx]
+        return best_idx, best_sims
+
+    def _rerank_students(self, queries, cand_tpl):
+        """
+        对候选模板所属学生的全部模板精确打分，再用 aggregate 按学生聚合
+
+        Args:
+            queries: (M, D) 归一化查询特征
+            cand_tpl: (M, k) 候选模板下标，-1 表示空位
+        """
+        ends = np.append(self.offsets[1:], self.num_templates)
+        # 非候选学生的模板记为 -inf，聚合后不会被选中
+        sims = np.full((len(queries), self.num_templates), -np.inf, dtype=np.float32)
+        for i, row in enumerate(cand_tpl):
+            students = np.unique(self.labels[row[row >= 0]])
+            if len(students) == 0:
+                continue
+            tpl = np.concatenate([np.arange(self.offsets[s], ends[s]) for s in students])
+            sims[i, tpl] = np.asarray(self.feats[tpl], dtype=np.float32) @ queries[i]
+        student_sims = self.aggregate(sims)
+        best_idx = np.argmax(student_sims, axis=1)
+        best_sims = student_sims[np.arange(len(queries)), best_idx]
+        # 没有任何候选时视为未匹配
+        best_sims = np.where(np.isfinite(best_sims), best_sims, -1.0).astype(np.float32)
+        return best_idx, best_sims
+
+    def aggregate(self, sims, mode=None, top_m=None):
+        """
+        将模板相似度 (M, T) 按学生聚合为 (M, S)
+
+        Args:
+            mode: 'max' 取最相似模板；'topm' 取最相似的 m 个模板的均值
+                  （模板不足 m 个时取全部）。默认 config.TEMPLATE_AGGREGATION
+            top_m: topm 模式下的 m，默认 config.TEMPLATE_TOP_M
+        """
+        mode = mode or config.TEMPLATE_AGGREGATION
+        best = np.maximum.reduceat(sims, self.offsets, axis=1)
+        if mode == 'max' or self.num_templates == len(self):
+            return best
+
+        top_m = top_m or config.TEMPLATE_TOP_M
+        counts = np.diff(np.append(self.offsets, self.num_templates))
+        remaining = sims.copy()
+        total = best.copy()
+        for _ in range(top_m - 1):
+            # 屏蔽本轮各学生的最大值后再取一次最大值
+            remaining[remaining >= np.repeat(best, counts, axis=1)] = -np.inf
+            best = np.maximum.reduceat(remaining, self.offsets, axis=1)
+            total += np.where(np.isfinite(best), best, 0.0)
+        return total / np.minimum(counts, top_m)
+
+    def match(self, embeddings, threshold):
+        """
+        批量比对并应用阈值
+
+        Returns:
+            (names, sims, matched): 最相似的学生姓名列表、相似度数组、是否超过阈值的布尔数组
+        """
+        best_idx, best_sims = self.search(embeddings)
+        matched = best_sims >= threshold
+        if len(self) == 0:
+            names = ["Unknown"] * len(best_idx)
+        else:
+            names = [self.names[i] for i in best_idx]
+        return names, best_sims, matched
+
+
+# ==================== 进程内共享缓存 ====================
+
+# {db_path: ((特征库文件戳, 索引文件戳), FaceGallery)}
+_gallery_cache = {}
+_gallery_lock = threading.Lock()
+
+
+def _file_stamp(db_path):
+    """文件戳：(mtime_ns, size)，文件不存在时返回 None"""
+    try:
+        st = os.stat(db_path)
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+def get_gallery(db_path=None, force_reload=False):
+    """
+    获取进程内共享的特征库快照
+
+    仅当特征库或 ANN 索引文件的 mtime/size 变化（或 force_reload）时才重新加载，
+    识别接口与实时识别接口共用同一份快照。特征库文件不存在而旧版 students.pkl
+    存在时，先执行一次性转换。
+
+    Args:
+        db_path: 特征库文件路径，默认 config.GALLERY_PATH
+        force_reload: 是否忽略缓存强制重新加载
+
+    Returns:
+        FaceGallery: 文件不存在时为空特征库
+    """
+    db_path = os.path.abspath(db_path or config.GALLERY_PATH)
+    stamp = (_file_stamp(db_path), _file_stamp(config.ANN_INDEX_PATH))
+
+    cached = _gallery_cache.get(db_path)
+    if not force_reload and cached is not None and cached[0] == stamp:
+        return cached[1]
+
+    with _gallery_lock:
+        # 双重检查：其他线程可能已完成加载
+        cached = _gallery_cache.get(db_path)
+        stamp = (_file_stamp(db_path), _file_stamp(config.ANN_INDEX_PATH))
+        if not force_reload and cached is not None and cached[0] == stamp:
+            return cached[1]
+
+        if not os.path.exists(db_path) and os.path.exists(config.DB_PATH):
+            convert_pickle(config.DB_PATH, db_path)
+            stamp = (_file_stamp(db_path), _file_stamp(config.ANN_INDEX_PATH))
+
+        if os.path.exists(db_path):
+            gallery = FaceGallery.from_store(db_path)
+        else:
+            gallery = FaceGallery([], [])
+        gallery.index = load_index_for(gallery)
+        if config.GALLERY_QUANTIZATION == 'int8' and len(gallery) > 0:
+            gallery.quantizer = Int8Quantizer.encode(gallery.feats)
+            print(f"📦 int8 量化特征库: {gallery.quantizer.nbytes / 1024 / 1024:.2f} MB"
+                  f"（全精度 {gallery.feats.size * 4 / 1024 / 1024:.2f} MB）")
+        _gallery_cache[db_path] = (stamp, gallery)
+        return gallery
+
+
+def invalidate_gallery(db_path=None):
+    """使缓存失效，下次 get_gallery 时重新加载（特征库写入后调用）"""
+    with _gallery_lock:
+        _gallery_cache.pop(os.path.abspath(db_path or config.GALLERY_PATH), None)
+
+
+def _l2_normalize(feats):
+    norms = np.linalg.norm(feats, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return feats / norms
+
+
+def _as_queries(embeddings, dim):
+    if len(embeddings) == 0:
+        return np.zeros((0, dim), dtype=np.float32)
+    queries = np.asarray(embeddings, dtype=np.float32).reshape(-1, dim)
+    return _l2_normalize(queries)
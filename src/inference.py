@@ -1,10 +1,6 @@
 # 非实时签到
 import os
 import argparse
-import numpy as np
-import cv2
-from insightface.app import FaceAnalysis
-from numpy.linalg import norm
 import config
 import utils
 import sys
@@ -13,25 +9,24 @@ from pathlib import Path
 project_root = Path(__file__).parent.parent  # src -> FRAS-main
 sys.path.append(str(project_root))
 # 导入 src 下的模块
-from src.attendance import record_attendance
+from src.attendance import sign_in_batch
+from src.gallery import get_gallery
+from src.models import get_models
+from src.detection import detect_faces
 from datetime import date
 
 
-def compute_sim(feat1, feat2):
-    return np.dot(feat1, feat2) / (norm(feat1) * norm(feat2))
-
 def run_inference(image_path):
     """
     Loads databases, detects faces in the image, and identifies them.
     """
-    # Load database
-    known_faces = utils.load_database(config.DB_PATH)
-    if not known_faces:
+    # Load database (memory-mapped, shared with other processes via the page cache)
+    gallery = get_gallery()
+    if len(gallery) == 0:
         print("Warning: No known faces found in database. Please run register.py first.")
     
-    # Initialize InsightFace
-    app = FaceAnalysis(providers=['CPUExecutionProvider'])
-    app.prepare(ctx_id=0, det_size=(640, 640))
+    # Shared detection + recognition models
+    models = get_models()
 
     # Load Image
     try:
@@ -40,68 +35,37 @@ def run_inference(image_path):
         print(f"Error loading image: {e}")
         return
 
-    # Detect faces
-    faces = app.get(img)
+    # Detect faces (large classroom photos are split into overlapping tiles)
+    faces = models.embed(img, detect_faces(img, det_size=(640, 640)))
     print(f"Detected {len(faces)} faces.")
 
-    # # Identify faces
-    # for face in faces:
-    #     max_sim = -1
-    #     best_name = "Unknown"
-        
-    #     # Compare with all known faces
-    #     for name, embedding in known_faces.items():
-    #         sim = compute_sim(face.embedding, embedding)
-    #         if sim > max_sim:
-    #             max_sim = sim
-    #             best_name = name
-        
-    #     # Apply threshold
-    #     final_name = None
-    #     color = config.COLOR_UNKNOWN
-    #     if max_sim >= config.MATCH_THRESHOLD:
-    #         final_name = f"{best_name} ({max_sim:.2f})"
-    #         color = config.COLOR_MATCH
-        
-    #     # Draw on image
-    #     utils.draw_bbox(img, face.bbox, final_name, color)
-    
-    # Identify faces
-    for face in faces:
-        max_sim = -1
-        best_name = "Unknown"
-        
-        for name, embedding in known_faces.items():
-            sim = compute_sim(face.embedding, embedding)
-            if sim > max_sim:
-                max_sim = sim
-                best_name = name
-        
+    # Identify faces (one matrix multiply against the whole gallery)
+    names, sims, matched = gallery.match([face.embedding for face in faces], config.MATCH_THRESHOLD)
+
+    # 每个学生取本图中最高的相似度
+    confidences = {}
+    for face, best_name, max_sim, is_match in zip(faces, names, sims, matched):
         # Apply threshold
         final_name = None
         color = config.COLOR_UNKNOWN
-        if max_sim >= config.MATCH_THRESHOLD:
+        if is_match:
             final_name = f"{best_name} ({max_sim:.2f})"
             color = config.COLOR_MATCH
-            
-            # 自动签到！
-            today = date.today()
-            # # 可选：保存带人脸框的截图用于复核
-            # capture_path = os.path.join(config.CAPTURE_DIR, f"capture_{today}_{best_name}.jpg")
-            # utils.save_image(img, capture_path)  # 或只裁剪人脸区域
-            
-            # 调用签到函数
-            record_attendance(
-                name=best_name,
-                course_date=today,
-                image_path="",  # 可选：填写 capture_path
-                confidence=float(max_sim),
-                status="present",
-                remark="自动签到"
-            )
+            confidences[best_name] = max(confidences.get(best_name, 0.0), float(max_sim))
         
         utils.draw_bbox(img, face.bbox, final_name, color)
 
+    # 自动签到！整张图片的签到在同一个事务中提交
+    if confidences:
+        sign_in_batch(
+            list(confidences),
+            date.today(),
+            status="present",
+            image_path="",
+            remark="自动签到",
+            confidences=confidences
+        )
+
     # Save output
     filename = os.path.basename(image_path)
     output_path = os.path.join(config.OUTPUT_DIR, f"result_{filename}")
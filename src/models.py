@@ -0,0 +1,259 @@
+# 共享模型注册表与有界推理池：检测 + 识别模型按进程共享，不再各自加载
+import sys
+import os
+import time
+import queue
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import onnxruntime
+from insightface.app import FaceAnalysis
+from insightface.app.common import Face
+from insightface.utils import face_align
+
+PROJECT_ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from src import config
+from src.batching import EmbeddingBatcher
+
+DEFAULT_DET_SIZE = (640, 640)
+# ArcFace 输入尺寸
+EMBED_CROP_SIZE = 112
+
+
+class ModelRegistry:
+    """
+    检测与识别模型的共享实例
+
+    ONNX 会话只创建一次；检测输入尺寸按调用指定（det_model.detect 的 input_size），
+    不同尺寸的调用方共用同一个检测会话和同一个识别会话。
+    onnxruntime 的 InferenceSession.run 可以多线程并发调用。
+    """
+
+    def __init__(self, model_name=None, providers=None, intra_op_threads=None):
+        self.model_name = model_name or config.MODEL_NAME
+        self.providers = providers or ['CPUExecutionProvider']
+        self.app = FaceAnalysis(name=self.model_name, providers=self.providers,
+                                allowed_modules=['detection', 'recognition'])
+        self.app.prepare(ctx_id=0, det_size=DEFAULT_DET_SIZE)
+        if intra_op_threads:
+            self._rebuild_sessions(intra_op_threads)
+        self.det_model = self.app.det_model
+        self.rec_model = self.app.models['recognition']
+
+    def _rebuild_sessions(self, intra_op_threads):
+        """按指定的 intra-op 线程数重建 ONNX 会话（多个实例并行时避免线程超订）"""
+        opts = onnxruntime.SessionOptions()
+        opts.intra_op_num_threads = intra_op_threads
+        opts.inter_op_num_threads = 1
+        for model in self.app.models.values():
+            model.session = onnxruntime.InferenceSession(
+                model.model_file, sess_options=opts, providers=self.providers)
+
+    def detect(self, img, det_size=None, max_num=0):
+        """
+        检测人脸
+
+        Args:
+            img: BGR 图像
+            det_size: 检测输入尺寸，默认 (640, 640)
+            max_num: 最多返回的人脸数，0 表示不限
+
+        Returns:
+            list[Face]: 含 bbox / kps / det_score，尚未提取特征
+        """
+        bboxes, kpss = self.det_model.detect(img, input_size=tuple(det_size or DEFAULT_DET_SIZE),
+                                             max_num=max_num, metric='default')
+        faces = []
+        for i in range(bboxes.shape[0]):
+            kps = kpss[i] if kpss is not None else None
+            faces.append(Face(bbox=bboxes[i, 0:4], kps=kps, det_score=bboxes[i, 4]))
+        return faces
+
+    def embed(self, img, faces):
+        """为已检测的人脸提取特征（写入 face.embedding），返回 faces"""
+        for face in faces:
+            self.rec_model.get(img, face)
+        return faces
+
+    def analyze(self, img, det_size=None, max_num=0):
+        """检测 + 提取特征，等价于 FaceAnalysis.get"""
+        return self.embed(img, self.detect(img, det_size=det_size, max_num=max_num))
+
+
+def largest_face(faces):
+    """返回面积最大的人脸（注册照片只取主体人脸）"""
+    if not faces:
+        return None
+    areas = [(f.bbox[2] - f.bbox[0]) * (f.bbox[3] - f.bbox[1]) for f in faces]
+    return faces[int(np.argmax(areas))]
+
+
+class InferencePool:
+    """
+    有界推理池：最多 size 份模型实例，每份的 onnxruntime intra-op 线程数为 CPU 核数 / size
+
+    并发请求各自借出一份实例，N 个请求并行推理而不会超订 CPU；实例按需创建，
+    单线程使用（如命令行脚本）时只加载一份。池满时请求排队等待，
+    排队与推理耗时分别统计（stats() 为全局统计，request_timing() 为当前线程本次请求）。
+    开启 EMBED_BATCHING 时，特征提取经 EmbeddingBatcher 与其他请求合批执行。
+    """
+
+    def __init__(self, size=None, model_name=None):
+        self.size = max(1, size or config.INFERENCE_POOL_SIZE)
+        self.model_name = model_name or config.MODEL_NAME
+        self.intra_op_threads = max(1, (os.cpu_count() or 1) // self.size)
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._waiting = 0
+        self._in_use = 0
+        self._calls = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._infer_total = 0.0
+        self._infer_max = 0.0
+        self.batcher = EmbeddingBatcher(self) if config.EMBED_BATCHING else None
+        self._executor = None
+
+    def _checkout(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            create = self._created < self.size
+            if create:
+                self._created += 1
+        if create:
+            try:
+                return ModelRegistry(self.model_name, intra_op_threads=self.intra_op_threads)
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+        return self._idle.get()
+
+    @contextmanager
+    def acquire(self):
+        """借出一份模型实例（池满时阻塞等待）"""
+        t0 = time.perf_counter()
+        with self._lock:
+            self._waiting += 1
+        try:
+            models = self._checkout()
+        finally:
+            with self._lock:
+                self._waiting -= 1
+        t1 = time.perf_counter()
+        with self._lock:
+            self._in_use += 1
+        try:
+            yield models
+        finally:
+            t2 = time.perf_counter()
+            self._idle.put(models)
+            self._record(t1 - t0, t2 - t1)
+
+    def _record(self, wait, infer):
+        with self._lock:
+            self._in_use -= 1
+            self._calls += 1
+            self._wait_total += wait
+            self._wait_max = max(self._wait_max, wait)
+            self._infer_total += infer
+            self._infer_max = max(self._infer_max, infer)
+        if getattr(self._local, 'timing', None) is not None:
+            self._local.timing['queue_wait'] += wait
+            self._local.timing['inference'] += infer
+
+    def begin_request(self):
+        """开始统计当前线程本次请求的排队、等待合批与推理耗时"""
+        self._local.timing = {'queue_wait': 0.0, 'batch_wait': 0.0, 'inference': 0.0}
+
+    def request_timing(self):
+        """当前线程自 begin_request() 以来的耗时（毫秒）"""
+        timing = getattr(self._local, 'timing', None) or {'queue_wait': 0.0, 'batch_wait': 0.0, 'inference': 0.0}
+        return {
+            'queue_wait_ms': round(timing['queue_wait'] * 1000, 2),
+            'batch_wait_ms': round(timing['batch_wait'] * 1000, 2),
+            'inference_ms': round(timing['inference'] * 1000, 2),
+        }
+
+    def stats(self):
+        """推理池全局统计"""
+        with self._lock:
+            calls = self._calls
+            return {
+                'size': self.size,
+                'loaded': self._created,
+                'intra_op_threads': self.intra_op_threads,
+                'in_use': self._in_use,
+                'waiting': self._waiting,
+                'calls': calls,
+                'avg_queue_wait_ms': round(self._wait_total / calls * 1000, 2) if calls else 0.0,
+                'max_queue_wait_ms': round(self._wait_max * 1000, 2),
+                'avg_inference_ms': round(self._infer_total / calls * 1000, 2) if calls else 0.0,
+                'max_inference_ms': round(self._infer_max * 1000, 2),
+                'embed_batching': self.batcher.stats() if self.batcher else None,
+            }
+
+    def detect(self, img, det_size=None, max_num=0):
+        with self.acquire() as models:
+            return models.detect(img, det_size=det_size, max_num=max_num)
+
+    def detect_many(self, imgs, det_size=None, max_num=0):
+        """并行检测多张图像（如大图分块），返回与 imgs 对应的人脸列表"""
+        if len(imgs) <= 1:
+            return [self.detect(img, det_size=det_size, max_num=max_num) for img in imgs]
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.size, thread_name_prefix='detect')
+        t0 = time.perf_counter()
+        results = list(self._executor.map(lambda img: self.detect(img, det_size=det_size, max_num=max_num), imgs))
+        if getattr(self._local, 'timing', None) is not None:
+            # 并行部分按墙钟时间计入本次请求
+            self._local.timing['inference'] += time.perf_counter() - t0
+        return results
+
+    def embed(self, img, faces):
+        if self.batcher is None:
+            with self.acquire() as models:
+                return models.embed(img, faces)
+
+        # 对齐后交给微批调度器，与并发请求的人脸合批推理
+        t0 = time.perf_counter()
+        crops = [face_align.norm_crop(img, landmark=face.kps, image_size=EMBED_CROP_SIZE) for face in faces]
+        feats, inference = self.batcher.embed(crops)
+        for face, feat in zip(faces, feats):
+            face.embedding = feat.flatten()
+        if getattr(self._local, 'timing', None) is not None:
+            # 模型推理计入 inference，其余（等待合批、等待空闲实例）计入 batch_wait
+            elapsed = time.perf_counter() - t0
+            self._local.timing['inference'] += inference
+            self._local.timing['batch_wait'] += max(0.0, elapsed - inference)
+        return faces
+
+    def analyze(self, img, det_size=None, max_num=0):
+        return self.embed(img, self.detect(img, det_size=det_size, max_num=max_num))
+
+
+# 进程内单例
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_models():
+    """获取进程内共享的推理池（接口与 ModelRegistry 相同，模型按需加载）"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = InferencePool()
+    return _pool
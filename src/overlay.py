@@ -0,0 +1,163 @@
+# 识别结果标注：按结果数据绘制、按需缩放编码、按请求 id 缓存供前端延迟获取
+import sys
+import time
+import uuid
+import base64
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+PROJECT_ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from src import config
+from src import utils
+
+# 响应模式：仅结果 / 缩略标注图 / 原尺寸标注图
+RESPONSE_MODES = ('results', 'preview', 'full')
+
+
+def parse_response_mode(value):
+    """解析请求中的 response_mode，无效或缺省时使用 config.RESPONSE_MODE_DEFAULT"""
+    value = (value or '').strip().lower()
+    return value if value in RESPONSE_MODES else config.RESPONSE_MODE_DEFAULT
+
+
+def draw_overlay(image, faces, scale=1.0):
+    """
+    仅根据结果数据在图像上绘制人脸框与标签（原地修改）
+
+    Args:
+        image: BGR 图像
+        faces: 结果列表，每项含 bbox、name、confidence，以及 status == 'matched' 或 recognized
+        scale: bbox 坐标的缩放比例（在缩略图上绘制时使用）
+    """
+    for face in faces:
+        matched = face.get('status') == 'matched' or bool(face.get('recognized'))
+        color = config.COLOR_MATCH if matched else config.COLOR_UNKNOWN
+        label = f"{face['name'] if matched else 'Unknown'} ({face['confidence']:.2f})"
+        utils.draw_bbox(image, np.asarray(face['bbox'], dtype=np.float32) * scale, label, color)
+    return image
+
+
+def render(image, faces, max_side=None):
+    """
+    生成标注图；指定 max_side 时先缩小再绘制，大图只在缩略图上绘制与编码
+    """
+    scale = 1.0
+    if max_side and max(image.shape[:2]) > max_side:
+        scale = max_side / max(image.shape[:2])
+        image = cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    else:
+        image = image.copy()
+    return draw_overlay(image, faces, scale)
+
+
+def encode_jpeg(image, quality=None):
+    ok, buffer = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, quality or config.ANNOTATION_JPEG_QUALITY])
+    return buffer.tobytes() if ok else None
+
+
+def to_data_url(jpeg):
+    return f"data:image/jpeg;base64,{base64.b64encode(jpeg).decode('utf-8')}"
+
+
+class AnnotationCache:
+    """
+    标注图缓存（LRU + 过期时间）
+
+    只保存请求的原始编码图像与识别结果，标注图在首次获取时才解码绘制，
+    并按模式缓存渲染结果。
+    """
+
+    def __init__(self, max_items=None, max_bytes=None, ttl=None):
+        self.max_items = max_items or config.ANNOTATION_CACHE_MAX_ITEMS
+        self.max_bytes = max_bytes or config.ANNOTATION_CACHE_MAX_BYTES
+        self.ttl = ttl or config.ANNOTATION_CACHE_TTL
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def put(self, source, faces):
+        """
+        Args:
+            source: 原始图像的编码字节（JPEG/PNG 等）
+            faces: 识别结果列表
+
+        Returns:
+            str: 请求 id
+        """
+        request_id = uuid.uuid4().hex
+        entry = {'source': source, 'faces': faces, 'rendered': {}, 'created': time.time()}
+        with self._lock:
+            self._entries[request_id] = entry
+            self._bytes += len(source)
+            self._evict()
+        return request_id
+
+    def get(self, request_id, mode='full'):
+        """获取标注图 JPEG；请求 id 不存在或已过期时返回 None"""
+        with self._lock:
+            entry = self._entries.get(request_id)
+            if entry is None or time.time() - entry['created'] > self.ttl:
+                return None
+            self._entries.move_to_end(request_id)
+            jpeg = entry['rendered'].get(mode)
+        if jpeg is not None:
+            return jpeg
+
+        image = cv2.imdecode(np.frombuffer(entry['source'], np.uint8), cv2.IMREAD_COLOR)
+        if image is None:
+            return None
+        max_side = config.PREVIEW_MAX_SIDE if mode == 'preview' else None
+        jpeg = encode_jpeg(render(image, entry['faces'], max_side))
+        with self._lock:
+            if request_id in self._entries:
+                entry['rendered'][mode] = jpeg
+                self._bytes += len(jpeg)
+                self._evict()
+        return jpeg
+
+    def _evict(self):
+        now = time.time()
+        while self._entries and (
+            len(self._entries) > self.max_items
+            or self._bytes > self.max_bytes
+            or now - next(iter(self._entries.values()))['created'] > self.ttl
+        ):
+            _, entry = self._entries.popitem(last=False)
+            self._bytes -= len(entry['source']) + sum(len(j) for j in entry['rendered'].values())
+
+
+annotation_cache = AnnotationCache()
+
+
+def build_annotation(mode, image, faces, source=None, cache=True, url_prefix='/api/recognition/annotated'):
+    """
+    按响应模式生成标注相关字段
+
+    Args:
+        mode: 'results' / 'preview' / 'full'
+        image: 已解码的 BGR 图像
+        faces: 识别结果列表
+        source: 原始编码字节；缺省时把 image 编码后缓存
+        cache: 是否缓存原图供之后按 annotated_url 获取标注图；
+               实时视频帧不会被再次获取，应传 False，避免挤掉照片签到的缓存
+
+    Returns:
+        dict: cache 时含 request_id、annotated_url（延迟获取地址），preview/full 模式另含 annotated_image（data URL）
+    """
+    fields = {'response_mode': mode}
+    if cache:
+        if source is None:
+            source = encode_jpeg(image, quality=95)
+        request_id = annotation_cache.put(bytes(source), faces)
+        fields['request_id'] = request_id
+        fields['annotated_url'] = f"{url_prefix}/{request_id}"
+    if mode != 'results':
+        max_side = config.PREVIEW_MAX_SIDE if mode == 'preview' else None
+        fields['annotated_image'] = to_data_url(encode_jpeg(render(image, faces, max_side)))
+    return fields
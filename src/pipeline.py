@@ -0,0 +1,198 @@
+# 实时视频分级流水线：采集线程 -> 推理线程 -> 输出（数据库 / 截图 / 显示）
+import sys
+import time
+import threading
+from collections import deque
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from src import config
+
+
+class DropOldestQueue:
+    """
+    有界队列：满时丢弃最旧的元素
+
+    下游处理不过来时只保留最新的帧，端到端延迟保持有界，不会随积压不断增长。
+    """
+
+    def __init__(self, maxsize=2):
+        self.maxsize = max(1, maxsize)
+        self._items = deque()
+        self._cond = threading.Condition()
+        self._closed = False
+        self.dropped = 0
+
+    def put(self, item):
+        with self._cond:
+            if len(self._items) >= self.maxsize:
+                self._items.popleft()
+                self.dropped += 1
+            self._items.append(item)
+            self._cond.notify()
+
+    def get(self, timeout=None):
+        """取出最旧的元素；超时或队列已关闭且为空时返回 None"""
+        with self._cond:
+            if not self._items and not self._closed:
+                self._cond.wait(timeout)
+            return self._items.popleft() if self._items else None
+
+    @property
+    def closed(self):
+        return self._closed
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def __len__(self):
+        with self._cond:
+            return len(self._items)
+
+
+class StageStats:
+    """单个阶段的吞吐与延迟统计（滑动窗口）"""
+
+    def __init__(self, window=100):
+        self._times = deque(maxlen=window)
+        self._latencies = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self.count = 0
+
+    def record(self, latency):
+        with self._lock:
+            self._times.append(time.perf_counter())
+            self._latencies.append(latency)
+            self.count += 1
+
+    def snapshot(self):
+        with self._lock:
+            times = list(self._times)
+            latencies = sorted(self._latencies)
+            count = self.count
+        fps = (len(times) - 1) / (times[-1] - times[0]) if len(times) > 1 and times[-1] > times[0] else 0.0
+        return {
+            'count': count,
+            'fps': round(fps, 2),
+            'avg_latency_ms': round(sum(latencies) / len(latencies) * 1000, 2) if latencies else 0.0,
+            'p95_latency_ms': round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] * 1000, 2) if latencies else 0.0,
+        }
+
+
+class FramePipeline:
+    """
+    采集 -> 推理 -> 输出 三级流水线
+
+    - 采集线程持续调用 source()，把帧放入有界的推理队列（满时丢弃最旧帧）
+    - 推理线程（可多个）调用 process(frame)，把结果放入有界的输出队列
+    - 输出阶段在调用 run_sink() 的线程中执行 sink(frame, result, packet)，
+      便于 cv2.imshow 等只能在主线程调用的操作；乱序到达的旧帧直接丢弃
+
+    每个阶段统计 FPS 与延迟，end_to_end 为从采集到输出完成的延迟。
+    """
+
+    def __init__(self, source, process, sink, workers=1, queue_size=None):
+        self.source = source
+        self.process = process
+        self.sink = sink
+        self.workers = max(1, workers)
+        queue_size = queue_size or config.PIPELINE_QUEUE_SIZE
+        self.infer_queue = DropOldestQueue(queue_size)
+        self.sink_queue = DropOldestQueue(queue_size)
+        self.stats_by_stage = {name: StageStats() for name in ('capture', 'infer', 'sink', 'end_to_end')}
+        self._stop = threading.Event()
+        self._threads = []
+        self._seq = 0
+        self._last_sunk = 0
+        self._active_workers = 0
+        self._workers_lock = threading.Lock()
+
+    def start(self):
+        self._threads = [threading.Thread(target=self._capture_loop, name='pipeline-capture', daemon=True)]
+        self._threads += [threading.Thread(target=self._infer_loop, name=f'pipeline-infer-{i}', daemon=True)
+                          for i in range(self.workers)]
+        self._active_workers = self.workers
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self.infer_queue.close()
+        self.sink_queue.close()
+        for thread in self._threads:
+            thread.join(timeout=2)
+
+    @property
+    def running(self):
+        return not self._stop.is_set()
+
+    def _capture_loop(self):
+        while not self._stop.is_set():
+            t0 = time.perf_counter()
+            frame = self.source()
+            if frame is None:
+                # 视频源结束或读取失败
+                break
+            self._seq += 1
+            self.infer_queue.put({'seq': self._seq, 'frame': frame, 'captured_at': time.perf_counter()})
+            self.stats_by_stage['capture'].record(time.perf_counter() - t0)
+        self.infer_queue.close()
+
+    def _infer_loop(self):
+        while True:
+            packet = self.infer_queue.get(timeout=0.5)
+            if packet is None:
+                if self.infer_queue.closed:
+                    break
+                continue
+            t0 = time.perf_counter()
+            try:
+                packet['result'] = self.process(packet['frame'])
+            except Exception as e:
+                print(f"⚠️ 推理失败: {e}")
+                continue
+            self.stats_by_stage['infer'].record(time.perf_counter() - t0)
+            self.sink_queue.put(packet)
+        with self._workers_lock:
+            self._active_workers -= 1
+            if self._active_workers == 0:
+                self.sink_queue.close()
+
+    def run_sink(self, timeout=0.5):
+        """
+        在当前线程执行一次输出阶段
+
+        Returns:
+            bool: False 表示流水线已结束（视频源结束或已停止）
+        """
+        packet = self.sink_queue.get(timeout=timeout)
+        if packet is None:
+            return not (self.sink_queue.closed and len(self.sink_queue) == 0) and self.running
+        if packet['seq'] < self._last_sunk:
+            return True
+        self._last_sunk = packet['seq']
+        t0 = time.perf_counter()
+        keep_running = self.sink(packet['frame'], packet['result'], packet)
+        now = time.perf_counter()
+        self.stats_by_stage['sink'].record(now - t0)
+        self.stats_by_stage['end_to_end'].record(now - packet['captured_at'])
+        return keep_running is not False and self.running
+
+    def stats(self):
+        stats = {name: stage.snapshot() for name, stage in self.stats_by_stage.items()}
+        stats['dropped'] = {'infer_queue': self.infer_queue.dropped, 'sink_queue': self.sink_queue.dropped}
+        return stats
+
+
+def format_stats(stats):
+    """单行文本形式的流水线统计"""
+    parts = [f"{name} {s['fps']:.1f}fps/{s['avg_latency_ms']:.0f}ms"
+             for name, s in stats.items() if name != 'dropped']
+    dropped = stats['dropped']
+    parts.append(f"dropped {dropped['infer_queue']}+{dropped['sink_queue']}")
+    return ', '.join(parts)
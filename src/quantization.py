@@ -0,0 +1,134 @@
+# 特征库 int8 量化（按维度缩放）+ 全精度重排
+import sys
+import argparse
+from pathlib import Path
+
+import numpy as np
+
+PROJECT_ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from src import config
+
+
+class Int8Quantizer:
+    """
+    按维度缩放的 int8 特征编码
+
+    code[n, d] = round(feat[n, d] / scale[d])，scale[d] = max_n |feat[n, d]| / 127。
+    粗排只读取 int8 编码（内存与带宽为 float32 的 1/4），再对 top-k 候选
+    用全精度特征（内存映射，仅访问到的行会被换入）精确重排。
+    """
+
+    def __init__(self, codes, scale):
+        self.codes = np.ascontiguousarray(codes, dtype=np.int8)
+        self.scale = np.asarray(scale, dtype=np.float32)
+
+    @classmethod
+    def encode(cls, feats, chunk_size=65536):
+        """由 (N, D) 归一化特征矩阵生成 int8 编码"""
+        feats = np.asarray(feats)
+        scale = np.abs(feats).max(axis=0).astype(np.float32) / 127.0
+        scale[scale == 0] = 1.0
+        codes = np.empty(feats.shape, dtype=np.int8)
+        for start in range(0, len(feats), chunk_size):
+            block = np.asarray(feats[start:start + chunk_size], dtype=np.float32)
+            codes[start:start + chunk_size] = np.clip(np.rint(block / scale), -127, 127)
+        return cls(codes, scale)
+
+    @property
+    def nbytes(self):
+        return self.codes.nbytes + self.scale.nbytes
+
+    def score(self, queries, chunk_size=16384):
+        """
+        用 int8 编码计算近似相似度
+
+        按行分块计算，避免一次性把整个编码矩阵转换为 float32 临时数组。
+
+        Returns:
+            (M, N) 近似余弦相似度
+        """
+        scaled = (queries * self.scale).astype(np.float32)
+        out = np.empty((len(queries), len(self.codes)), dtype=np.float32)
+        for start in range(0, len(self.codes), chunk_size):
+            block = self.codes[start:start + chunk_size].astype(np.float32)
+            out[:, start:start + chunk_size] = scaled @ block.T
+        return out
+
+    def candidates(self, queries, k=None):
+        """int8 粗排，返回每个查询的 k 个候选下标 (M, k)（无序）"""
+        k = min(k or config.QUANT_RERANK_TOPK, len(self.codes))
+        approx = self.score(queries)
+        return np.argpartition(-approx, k - 1, axis=1)[:, :k]
+
+    def search(self, queries, feats, k=None):
+        """
+        粗排 + 全精度重排
+
+        Args:
+            queries: (M, D) 归一化查询特征
+            feats: (N, D) 全精度特征矩阵
+            k: 重排候选数，默认 config.QUANT_RERANK_TOPK
+
+        Returns:
+            (best_idx, best_sims): 重排后每个查询的最佳下标与精确相似度
+        """
+        cand = self.candidates(queries, k)
+        k = cand.shape[1]
+        cand_feats = np.asarray(feats[cand.ravel()], dtype=np.float32).reshape(len(queries), k, -1)
+        exact = np.einsum('md,mkd->mk', queries, cand_feats)
+        best = np.argmax(exact, axis=1)
+        rows = np.arange(len(queries))
+        return cand[rows, best], exact[rows, best]
+
+
+def evaluate(gallery, num_queries=1000, noise=0.05, k=None, seed=0):
+    """
+    评估量化模式的内存收益与召回损失
+
+    以特征库中随机抽取的模板加噪声作为查询，比较量化检索与精确暴力检索
+    命中学生的 top-1 一致率。
+
+    Returns:
+        dict: 全精度/量化后的常驻内存字节数、节省比例、recall@1
+    """
+    quantizer = gallery.quantizer or Int8Quantizer.encode(gallery.feats)
+    rng = np.random.default_rng(seed)
+    n = min(num_queries, gallery.num_templates)
+    queries = np.asarray(gallery.feats[rng.choice(gallery.num_templates, n, replace=False)], dtype=np.float32)
+    queries = queries + rng.normal(scale=noise, size=queries.shape).astype(np.float32)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+
+    exact_tpl = np.argmax(queries @ np.asarray(gallery.feats, dtype=np.float32).T, axis=1)
+    quant_tpl, _ = quantizer.search(queries, gallery.feats, k=k)
+
+    float_bytes = gallery.num_templates * gallery.dim * 4
+    return {
+        "students": len(gallery),
+        "templates": gallery.num_templates,
+        "float32_bytes": float_bytes,
+        "int8_bytes": quantizer.nbytes,
+        "saved_bytes": float_bytes - quantizer.nbytes,
+        "saved_ratio": round(1 - quantizer.nbytes / float_bytes, 4) if float_bytes else 0.0,
+        "recall_at_1": round(float(np.mean(gallery.labels[exact_tpl] == gallery.labels[quant_tpl])), 4) if n else 1.0,
+    }
+
+
+if __name__ == "__main__":
+    from src.gallery import get_gallery
+
+    parser = argparse.ArgumentParser(description="评估 int8 量化特征库的内存收益与召回损失")
+    parser.add_argument("--queries", type=int, default=1000, help="评估查询数")
+    parser.add_argument("--topk", type=int, default=None, help="重排候选数")
+    args = parser.parse_args()
+
+    gallery = get_gallery()
+    if len(gallery) == 0:
+        print("❌ 人脸特征库为空")
+    else:
+        report = evaluate(gallery, num_queries=args.queries, k=args.topk)
+        print(f"学生数: {report['students']}（模板 {report['templates']} 个）")
+        print(f"float32 常驻内存: {report['float32_bytes'] / 1024 / 1024:.2f} MB")
+        print(f"int8 常驻内存:    {report['int8_bytes'] / 1024 / 1024:.2f} MB（节省 {report['saved_ratio'] * 100:.1f}%）")
+        print(f"recall@1:        {report['recall_at_1']:.4f}")
@@ -3,7 +3,6 @@
 import sys
 from pathlib import Path
 from datetime import date
-import sqlite3
 import argparse
 from tabulate import tabulate
 
@@ -11,42 +10,49 @@ from tabulate import tabulate
 project_root = Path(__file__).parent.parent
 sys.path.append(str(project_root))
 
-from src.databaseBuild.db import DB_PATH
+from src.databaseBuild.dal import get_connection
 
 
 def student_exists(name: str) -> bool:
     """检查学生是否已注册"""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute("SELECT 1 FROM students WHERE name = ?", (name,))
-    exists = cursor.fetchone() is not None
-    conn.close()
+    conn = get_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT 1 FROM students WHERE name = ?", (name,))
+        exists = cursor.fetchone() is not None
+    finally:
+        conn.close()
     return exists
 
 
 def already_signed_today(name: str, course_date: date) -> bool:
     """检查该学生当天是否已签到"""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute(
-        "SELECT 1 FROM attendance_records WHERE student_name = ? AND course_date = ?",
-        (name, course_date.isoformat())
-    )
-    exists = cursor.fetchone() is not None
-    conn.close()
+    conn = get_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(
+            '''SELECT 1 FROM attendance_records
+               WHERE course_date = ?
+                 AND (student_ref = (SELECT id FROM students WHERE name = ?)
+                      OR (student_ref IS NULL AND student_name = ?))''',
+            (course_date.isoformat(), name, name)
+        )
+        exists = cursor.fetchone() is not None
+    finally:
+        conn.close()
     return exists
 
 
 def manual_sign_in(student_name: str, course_date: date, remark: str = "补签"):
     """执行手动补签（写入数据库）"""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
+    conn = get_connection()
     try:
+        cursor = conn.cursor()
         cursor.execute('''
             INSERT INTO attendance_records 
-            (student_name, course_date, status, image_path, confidence, remark)
-            VALUES (?, ?, ?, ?, ?, ?)
-        ''', (student_name, course_date.isoformat(), "present", "", 0.0, remark))
+            (student_name, student_ref, course_date, status, image_path, confidence, remark)
+            VALUES (?, (SELECT id FROM students WHERE name = ?), ?, ?, ?, ?, ?)
+        ''', (student_name, student_name, course_date.isoformat(), "present", "", 0.0, remark))
         conn.commit()
         print(f"✅ {student_name} 补签成功 ({course_date})")
         return True
@@ -71,35 +77,40 @@ def query_attendance(student_name: str = None, course_date: date = None) -> list
     if course_date is None:
         course_date = date.today()
 
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
-
-    query = '''
-        SELECT 
-            student_name AS name,
-            course_date AS date,
-            status,
-            confidence,
-            remark,
-            created_at AS time
-        FROM attendance_records
-        WHERE 1=1
-    '''
-    params = []
-
-    if student_name:
-        query += " AND student_name = ?"
-        params.append(student_name)
-    
-    query += " AND course_date = ?"
-    params.append(course_date.isoformat())
-
-    query += " ORDER BY time DESC"
+    conn = get_connection()
+    try:
+        cursor = conn.cursor()
+
+        query = '''
+            SELECT 
+                COALESCE(s.name, ar.student_name) AS name,
+                ar.course_date AS date,
+                ar.status,
+                ar.confidence,
+                ar.remark,
+                ar.created_at AS time
+            FROM attendance_records ar
+            LEFT JOIN students s ON ar.student_ref = s.id
+            WHERE 1=1
+        '''
+        params = []
 
-    cursor.execute(query, params)
-    rows = cursor.fetchall()
-    conn.close()
+        if student_name:
+            # 按学生 id 查询（改名前的记录同样返回）；未关联学生的记录按签到时的姓名
+            query += '''
+                AND (ar.student_ref = (SELECT id FROM students WHERE name = ?)
+                     OR (ar.student_ref IS NULL AND ar.student_name = ?))'''
+            params.extend([student_name, student_name])
+        
+        query += " AND ar.course_date = ?"
+        params.append(course_date.isoformat())
+
+        query += " ORDER BY time DESC"
+
+        cursor.execute(query, params)
+        rows = cursor.fetchall()
+    finally:
+        conn.close()
 
     return [dict(row) for row in rows]
 
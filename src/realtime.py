@@ -7,36 +7,32 @@ project_root = Path(__file__).parent.parent
 sys.path.append(str(project_root))
 
 import cv2
-import numpy as np
-import pickle
 from datetime import datetime, timedelta
-import os
+import time
 import argparse
 
 from src.config import (
     MODEL_NAME,
     SIMILARITY_THRESHOLD,
-    CAPTURE_DIR,
-    OUTPUTS_DIR
+    REALTIME_TRACKING,
+    PIPELINE_WORKERS,
+    PIPELINE_STATS_INTERVAL
 )
 from src.realtime_utils import draw_faces_with_names
-from src.attendance import record_attendance
-from src.databaseBuild.db import DB_PATH
-import insightface
-from insightface.app import FaceAnalysis
+from src.attendance import record_attendance_async, attach_capture_path
+from src.capture_store import get_capture_store
+from src.gallery import get_gallery
+from src.models import ModelRegistry, get_models
+from src.tracking import FaceTracker
+from src.pipeline import FramePipeline, format_stats
 
 
 def load_known_faces():
-    """加载已注册的学生特征"""
-    pkl_path = project_root / "data" / "students.pkl"
-    if not pkl_path.exists():
-        print("❌ 未找到 students.pkl，请先运行 register.py")
-        return [], []
-    with open(pkl_path, 'rb') as f:
-        data = pickle.load(f)
-    names = list(data.keys())
-    feats = list(data.values())
-    return names, feats
+    """加载已注册的学生特征（内存映射特征库，与 API 进程共享页缓存）"""
+    gallery = get_gallery()
+    if len(gallery) == 0:
+        print("❌ 人脸特征库为空，请先运行 register.py")
+    return gallery
 
 
 def realtime_attendance(camera_index=0, save_captures=True):
@@ -44,13 +40,10 @@ def realtime_attendance(camera_index=0, save_captures=True):
     app = FaceAssistant(model_name=MODEL_NAME)
     
     # 加载已知人脸
-    known_names, known_feats = load_known_faces()
-    if not known_names:
+    gallery = load_known_faces()
+    if len(gallery) == 0:
         return
 
-    # 转为 NumPy 数组便于计算
-    known_feats = np.array(known_feats)
-
     # 打开摄像头
     cap = cv2.VideoCapture(camera_index)
     if not cap.isOpened():
@@ -60,30 +53,34 @@ def realtime_attendance(camera_index=0, save_captures=True):
     # 记录最近签到时间：{name: last_time}
     last_attendance = {}
 
-    # 创建输出目录
-    if save_captures:
-        os.makedirs(CAPTURE_DIR, exist_ok=True)
+    # 人脸跟踪：只对新出现的人脸和到期复核的轨迹提取特征
+    tracker = FaceTracker()
 
-    print("🎥 实时签到已启动！按 'q' 退出。")
-    while True:
+    def read_frame():
         ret, frame = cap.read()
         if not ret:
             print("⚠️ 无法读取摄像头帧")
-            break
-
-        # 检测并识别人脸
-        faces = app.get(frame)
+            return None
+        return frame
+
+    def recognize(frame):
+        # 检测并识别人脸（推理线程）
+        faces = app.detect(frame)
+        if REALTIME_TRACKING:
+            _, names, sims, matched = tracker.identify(frame, faces, gallery, SIMILARITY_THRESHOLD)
+        else:
+            app.embed(frame, faces)
+            names, sims, matched = gallery.match([face.normed_embedding for face in faces], SIMILARITY_THRESHOLD)
+        return faces, names, sims, matched
+
+    def handle_result(frame, result, packet):
+        # 签到、截图与显示（主线程）
+        faces, names, sims, matched = result
         current_time = datetime.now()
 
         results = []
-        for face in faces:
-            feat = face.normed_embedding
-            sims = np.dot(known_feats, feat)
-            max_idx = np.argmax(sims)
-            max_sim = sims[max_idx]
-            name = known_names[max_idx]
-
-            if max_sim >= SIMILARITY_THRESHOLD:
+        for face, name, max_sim, is_match in zip(faces, names, sims, matched):
+            if is_match:
                 # 检查是否在冷却期内(默认1.5小时)
                 can_record = True
                 if name in last_attendance:
@@ -93,30 +90,22 @@ def realtime_attendance(camera_index=0, save_captures=True):
                 if can_record:
                     last_attendance[name] = current_time
 
-                    # 保存截图（可选）
-                    image_path = ""
-                    if save_captures:
-                        timestamp = current_time.strftime("%Y%m%d_%H%M%S")
-                        filename = f"{name}_{timestamp}.jpg"
-                        capture_path = os.path.join(CAPTURE_DIR, filename)
-                        # 裁剪人脸区域
-                        bbox = face.bbox.astype(int)
-                        x1, y1, x2, y2 = bbox
-                        face_img = frame[y1:y2, x1:x2]
-                        if face_img.size > 0:
-                            cv2.imwrite(capture_path, face_img)
-                            image_path = capture_path
-
-                    # 记录考勤
-                    record_attendance(
+                    # 记录考勤（写入线程批量提交，不阻塞识别循环）
+                    record_attendance_async(
                         name=name,
                         course_date=current_time.date(),
-                        image_path=image_path,
+                        image_path="",
                         confidence=float(max_sim),
                         status="present",
                         remark="实时签到"
                     )
 
+                    # 保存截图（可选）：线程池异步写盘，本次运行中每名学生只保留相似度最高的一张
+                    if save_captures:
+                        capture = get_capture_store().submit(name, frame, face.bbox, float(max_sim),
+                                                             session_id='realtime')
+                        attach_capture_path(capture, name, current_time.date())
+
                 results.append((name, max_sim, can_record))
             else:
                 results.append(("Unknown", max_sim, False))
@@ -128,21 +117,46 @@ def realtime_attendance(camera_index=0, save_captures=True):
         cv2.imshow("Real-time Attendance (Press 'q' to quit)", display_frame)
 
         # 按 q 退出
-        if cv2.waitKey(1) & 0xFF == ord('q'):
-            break
+        return not (cv2.waitKey(1) & 0xFF == ord('q'))
+
+    # 采集、推理、输出分别运行，队列满时丢弃最旧帧，慢的阶段不会拖住采集
+    # （跟踪器要求帧按顺序到达，开启跟踪时只用一个推理线程）
+    workers = 1 if REALTIME_TRACKING else PIPELINE_WORKERS
+    pipeline = FramePipeline(read_frame, recognize, handle_result, workers=workers).start()
 
+    print("🎥 实时签到已启动！按 'q' 退出。")
+    last_report = time.perf_counter()
+    try:
+        while pipeline.run_sink():
+            if time.perf_counter() - last_report >= PIPELINE_STATS_INTERVAL:
+                print(f"📊 {format_stats(pipeline.stats())}")
+                last_report = time.perf_counter()
+    finally:
+        pipeline.stop()
+
+    print(f"📊 {format_stats(pipeline.stats())}")
     cap.release()
     cv2.destroyAllWindows()
+    if REALTIME_TRACKING:
+        stats = tracker.stats()
+        print(f"📊 共 {stats['faces']} 个人脸，提取特征 {stats['embedded']} 次")
     print("👋 实时签到已关闭。")
 
 
 class FaceAssistant:
-    def __init__(self, model_name='buffalo_l'):
-        self.app = FaceAnalysis(name=model_name, providers=['CPUExecutionProvider'])
-        self.app.prepare(ctx_id=0, det_size=(640, 640))
+    def __init__(self, model_name=MODEL_NAME, det_size=(640, 640)):
+        # 默认模型使用进程内共享的注册表，避免重复加载
+        self.models = get_models() if model_name == MODEL_NAME else ModelRegistry(model_name=model_name)
+        self.det_size = det_size
 
     def get(self, img):
-        return self.app.get(img)
+        return self.models.analyze(img, det_size=self.det_size)
+
+    def detect(self, img):
+        return self.models.detect(img, det_size=self.det_size)
+
+    def embed(self, img, faces):
+        return self.models.embed(img, faces)
 
 
 if __name__ == "__main__":
@@ -1,9 +1,9 @@
 # 注册人脸到数据库
 import os
 import sys
+import time
 import argparse
-import numpy as np
-from insightface.app import FaceAnalysis
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
 from pathlib import Path
 PROJECT_ROOT = Path(__file__).parent.parent
@@ -11,34 +11,104 @@ sys.path.insert(0, str(PROJECT_ROOT))
 
 from src import config
 from src import utils
+from src.gallery import FaceGallery, invalidate_gallery
+from src.ann_index import build_index_for
+from src.embedding_store import load_templates, save_templates
+from src.embedding_cache import EmbeddingCache, NO_FACE, content_hash
+from src.models import ModelRegistry, get_models, largest_face
 
 from src.databaseBuild.db import register_student_to_db
 
-def register_faces(student_names=None):
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp')
+DET_SIZE = (320, 320)
+
+# Model registry of the current worker process
+_worker_models = None
+
+
+def _init_worker(intra_op_threads):
+    """Process pool initializer: warm one model per worker."""
+    global _worker_models
+    _worker_models = ModelRegistry(intra_op_threads=intra_op_threads)
+
+
+def _embed_image(path, models=None):
+    """
+    decode -> detect -> embed for one image, keeping the largest face.
+
+    Returns:
+        dict: embedding / bbox (None when no face was found), image size and per-stage seconds
+    """
+    models = models or _worker_models
+    timings = {}
+
+    t0 = time.perf_counter()
+    img = utils.load_image(path)
+    if img is None:
+        raise ValueError("cannot decode image")
+    timings['decode'] = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    face = largest_face(models.detect(img, det_size=DET_SIZE))
+    timings['detect'] = time.perf_counter() - t0
+
+    result = {'embedding': None, 'bbox': None, 'size': img.shape[1::-1], 'timings': timings}
+    if face is None:
+        timings['embed'] = 0.0
+        return result
+
+    t0 = time.perf_counter()
+    models.embed(img, [face])
+    timings['embed'] = time.perf_counter() - t0
+
+    result['embedding'] = face.normed_embedding
+    result['bbox'] = face.bbox
+    return result
+
+
+def register_faces(student_names=None, workers=None, progress_callback=None):
     """
     Scans the KNOWN_FACES_DIR, extracts embeddings, and saves them to the database.
     Also registers each student into the SQLite attendance system.
-    
+
+    Every image is kept as its own template (no averaging). Embeddings are cached
+    by image content hash (plus model name and det_size), so a rescan only runs
+    inference on new or changed files; adding or removing one photo does not
+    recompute the others.
+
+    Uncached images are streamed through decode -> detect -> embed, either in this
+    process or in a process pool with one warmed model per worker, and merged into
+    the gallery at the end.
+
     Args:
         student_names: Optional list of student names or single student name to update.
                       If None, updates all students (full scan).
                       If provided, only updates the specified student(s) incrementally.
+        workers: Number of worker processes (default config.REGISTER_WORKERS; <= 1 runs inline).
+        progress_callback: Optional callable(done, total, student_name, filename) invoked
+                      after each uncached image has been processed.
+
+    Returns:
+        dict: image counts and accumulated per-stage timings (seconds)
     """
-    # Initialize InsightFace
-    app = FaceAnalysis(providers=['CPUExecutionProvider'])
-    app.prepare(ctx_id=0, det_size=(320, 320))
+    workers = workers or config.REGISTER_WORKERS
+    cache = EmbeddingCache(det_size=DET_SIZE)
 
-    # Load existing database for incremental update
+    # Load existing templates for incremental update
     if student_names is not None:
         try:
-            known_faces = utils.load_database(config.DB_PATH)
+            known_faces = load_templates(config.GALLERY_PATH)
+            if not known_faces:
+                legacy = utils.load_database(config.DB_PATH)
+                known_faces = {name: [("", emb)] for name, emb in legacy.items()}
         except:
             known_faces = {}
     else:
         known_faces = {}
-    
+
     if not os.path.exists(config.KNOWN_FACES_DIR):
         print(f"Error: Directory {config.KNOWN_FACES_DIR} does not exist.")
+        cache.close()
         return
 
     # Convert single name to list
@@ -49,9 +119,16 @@ def register_faces(student_names=None):
     else:
         print("Full scan update for all students")
 
-    # Iterate over student folders
+    stats = {'images': 0, 'cached': 0, 'embedded': 0, 'no_face': 0, 'errors': 0,
+             'timings': {'scan': 0.0, 'decode': 0.0, 'detect': 0.0, 'embed': 0.0, 'merge': 0.0}}
+
+    # Stage 1: scan folders and resolve cached embeddings
+    t0 = time.perf_counter()
     students_to_process = student_names if student_names else os.listdir(config.KNOWN_FACES_DIR)
-    
+    templates = {}   # {person_name: {filename: embedding}}
+    order = {}       # {person_name: [filename, ...]} keeps folder order in the gallery
+    jobs = []        # [(person_name, filename, path, digest)]
+
     for person_name in students_to_process:
         person_dir = os.path.join(config.KNOWN_FACES_DIR, person_name)
         if not os.path.isdir(person_dir):
@@ -61,44 +138,114 @@ def register_faces(student_names=None):
                 print(f"Removed {person_name} from database (folder not found)")
             continue
 
-        print(f"Processing {person_name}...")
-        embeddings = []
-
-        for filename in os.listdir(person_dir):
-            if not filename.lower().endswith(('.png', '.jpg', '.jpeg', '.bmp')):
-                continue
+        filenames = [f for f in os.listdir(person_dir) if f.lower().endswith(IMAGE_EXTENSIONS)]
+        templates[person_name] = {}
+        order[person_name] = filenames
 
+        for filename in filenames:
             path = os.path.join(person_dir, filename)
+            stats['images'] += 1
             try:
-                img = utils.load_image(path)
-                faces = app.get(img)
-
-                if len(faces) == 0:
-                    h, w = img.shape[:2]
-                    print(f"  Warning: No face detected in {filename} ({w}x{h}). Skipping.")
-                    continue
-                
-                face = sorted(faces, key=lambda x: (x.bbox[2]-x.bbox[0]) * (x.bbox[3]-x.bbox[1]), reverse=True)[0]
-                embeddings.append(face.embedding)
-
+                with open(path, 'rb') as f:
+                    digest = content_hash(f.read())
             except Exception as e:
-                print(f"  Error processing {filename}: {e}")
-
-        if embeddings:
-            avg_embedding = np.mean(embeddings, axis=0)
-            avg_embedding = avg_embedding / np.linalg.norm(avg_embedding)
-            known_faces[person_name] = avg_embedding
-            print(f"Registered {person_name} with {len(embeddings)} images.")
+                print(f"  Error reading {person_name}/{filename}: {e}")
+                stats['errors'] += 1
+                continue
 
-            # 同步写入 SQLite 数据库 
+            cached = cache.get(digest)
+            if cached is NO_FACE:
+                print(f"  Warning: No face detected in {person_name}/{filename} (cached). Skipping.")
+                stats['no_face'] += 1
+            elif cached is not None:
+                templates[person_name][filename] = cached[0]
+                stats['cached'] += 1
+            else:
+                jobs.append((person_name, filename, path, digest))
+    stats['timings']['scan'] = time.perf_counter() - t0
+
+    # Stage 2: decode -> detect -> embed for uncached images
+    def handle_result(job, result, done):
+        person_name, filename, _, digest = job
+        for stage, seconds in result['timings'].items():
+            stats['timings'][stage] += seconds
+        if result['embedding'] is None:
+            w, h = result['size']
+            print(f"  Warning: No face detected in {person_name}/{filename} ({w}x{h}). Skipping.")
+            cache.put(digest)
+            stats['no_face'] += 1
+        else:
+            cache.put(digest, result['embedding'], result['bbox'])
+            templates[person_name][filename] = result['embedding']
+            stats['embedded'] += 1
+        if progress_callback:
+            progress_callback(done, len(jobs), person_name, filename)
+
+    def handle_error(job, error, done):
+        print(f"  Error processing {job[0]}/{job[1]}: {error}")
+        stats['errors'] += 1
+        if progress_callback:
+            progress_callback(done, len(jobs), job[0], job[1])
+
+    if jobs:
+        workers = max(1, min(workers, len(jobs)))
+        if workers == 1:
+            # Load the shared models only when something is not cached
+            models = get_models()
+            for done, job in enumerate(jobs, 1):
+                try:
+                    handle_result(job, _embed_image(job[2], models), done)
+                except Exception as e:
+                    handle_error(job, e, done)
+        else:
+            intra_op_threads = max(1, (os.cpu_count() or 1) // workers)
+            print(f"Embedding {len(jobs)} images with {workers} workers x {intra_op_threads} threads")
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                     initargs=(intra_op_threads,)) as executor:
+                futures = {executor.submit(_embed_image, job[2]): job for job in jobs}
+                for done, future in enumerate(as_completed(futures), 1):
+                    job = futures[future]
+                    try:
+                        handle_result(job, future.result(), done)
+                    except Exception as e:
+                        handle_error(job, e, done)
+
+    cache.close()
+
+    # Stage 3: merge into the gallery
+    t0 = time.perf_counter()
+    for person_name, filenames in order.items():
+        embeddings = templates[person_name]
+        known_faces[person_name] = [(f, embeddings[f]) for f in filenames if f in embeddings]
+        if known_faces[person_name]:
+            print(f"Registered {person_name} with {len(known_faces[person_name])} images.")
+
+            # 同步写入 SQLite 数据库
             register_student_to_db(person_name)
 
         else:
             print(f"Warning: No valid images for {person_name}")
 
-    # Save face embeddings to .pkl
-    utils.save_database(known_faces, config.DB_PATH)
-    print(f"Successfully saved {len(known_faces)} students to {config.DB_PATH}")
+    # Save per-image templates to the memory-mapped gallery file
+    save_templates(known_faces, config.GALLERY_PATH)
+    registered = sum(1 for items in known_faces.values() if items)
+    print(f"Successfully saved {registered} students to {config.GALLERY_PATH}")
+
+    # Rebuild the ANN index for large galleries (removed again for small ones);
+    # incremental updates keep the trained centroids and only reassign lists
+    build_index_for(FaceGallery.from_templates(known_faces), retrain=student_names is None)
+    invalidate_gallery(config.GALLERY_PATH)
+    stats['timings']['merge'] = time.perf_counter() - t0
+
+    timing_text = ', '.join(f"{stage} {seconds:.2f}s" for stage, seconds in stats['timings'].items())
+    print(f"Images: {stats['images']} (cached {stats['cached']}, embedded {stats['embedded']}, "
+          f"no face {stats['no_face']}, errors {stats['errors']}); {timing_text}")
+    return stats
 
 if __name__ == "__main__":
-    register_faces()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Register student faces")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="worker processes for embedding (default config.REGISTER_WORKERS)")
+    args = parser.parse_args()
+
+    register_faces(workers=args.workers)
@@ -0,0 +1,245 @@
+# 实时识别的人脸跟踪（IoU + Kalman），按轨迹复用身份
+import sys
+import time
+import threading
+from pathlib import Path
+
+import numpy as np
+
+PROJECT_ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from src import config
+from src.models import get_models
+
+
+class KalmanBoxFilter:
+    """
+    匀速模型的人脸框 Kalman 滤波
+
+    状态为 [cx, cy, w, h, vx, vy, vw, vh]，观测为 [cx, cy, w, h]。
+    """
+
+    def __init__(self, bbox):
+        self.x = np.zeros(8, dtype=np.float64)
+        self.x[:4] = _to_cxcywh(bbox)
+        self.P = np.diag([10.0, 10.0, 10.0, 10.0, 1000.0, 1000.0, 1000.0, 1000.0])
+        self.F = np.eye(8)
+        self.F[:4, 4:] = np.eye(4)
+        self.H = np.eye(4, 8)
+        self.Q = np.diag([1.0, 1.0, 1.0, 1.0, 0.01, 0.01, 0.01, 0.01])
+        self.R = np.diag([1.0, 1.0, 10.0, 10.0])
+
+    def predict(self):
+        self.x = self.F @ self.x
+        self.x[2:4] = np.maximum(self.x[2:4], 1.0)
+        self.P = self.F @ self.P @ self.F.T + self.Q
+        return _to_xyxy(self.x[:4])
+
+    def update(self, bbox):
+        y = _to_cxcywh(bbox) - self.H @ self.x
+        S = self.H @ self.P @ self.H.T + self.R
+        K = self.P @ self.H.T @ np.linalg.inv(S)
+        self.x = self.x + K @ y
+        self.P = (np.eye(8) - K @ self.H) @ self.P
+
+    @property
+    def bbox(self):
+        return _to_xyxy(self.x[:4])
+
+
+class Track:
+    """一条人脸轨迹：位置滤波、最近一次提取特征的帧号、按帧累计的身份投票"""
+
+    def __init__(self, track_id, bbox, frame_no):
+        self.track_id = track_id
+        self.kalman = KalmanBoxFilter(bbox)
+        self.hits = 1
+        self.misses = 0
+        self.last_embed_frame = None
+        self.created_frame = frame_no
+        self.scores = {}   # {name: 衰减后的相似度累计}，用于决定身份
+        self.sims = {}     # {name: [相似度之和, 次数]}，用于计算置信度
+
+    def observe(self, name, sim, frame_no):
+        """记录一次特征比对结果（name 为 None 表示未匹配）"""
+        decay = config.TRACK_VOTE_DECAY
+        for key in self.scores:
+            self.scores[key] *= decay
+        key = name or "Unknown"
+        self.scores[key] = self.scores.get(key, 0.0) + max(float(sim), 0.0) + 1e-3
+        total, count = self.sims.get(key, (0.0, 0))
+        self.sims[key] = (total + float(sim), count + 1)
+        self.last_embed_frame = frame_no
+
+    def identity(self):
+        """
+        Returns:
+            (name, confidence, recognized)：投票最高的身份及其平均相似度
+        """
+        if not self.scores:
+            return "Unknown", 0.0, False
+        name = max(self.scores, key=self.scores.get)
+        total, count = self.sims[name]
+        return name, total / count, name != "Unknown"
+
+    def needs_embedding(self, frame_no):
+        """新轨迹、到达复核周期，或尚未识别出身份时按较短周期重试"""
+        if self.last_embed_frame is None:
+            return True
+        interval = config.TRACK_REVERIFY_FRAMES if self.identity()[2] else config.TRACK_UNKNOWN_RETRY_FRAMES
+        return frame_no - self.last_embed_frame >= interval
+
+
+class FaceTracker:
+    """
+    单路视频流的人脸跟踪器
+
+    每帧用 IoU 把检测框关联到 Kalman 预测的轨迹；只对新轨迹和到达复核周期的轨迹
+    提取特征并比对，其余人脸沿用轨迹缓存的身份。
+    """
+
+    def __init__(self):
+        self.tracks = []
+        self.frame_no = 0
+        self.last_used = time.time()
+        self._next_id = 1
+        self._lock = threading.Lock()
+        self._faces = 0
+        self._embedded = 0
+
+    def update(self, faces):
+        """
+        关联本帧检测结果
+
+        Returns:
+            list[Track]: 与 faces 一一对应的轨迹
+        """
+        self.frame_no += 1
+        self.last_used = time.time()
+        predicted = np.array([track.kalman.predict() for track in self.tracks]).reshape(-1, 4)
+        detected = np.array([face.bbox for face in faces], dtype=np.float64).reshape(-1, 4)
+
+        assigned = [None] * len(faces)
+        if len(self.tracks) and len(faces):
+            iou = _iou_matrix(detected, predicted)
+            used = set()
+            # 按 IoU 从大到小贪心匹配
+            for flat in np.argsort(-iou, axis=None):
+                d, t = divmod(int(flat), iou.shape[1])
+                if iou[d, t] < config.TRACK_IOU_THRESHOLD:
+                    break
+                if assigned[d] is not None or t in used:
+                    continue
+                assigned[d] = self.tracks[t]
+                used.add(t)
+
+        matched_ids = set()
+        for d, track in enumerate(assigned):
+            if track is None:
+                track = Track(self._next_id, detected[d], self.frame_no)
+                self._next_id += 1
+                self.tracks.append(track)
+                assigned[d] = track
+            else:
+                track.kalman.update(detected[d])
+                track.hits += 1
+                track.misses = 0
+            matched_ids.add(track.track_id)
+
+        for track in self.tracks:
+            if track.track_id not in matched_ids:
+                track.misses += 1
+        self.tracks = [track for track in self.tracks if track.misses <= config.TRACK_MAX_MISSES]
+        return assigned
+
+    def identify(self, frame, faces, gallery, threshold):
+        """
+        跟踪 + 按需识别
+
+        Args:
+            frame: BGR 图像
+            faces: 本帧检测到的人脸（尚未提取特征）
+            gallery: 人脸特征库
+            threshold: 匹配阈值
+
+        Returns:
+            (tracks, names, sims, matched)：与 faces 一一对应
+        """
+        with self._lock:
+            tracks = self.update(faces)
+            pending = [i for i, track in enumerate(tracks) if track.needs_embedding(self.frame_no)]
+            if pending:
+                get_models().embed(frame, [faces[i] for i in pending])
+                names, sims, matched = gallery.match([faces[i].normed_embedding for i in pending], threshold)
+                for i, name, sim, is_match in zip(pending, names, sims, matched):
+                    tracks[i].observe(name if is_match else None, sim, self.frame_no)
+
+            self._faces += len(faces)
+            self._embedded += len(pending)
+            identities = [track.identity() for track in tracks]
+            names = [identity[0] for identity in identities]
+            sims = np.array([identity[1] for identity in identities], dtype=np.float32)
+            matched = np.array([identity[2] for identity in identities], dtype=bool)
+            return tracks, names, sims, matched
+
+    def stats(self):
+        with self._lock:
+            return {
+                'frames': self.frame_no,
+                'tracks': len(self.tracks),
+                'faces': self._faces,
+                'embedded': self._embedded,
+                'embed_ratio': round(self._embedded / self._faces, 4) if self._faces else 0.0,
+            }
+
+
+# 每路视频流一个跟踪器：{stream_id: FaceTracker}
+_trackers = {}
+_trackers_lock = threading.Lock()
+
+
+def get_tracker(stream_id='default'):
+    """获取视频流对应的跟踪器（长时间未使用的跟踪器会被清理）"""
+    now = time.time()
+    with _trackers_lock:
+        for key in [k for k, t in _trackers.items() if now - t.last_used > config.TRACKER_IDLE_SECONDS]:
+            del _trackers[key]
+        tracker = _trackers.get(stream_id)
+        if tracker is None:
+            tracker = _trackers[stream_id] = FaceTracker()
+        return tracker
+
+
+def release_tracker(stream_id='default'):
+    """丢弃视频流的跟踪器（停止摄像头时调用）"""
+    with _trackers_lock:
+        _trackers.pop(stream_id, None)
+
+
+def tracker_stats():
+    with _trackers_lock:
+        trackers = dict(_trackers)
+    return {stream_id: tracker.stats() for stream_id, tracker in trackers.items()}
+
+
+def _iou_matrix(a, b):
+    """(N, 4) 与 (M, 4) 框之间的 IoU 矩阵"""
+    x1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    y1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    x2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    y2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.maximum(0.0, x2 - x1) * np.maximum(0.0, y2 - y1)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    return inter / (area_a[:, None] + area_b[None, :] - inter + 1e-6)
+
+
+def _to_cxcywh(bbox):
+    x1, y1, x2, y2 = bbox[:4]
+    return np.array([(x1 + x2) / 2, (y1 + y2) / 2, x2 - x1, y2 - y1], dtype=np.float64)
+
+
+def _to_xyxy(state):
+    cx, cy, w, h = state
+    return np.array([cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2], dtype=np.float64)